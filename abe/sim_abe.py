@@ -1,43 +1,236 @@
 
 import json            # Pour sérialiser/désérialiser les métadonnées (JSON)
 import base64          # Pour encoder les clés en Base64
+import contextlib
+import io
 import os
-from cryptography.fernet import Fernet
-from typing import Tuple, Dict, Any
+import re
+import struct
+import threading
+from collections import OrderedDict
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from typing import Tuple, Dict, Any, Callable, FrozenSet, AbstractSet, NamedTuple, Iterable, Iterator, List, Optional
 
 
 # ==========================================================
 # SETUP : Initialisation du système ABE (Autorité de confiance)
 # ==========================================================
 
-def setup_abe():
+def new_master_key() -> bytes:
+    """
+    Génère une nouvelle clé maîtresse (clé Fernet).
+    """
+    return Fernet.generate_key()
+
+
+def setup_abe(master_keys: Dict[int, bytes] = None) -> Dict[str, Any]:
     """
     Initialise le système ABE.
-    Génère une clé maîtresse (wrapper_key) utilisée pour protéger
-    les clés de données (data_key).
+    master_keys : générations de clés maîtresses {key_id: clé}, en général
+    chargées depuis la base (voir models.load_abe_state). La plus récente
+    (key_id maximal) protège les nouvelles clés de données (data_key).
+    Sans argument, une clé volatile est générée (key_id 1).
+    """
+    if not master_keys:
+        master_keys = {1: new_master_key()}
+
+    state = {'master_keys': {}, 'fernets': {}}
+    for key_id, key in sorted(master_keys.items()):
+        add_master_key(state, key_id, key)
+    return state
+
+
+def add_master_key(state: Dict[str, Any], key_id: int, key: bytes):
     """
-    wrapper_key = Fernet.generate_key()
-    return {'wrapper_key': wrapper_key}
+    Ajoute une génération de clé maîtresse ; si key_id est le plus grand,
+    elle devient la clé courante pour les nouveaux chiffrements.
+    """
+    state['master_keys'][key_id] = key
+    state['fernets'][key_id] = Fernet(key)
+    current = max(state['master_keys'])
+    state['key_id'] = current
+    state['wrapper_key'] = state['master_keys'][current]
+    # Pour les payloads sans key_id : essayer de la plus récente à la plus ancienne
+    state['multi_fernet'] = MultiFernet(
+        [state['fernets'][k] for k in sorted(state['fernets'], reverse=True)])
 
 
 # ==========================================================
 # Fonctions internes : encapsulation / désencapsulation
 # ==========================================================
 
-def _wrap_message(wrapper_key: bytes, message: bytes) -> bytes:
+def _wrap_message(state: Dict[str, Any], message: bytes, key_id: int = None) -> bytes:
     """
-    Chiffre (encapsule) une clé de données avec la clé maîtresse.
+    Chiffre (encapsule) une clé de données avec la génération key_id, par
+    défaut la clé maîtresse courante (state['key_id']). L’instance Fernet
+    est mise en cache dans l’état.
     """
-    f = Fernet(wrapper_key)
-    return f.encrypt(message)
+    if key_id is None:
+        key_id = state['key_id']
+    return state['fernets'][key_id].encrypt(message)
 
 
-def _unwrap_message(wrapper_key: bytes, token: bytes) -> bytes:
+def _unwrap_message(state: Dict[str, Any], token: bytes, key_id: int = None) -> bytes:
     """
-    Déchiffre (désencapsule) une clé de données.
+    Déchiffre (désencapsule) une clé de données avec la génération key_id,
+    ou en essayant toutes les générations si key_id est inconnu.
     """
-    f = Fernet(wrapper_key)
-    return f.decrypt(token)
+    if key_id is None:
+        return state['multi_fernet'].decrypt(token)
+    return state['fernets'][key_id].decrypt(token)
+
+
+# ==========================================================
+# ENVELOPPE BINAIRE (format versionné)
+# ==========================================================
+#
+#   en-tête fixe  : magic 'IOMT' | version | type | schéma | -
+#                   | len(section) u32 | len(clé encapsulée) u16 | taille bloc u32
+#                   | key_id u32 (génération de clé maîtresse, depuis la v2)
+#   section       : politique (CP) ou attributs JSON (KP), en UTF-8
+#   clé encapsulée: jeton Fernet brut (non base64) de la clé de données
+#   corps         : type BLOB   -> AES-GCM(message) en un seul bloc
+#                   type STREAM -> blocs : drapeau dernier + len u32 | AES-GCM(bloc)
+#
+# Le nonce AES-GCM contient le numéro du bloc et le drapeau « dernier
+# bloc », ce qui détecte réordonnancement et troncature. Pour le type
+# BLOB, le champ « taille bloc » porte le numéro de séquence de
+# l’enveloppe : une même clé de données peut ainsi être partagée par
+# plusieurs enveloppes d’un lot (voir encrypt_cp_batch) sans réutiliser
+# de nonce. Depuis la v3, l’en-tête complet (en-tête fixe, section et
+# clé encapsulée) est passé à AES-GCM comme données associées : modifier
+# la politique, les attributs ou le key_id invalide le corps. Les
+# enveloppes v1 / v2 (sans données associées) et les anciens payloads
+# JSON + ':::' + jeton Fernet restent lisibles.
+
+ENVELOPE_MAGIC = b'IOMT'
+ENVELOPE_VERSION = 3
+KIND_BLOB = 0
+KIND_STREAM = 1
+SCHEME_CP = 0
+SCHEME_KP = 1
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+_HEADER = struct.Struct('>4sBBBxIHII')
+_HEADER_V1 = struct.Struct('>4sBBBxIHI')
+_SEQ_OFFSET = 14   # position du champ taille bloc / séquence dans l’en-tête
+_CHUNK_LEN = struct.Struct('>I')
+_LAST_CHUNK = 0x80000000
+
+
+def _chunk_nonce(index: int, last: bool) -> bytes:
+    return index.to_bytes(11, 'big') + (b'\x01' if last else b'\x00')
+
+
+def _new_data_key(state: Dict[str, Any]) -> Tuple[AESGCM, bytes, int]:
+    """
+    Génère une clé de données AES-256 et la retourne avec sa version
+    encapsulée (jeton Fernet brut) par la clé maîtresse courante et le
+    key_id de cette clé. Le key_id est lu une seule fois : l’en-tête et
+    les métadonnées le reprennent, si bien qu’une rotation
+    (add_master_key) concurrente ne peut pas les désaccorder.
+    """
+    key_id = state['key_id']
+    data_key = AESGCM.generate_key(bit_length=256)
+    wrapped_key = base64.urlsafe_b64decode(_wrap_message(state, data_key, key_id))
+    return AESGCM(data_key), wrapped_key, key_id
+
+
+def _associated_data(header: Dict[str, Any], raw) -> bytes:
+    """
+    Données associées AES-GCM : les octets de l’en-tête (v3 et plus).
+    """
+    return bytes(raw) if header['version'] >= 3 else None
+
+
+def _open_data_key(state: Dict[str, Any], header: Dict[str, Any]) -> AESGCM:
+    token = base64.urlsafe_b64encode(header['wrapped_key'])
+    return AESGCM(_unwrap_message(state, token, header['key_id']))
+
+
+def _pack_header(key_id: int, kind: int, scheme: int, section: bytes,
+                 wrapped_key: bytes, chunk_size: int = 0) -> bytes:
+    return _HEADER.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, kind, scheme, len(section),
+                        len(wrapped_key), chunk_size, key_id) + section + wrapped_key
+
+
+def _unpack_prelude(prelude) -> Dict[str, Any]:
+    """
+    Décode l’en-tête fixe (v1 sans key_id, ou v2 / v3).
+    """
+    if len(prelude) < _HEADER_V1.size:
+        raise ValueError('Enveloppe tronquée')
+    version = prelude[len(ENVELOPE_MAGIC)]
+    if version == 1:
+        magic, version, kind, scheme, section_len, wrapped_len, chunk_size = _HEADER_V1.unpack_from(prelude)
+        key_id, size = None, _HEADER_V1.size
+    else:
+        magic, version, kind, scheme, section_len, wrapped_len, chunk_size, key_id = _HEADER.unpack_from(prelude)
+        size = _HEADER.size
+    if magic != ENVELOPE_MAGIC or version > ENVELOPE_VERSION or kind not in (KIND_BLOB, KIND_STREAM):
+        raise ValueError('Enveloppe binaire invalide')
+    return {
+        'version': version,
+        'kind': kind,
+        'scheme': scheme,
+        'key_id': key_id,
+        'header_size': size,
+        'section_len': section_len,
+        'wrapped_len': wrapped_len,
+        'chunk_size': chunk_size,
+    }
+
+
+def is_envelope(blob: bytes) -> bool:
+    """
+    Vrai si les premiers octets correspondent au format binaire.
+    """
+    return blob[:len(ENVELOPE_MAGIC)] == ENVELOPE_MAGIC
+
+
+def parse_envelope(blob: bytes) -> Tuple[Dict[str, Any], memoryview]:
+    """
+    Lit l’en-tête d’une enveloppe binaire en mémoire (offsets fixes,
+    sans copie du corps). Retourne (en-tête, corps chiffré).
+    """
+    view = memoryview(blob)
+    header = _unpack_prelude(view)
+    offset = header['header_size']
+    end = offset + header['section_len']
+    header['section'] = bytes(view[offset:end]).decode()
+    header['wrapped_key'] = bytes(view[end:end + header['wrapped_len']])
+    end += header['wrapped_len']
+    if len(view) < end:
+        raise ValueError('Enveloppe tronquée')
+    header['aad'] = _associated_data(header, view[:end])
+    return header, view[end:]
+
+
+def _seal_blob(state: Dict[str, Any], scheme: int, section: bytes,
+               plaintext: bytes) -> Tuple[bytes, bytes, int]:
+    aead, wrapped_key, key_id = _new_data_key(state)
+    head = _pack_header(key_id, KIND_BLOB, scheme, section, wrapped_key)
+    return head + aead.encrypt(_chunk_nonce(0, True), plaintext, head), wrapped_key, key_id
+
+
+def _open_body(state: Dict[str, Any], header: Dict[str, Any], body) -> bytes:
+    if header['kind'] == KIND_STREAM:
+        return b''.join(_iter_decrypted_chunks(state, header, io.BytesIO(body)))
+    aead = _open_data_key(state, header)
+    # Type BLOB : chunk_size = numéro de séquence (0 hors lot)
+    return aead.decrypt(_chunk_nonce(header['chunk_size'], True), bytes(body), header['aad'])
+
+
+def _envelope_allowed(header: Dict[str, Any], keyobj: Dict[str, Any], scheme: int) -> bool:
+    """
+    Contrôle d’accès à partir du seul en-tête de l’enveloppe.
+    """
+    if header['scheme'] != scheme:
+        return False
+    if scheme == SCHEME_CP:
+        return _policy_satisfied(header['section'], keyobj.get('attributes', []))
+    return _policy_satisfied(keyobj.get('policy', ''), json.loads(header['section']))
 
 
 # ==========================================================
@@ -51,24 +244,16 @@ def encrypt_cp(state: Dict[str, Any], policy_str: str, plaintext: bytes) -> Tupl
     - La politique d’accès est stockée dans le ciphertext.
     """
 
-    # 1️ Génération d’une clé symétrique pour chiffrer les données
-    data_key = Fernet.generate_key()
-    f = Fernet(data_key)
-
-    # 2️ Chiffrement du message
-    ct = f.encrypt(plaintext)
-
-    # 3️ Chiffrement de la clé de données avec la clé maîtresse
-    wrapped_key = _wrap_message(state['wrapper_key'], data_key)
+    # 1️ Génération d’une clé de données, chiffrement du message
+    # 2️ Chiffrement de la clé de données avec la clé maîtresse
+    payload, wrapped_key, key_id = _seal_blob(state, SCHEME_CP, policy_str.encode(), plaintext)
 
-    # 4️ Métadonnées contenant la politique d’accès
+    # 3️ Métadonnées contenant la politique d’accès
     meta = {
         'policy': policy_str,
-        'wrapped_key_b64': base64.b64encode(wrapped_key).decode()
+        'wrapped_key_b64': base64.b64encode(wrapped_key).decode(),
+        'key_id': key_id
     }
-
-    # 5️ Construction du payload final
-    payload = json.dumps(meta).encode() + b':::' + ct
     return payload, meta
 
 
@@ -94,7 +279,14 @@ def decrypt_cp(state: Dict[str, Any], sk_blob: bytes, ct_blob: bytes) -> bytes:
         keyobj = json.loads(sk_blob.decode())
         attrs = keyobj.get('attributes', [])
 
-        # Séparer métadonnées et données chiffrées
+        # Format binaire : politique lue dans l’en-tête à offsets fixes
+        if is_envelope(ct_blob):
+            header, body = parse_envelope(ct_blob)
+            if not _envelope_allowed(header, keyobj, SCHEME_CP):
+                return None
+            return _open_body(state, header, body)
+
+        # Ancien format : séparer métadonnées et données chiffrées
         meta_raw, ct = ct_blob.split(b':::', 1)
         meta = json.loads(meta_raw.decode())
 
@@ -106,7 +298,7 @@ def decrypt_cp(state: Dict[str, Any], sk_blob: bytes, ct_blob: bytes) -> bytes:
             return None
 
         # Déchiffrement de la clé de données
-        data_key = _unwrap_message(state['wrapper_key'], wrapped_key)
+        data_key = _unwrap_message(state, wrapped_key, meta.get('key_id'))
 
         # Déchiffrement du message
         f = Fernet(data_key)
@@ -125,18 +317,14 @@ def encrypt_kp(state: Dict[str, Any], attributes: list, plaintext: bytes) -> Tup
     Chiffrement KP-ABE :
     - Le ciphertext contient des ATTRIBUTS
     """
-    data_key = Fernet.generate_key()
-    f = Fernet(data_key)
-    ct = f.encrypt(plaintext)
-
-    wrapped_key = _wrap_message(state['wrapper_key'], data_key)
+    section = json.dumps(attributes).encode()
+    payload, wrapped_key, key_id = _seal_blob(state, SCHEME_KP, section, plaintext)
 
     meta = {
         'attributes': attributes,
-        'wrapped_key_b64': base64.b64encode(wrapped_key).decode()
+        'wrapped_key_b64': base64.b64encode(wrapped_key).decode(),
+        'key_id': key_id
     }
-
-    payload = json.dumps(meta).encode() + b':::' + ct
     return payload, meta
 
 
@@ -158,6 +346,12 @@ def decrypt_kp(state: Dict[str, Any], sk_blob: bytes, ct_blob: bytes) -> bytes:
         keyobj = json.loads(sk_blob.decode())
         policy = keyobj.get('policy', '')
 
+        if is_envelope(ct_blob):
+            header, body = parse_envelope(ct_blob)
+            if not _envelope_allowed(header, keyobj, SCHEME_KP):
+                return None
+            return _open_body(state, header, body)
+
         meta_raw, ct = ct_blob.split(b':::', 1)
         meta = json.loads(meta_raw.decode())
         attrs = meta.get('attributes', [])
@@ -166,7 +360,7 @@ def decrypt_kp(state: Dict[str, Any], sk_blob: bytes, ct_blob: bytes) -> bytes:
             return None
 
         wrapped_key = base64.b64decode(meta.get('wrapped_key_b64'))
-        data_key = _unwrap_message(state['wrapper_key'], wrapped_key)
+        data_key = _unwrap_message(state, wrapped_key, meta.get('key_id'))
 
         f = Fernet(data_key)
         return f.decrypt(ct)
@@ -175,56 +369,978 @@ def decrypt_kp(state: Dict[str, Any], sk_blob: bytes, ct_blob: bytes) -> bytes:
         return None
 
 
+# ==========================================================
+# CHIFFREMENT PAR LOTS (même politique / mêmes attributs)
+# ==========================================================
+#
+# Pour les rafales de petites lectures : la clé de données, son
+# encapsulation et la sérialisation de l’en-tête sont faites une fois
+# par fenêtre de `key_reuse` enveloppes. Chaque enveloppe reste
+# autonome (déchiffrable par decrypt_cp / decrypt_kp).
+
+DEFAULT_KEY_REUSE = 256
+_MAX_KEY_REUSE = 0xFFFFFFFF
+
+
+def _seal_batch(state: Dict[str, Any], scheme: int, section: bytes,
+                plaintexts: Iterable[bytes], key_reuse: int) -> Iterator[Tuple[bytes, bytes, int]]:
+    if not 0 < key_reuse <= _MAX_KEY_REUSE:
+        raise ValueError('key_reuse doit être compris entre 1 et 2**32 - 1')
+
+    seq = key_reuse
+    for plaintext in plaintexts:
+        if seq == key_reuse:
+            # key_id lu avec la clé de données : constant sur toute la fenêtre
+            aead, wrapped_key, key_id = _new_data_key(state)
+            # Parties constantes de l’en-tête, sérialisées une fois par fenêtre
+            head = _pack_header(key_id, KIND_BLOB, scheme, section, wrapped_key)
+            prefix, suffix = head[:_SEQ_OFFSET], head[_SEQ_OFFSET + 4:]
+            seq = 0
+        head = prefix + seq.to_bytes(4, 'big') + suffix
+        yield head + aead.encrypt(_chunk_nonce(seq, True), plaintext, head), wrapped_key, key_id
+        seq += 1
+
+
+def encrypt_cp_batch(state: Dict[str, Any], policy_str: str, plaintexts: Iterable[bytes],
+                     key_reuse: int = DEFAULT_KEY_REUSE) -> List[Tuple[bytes, Dict]]:
+    """
+    Chiffrement CP-ABE d’un lot de messages sous une même politique.
+    Retourne [(payload, meta)] dans l’ordre des messages ; une clé de
+    données est partagée par au plus `key_reuse` enveloppes.
+    """
+    out = []
+    for payload, wrapped_key, key_id in _seal_batch(state, SCHEME_CP, policy_str.encode(), plaintexts, key_reuse):
+        meta = {
+            'policy': policy_str,
+            'wrapped_key_b64': base64.b64encode(wrapped_key).decode(),
+            'key_id': key_id
+        }
+        out.append((payload, meta))
+    return out
+
+
+def encrypt_kp_batch(state: Dict[str, Any], attributes: list, plaintexts: Iterable[bytes],
+                     key_reuse: int = DEFAULT_KEY_REUSE) -> List[Tuple[bytes, Dict]]:
+    """
+    Chiffrement KP-ABE d’un lot de messages avec les mêmes attributs.
+    """
+    section = json.dumps(attributes).encode()
+    out = []
+    for payload, wrapped_key, key_id in _seal_batch(state, SCHEME_KP, section, plaintexts, key_reuse):
+        meta = {
+            'attributes': attributes,
+            'wrapped_key_b64': base64.b64encode(wrapped_key).decode(),
+            'key_id': key_id
+        }
+        out.append((payload, meta))
+    return out
+
+
+# ==========================================================
+# MODE STREAMING : chiffrement par blocs pour gros fichiers
+# ==========================================================
+#
+# Enveloppe de type STREAM : chaque bloc est authentifié séparément,
+# la mémoire utilisée ne dépend que de la taille de bloc.
+
+@contextlib.contextmanager
+def _as_file(obj, mode: str):
+    """
+    Accepte un chemin ou un objet fichier déjà ouvert.
+    """
+    if hasattr(obj, 'read') or hasattr(obj, 'write'):
+        yield obj
+    else:
+        with open(obj, mode) as f:
+            yield f
+
+
+def _read_exact(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError('Enveloppe tronquée')
+    return data
+
+
+def _iter_chunks(src, chunk_size: int) -> Iterator[Tuple[bytes, bool]]:
+    """
+    Générateur (bloc, est_dernier) avec une lecture d’avance d’un bloc.
+    Une entrée vide produit un unique bloc final vide.
+    """
+    current = src.read(chunk_size)
+    while True:
+        following = src.read(chunk_size) if current else b''
+        last = not following
+        yield current, last
+        if last:
+            return
+        current = following
+
+
+def _remove_partial(dst):
+    if isinstance(dst, (str, os.PathLike)) and os.path.exists(dst):
+        os.remove(dst)
+
+
+def _encrypt_stream(state: Dict[str, Any], scheme: int, section: bytes,
+                    src, dst, chunk_size: int, progress: Callable[[int], None] = None) -> int:
+    if not 0 < chunk_size < _LAST_CHUNK - 16:
+        raise ValueError('Taille de bloc invalide')
+
+    aead, wrapped_key, key_id = _new_data_key(state)
+    head = _pack_header(key_id, KIND_STREAM, scheme, section, wrapped_key, chunk_size)
+
+    total = 0
+    try:
+        with _as_file(src, 'rb') as fin, _as_file(dst, 'wb') as fout:
+            fout.write(head)
+            for index, (chunk, last) in enumerate(_iter_chunks(fin, chunk_size)):
+                # L’en-tête authentifie chaque bloc (données associées)
+                ct = aead.encrypt(_chunk_nonce(index, last), chunk, head)
+                fout.write(_CHUNK_LEN.pack(len(ct) | (_LAST_CHUNK if last else 0)))
+                fout.write(ct)
+                total += len(chunk)
+                if progress is not None:
+                    progress(total)
+    except BaseException:
+        # Erreur ou annulation (exception levée par progress) : pas d’enveloppe partielle
+        _remove_partial(dst)
+        raise
+    return total
+
+
+def read_envelope_header(f, prelude: bytes = b'') -> Dict[str, Any]:
+    """
+    Lit uniquement l’en-tête d’une enveloppe depuis un fichier ouvert ;
+    le fichier reste positionné au début du corps. `prelude` contient
+    les octets de l’en-tête fixe déjà lus par l’appelant.
+    """
+    if len(prelude) < _HEADER_V1.size:
+        prelude += _read_exact(f, _HEADER_V1.size - len(prelude))
+    size = _HEADER_V1.size if prelude[len(ENVELOPE_MAGIC)] == 1 else _HEADER.size
+    if len(prelude) < size:
+        prelude += _read_exact(f, size - len(prelude))
+    header = _unpack_prelude(prelude)
+    # Octets déjà lus au-delà de l’en-tête fixe (cas v1) : début de la section
+    extra = prelude[size:]
+    rest = extra + _read_exact(f, header['section_len'] + header['wrapped_len'] - len(extra))
+    header['section'] = rest[:header['section_len']].decode()
+    header['wrapped_key'] = rest[header['section_len']:]
+    header['aad'] = _associated_data(header, prelude[:size] + rest)
+    return header
+
+
+def _iter_decrypted_chunks(state: Dict[str, Any], header: Dict[str, Any], fin) -> Iterator[bytes]:
+    """
+    Générateur des blocs en clair ; lève une exception si un bloc est
+    altéré, manquant ou si des données suivent le dernier bloc.
+    """
+    aead = _open_data_key(state, header)
+
+    index = 0
+    while True:
+        (framed,) = _CHUNK_LEN.unpack(_read_exact(fin, _CHUNK_LEN.size))
+        last = bool(framed & _LAST_CHUNK)
+        ct_len = framed & ~_LAST_CHUNK
+        if ct_len > header['chunk_size'] + 16:
+            raise ValueError('Bloc trop grand')
+        yield aead.decrypt(_chunk_nonce(index, last), _read_exact(fin, ct_len), header['aad'])
+        if last:
+            if fin.read(1):
+                raise ValueError('Données après le dernier bloc')
+            return
+        index += 1
+
+
+def _decrypt_stream(state: Dict[str, Any], sk_blob: bytes, src, dst, scheme: int,
+                    progress: Callable[[int], None] = None):
+    """
+    Déchiffre src vers dst en vérifiant d’abord la politique (lecture de
+    l’en-tête uniquement). Les enveloppes BLOB et les anciens payloads
+    JSON + ':::' sont lus en entier puis déchiffrés en mémoire.
+    Retourne le nombre d’octets écrits, ou None si refus / échec.
+    """
+    keyobj = json.loads(sk_blob.decode())
+
+    with _as_file(src, 'rb') as fin:
+        prelude = fin.read(_HEADER.size)
+
+        if not is_envelope(prelude):
+            # Ancien format : contrôler la politique avant de lire le corps
+            meta, consumed = _read_legacy_meta(fin, prelude)
+            if not _legacy_allowed(meta, keyobj, scheme):
+                return None
+            legacy = decrypt_cp if scheme == SCHEME_CP else decrypt_kp
+            pt = legacy(state, sk_blob, consumed + fin.read())
+            if pt is None:
+                return None
+            with _as_file(dst, 'wb') as fout:
+                fout.write(pt)
+            return len(pt)
+
+        header = read_envelope_header(fin, prelude)
+        if not _envelope_allowed(header, keyobj, scheme):
+            return None
+
+        total = 0
+        try:
+            with _as_file(dst, 'wb') as fout:
+                if header['kind'] == KIND_BLOB:
+                    chunks = [_open_body(state, header, fin.read())]
+                else:
+                    chunks = _iter_decrypted_chunks(state, header, fin)
+                for chunk in chunks:
+                    fout.write(chunk)
+                    total += len(chunk)
+                    if progress is not None:
+                        progress(total)
+        except Exception:
+            # Ne pas laisser un fichier clair partiel sur le disque
+            _remove_partial(dst)
+            return None
+        return total
+
+
+def encrypt_cp_stream(state: Dict[str, Any], policy_str: str, src, dst,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, progress: Callable[[int], None] = None) -> Dict:
+    """
+    Chiffrement CP-ABE en streaming de src (chemin ou fichier) vers dst.
+    progress(octets_traités) est appelé après chaque bloc ; une exception
+    levée par progress interrompt le chiffrement et supprime dst.
+    Retourne les métadonnées (politique, taille en clair).
+    """
+    size = _encrypt_stream(state, SCHEME_CP, policy_str.encode(), src, dst, chunk_size, progress)
+    return {'policy': policy_str, 'size': size, 'chunk_size': chunk_size}
+
+
+def encrypt_kp_stream(state: Dict[str, Any], attributes: list, src, dst,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, progress: Callable[[int], None] = None) -> Dict:
+    """
+    Chiffrement KP-ABE en streaming de src (chemin ou fichier) vers dst.
+    """
+    section = json.dumps(attributes).encode()
+    size = _encrypt_stream(state, SCHEME_KP, section, src, dst, chunk_size, progress)
+    return {'attributes': attributes, 'size': size, 'chunk_size': chunk_size}
+
+
+def decrypt_cp_stream(state: Dict[str, Any], sk_blob: bytes, src, dst,
+                      progress: Callable[[int], None] = None):
+    """
+    Déchiffrement CP-ABE en streaming. Retourne le nombre d’octets
+    écrits dans dst, ou None si la politique n’est pas satisfaite
+    (ou si progress a interrompu le traitement).
+    """
+    try:
+        return _decrypt_stream(state, sk_blob, src, dst, SCHEME_CP, progress)
+    except Exception:
+        return None
+
+
+def decrypt_kp_stream(state: Dict[str, Any], sk_blob: bytes, src, dst,
+                      progress: Callable[[int], None] = None):
+    """
+    Déchiffrement KP-ABE en streaming.
+    """
+    try:
+        return _decrypt_stream(state, sk_blob, src, dst, SCHEME_KP, progress)
+    except Exception:
+        return None
+
+
+# ==========================================================
+# CONTRÔLE D’ACCÈS SANS LECTURE DU CORPS
+# ==========================================================
+#
+# Permet de refuser une demande en lisant seulement l’en-tête du
+# fichier (ou les métadonnées du record), sans toucher aux données
+# chiffrées. Le déchiffrement refait toujours le contrôle complet.
+
+_LEGACY_META_MAX = 1024 * 1024
+
+
+def _read_legacy_meta(fin, prefix: bytes = b'') -> Tuple[Dict[str, Any], bytes]:
+    """
+    Lit un ancien payload jusqu’au séparateur ':::' seulement.
+    Retourne (métadonnées, octets déjà consommés).
+    """
+    buf = prefix
+    while b':::' not in buf:
+        more = fin.read(4096)
+        if not more or len(buf) > _LEGACY_META_MAX:
+            raise ValueError('Métadonnées introuvables')
+        buf += more
+    meta_raw = buf.split(b':::', 1)[0]
+    return json.loads(meta_raw.decode()), buf
+
+
+def _legacy_allowed(meta: Dict[str, Any], keyobj: Dict[str, Any], scheme: int) -> bool:
+    if scheme == SCHEME_CP:
+        return _policy_satisfied(meta.get('policy', ''), keyobj.get('attributes', []))
+    return _policy_satisfied(keyobj.get('policy', ''), meta.get('attributes', []))
+
+
+def _check_access_file(sk_blob: bytes, src, scheme: int) -> bool:
+    try:
+        keyobj = json.loads(sk_blob.decode())
+        with _as_file(src, 'rb') as fin:
+            prelude = fin.read(_HEADER.size)
+            if is_envelope(prelude):
+                return _envelope_allowed(read_envelope_header(fin, prelude), keyobj, scheme)
+            meta, _ = _read_legacy_meta(fin, prelude)
+            return _legacy_allowed(meta, keyobj, scheme)
+    except Exception:
+        return False
+
+
+def check_access_cp(state: Dict[str, Any], sk_blob: bytes, src) -> bool:
+    """
+    Vrai si les attributs de la clé CP satisfont la politique du fichier
+    chiffré src (chemin ou fichier). Seul l’en-tête est lu.
+    """
+    return _check_access_file(sk_blob, src, SCHEME_CP)
+
+
+def check_access_kp(state: Dict[str, Any], sk_blob: bytes, src) -> bool:
+    """
+    Vrai si la politique de la clé KP est satisfaite par les attributs
+    du fichier chiffré src. Seul l’en-tête est lu.
+    """
+    return _check_access_file(sk_blob, src, SCHEME_KP)
+
+
+def check_access_meta(state: Dict[str, Any], sk_blob: bytes, encryption_type: str,
+                      policy_text: str, attributes_json: str) -> bool:
+    """
+    Pré-filtre à partir des métadonnées du record (Record.policy_text /
+    Record.attributes_json) : aucun accès au fichier.
+    """
+    try:
+        keyobj = json.loads(sk_blob.decode())
+        if encryption_type == 'CP':
+            return _policy_satisfied(policy_text or '', keyobj.get('attributes', []))
+        return _policy_satisfied(keyobj.get('policy', ''), json.loads(attributes_json or '[]'))
+    except Exception:
+        return False
+
+
 # ==========================================================
 # ÉVALUATION DE LA POLITIQUE D’ACCÈS
 # ==========================================================
+#
+# Grammaire (insensible à la casse) :
+#   expr  := terme ('or' terme)*
+#   terme := unaire ('and' unaire)*
+#   unaire:= 'not' unaire | seuil | '(' expr ')' | ATTRIBUT
+#   seuil := ENTIER 'of' '(' expr (',' expr)* ')'     (ou { ... })
+#   ATTRIBUT = mot contenant ':' (ex: role:medecin)
+#
+# « k of (a, b, c) » est vrai si au moins k des n sous-expressions le
+# sont : une porte à seuil native, au lieu des C(n, k) conjonctions de
+# sa forme développée en OU de ET.
+#
+# La politique est compilée une seule fois en AST (tuples) puis en
+# fonctions imbriquées qui évaluent avec court-circuit. L’analyse et la
+# compilation étant récursives, l’imbrication (parenthèses, not, seuils)
+# est limitée à MAX_POLICY_DEPTH : au-delà, PolicyError plutôt que
+# RecursionError (les politiques viennent des records et des règles
+# d’ingestion).
 
-def _policy_satisfied(policy_str: str, attrs_list: list) -> bool:
+MAX_POLICY_DEPTH = 64
+
+class PolicyError(ValueError):
+    """Politique d’accès syntaxiquement invalide."""
+
+
+class AttributeLimitError(Exception):
     """
-    Vérifie si une liste d’attributs satisfait une politique logique.
-    Politique valide = expression booléenne (and / or / parenthèses).
+    Dictionnaire d’attributs plein (MAX_ATTRIBUTES). compile_policy la
+    rattrape : la politique reste valide, sans evaluate_mask.
     """
 
-    # Refuser policy vide
+
+class CompiledPolicy(NamedTuple):
+    text: str                    # politique normalisée (minuscules)
+    ast: tuple                   # ('attr', nom) / ('and'|'or', enfants) / ('not', enfant) / ('thr', k, enfants)
+    attributes: FrozenSet[str]   # attributs feuilles mentionnés
+    evaluate: Callable[[AbstractSet[str]], bool]
+    evaluate_mask: Optional[Callable[[int], bool]]   # même test sur un masque (None : dictionnaire plein)
+
+
+_TOKEN_RE = re.compile(r'\s*(?:([(){},])|([\w:]+))')
+_KEYWORDS = ('and', 'or', 'not', 'of')
+_CLOSING = {'(': ')', '{': '}'}
+
+
+def _tokenize(expr: str) -> list:
+    """
+    Découpe la politique en jetons : ponctuation, mots-clés, seuils
+    (('num', k)) et attributs.
+    """
+    tokens = []
+    pos, end = 0, len(expr.rstrip())
+    while pos < end:
+        m = _TOKEN_RE.match(expr, pos)
+        if not m:
+            raise PolicyError(f'Caractère inattendu à la position {pos}: {expr[pos]!r}')
+        punct, word = m.groups()
+        if punct:
+            tokens.append(punct)
+        elif word in _KEYWORDS:
+            tokens.append(word)
+        elif word.isdecimal():
+            tokens.append(('num', int(word)))
+        elif ':' in word:
+            tokens.append(('attr', word))
+        else:
+            raise PolicyError(f'Attribut invalide (format nom:valeur attendu): {word!r}')
+        pos = m.end()
+    return tokens
+
+
+def _gate(kind: str, children: list) -> tuple:
+    """Porte ET / OU n-aire ; aplatit (a and b) and c -> and(a, b, c)."""
+    flat = []
+    for node in children:
+        if node[0] == kind:
+            flat.extend(node[1])
+        else:
+            flat.append(node)
+    return flat[0] if len(flat) == 1 else (kind, tuple(flat))
+
+
+def _threshold(k: int, children: list) -> tuple:
+    """
+    Porte « k parmi n ». Les cas limites deviennent des portes
+    ordinaires : 1 of -> OU, n of -> ET.
+    """
+    n = len(children)
+    if not 1 <= k <= n:
+        raise PolicyError(f'Seuil {k} hors de l’intervalle 1..{n}')
+    if k == 1:
+        return _gate('or', children)
+    if k == n:
+        return _gate('and', children)
+    # Les feuilles sont comptées en une opération ensembliste : un
+    # attribut répété serait compté une seule fois
+    names = [c[1] for c in children if c[0] == 'attr']
+    if len(names) != len(set(names)):
+        raise PolicyError('Attribut répété dans une porte à seuil')
+    return ('thr', k, tuple(children))
+
+
+def parse_policy(policy_str: str) -> tuple:
+    """
+    Analyse une politique et retourne son AST.
+    Les ET / OU imbriqués sont aplatis en portes n-aires.
+    """
     if not policy_str or policy_str.strip() == '':
-        return False
+        raise PolicyError('Politique vide')
+
+    tokens = _tokenize(policy_str.lower().strip())
+    pos = 0
+    depth = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def gate(kind, sub):
+        nonlocal pos
+        children = [sub()]
+        while peek() == kind:
+            pos += 1
+            children.append(sub())
+        return _gate(kind, children)
+
+    def expr():
+        return gate('or', term)
+
+    def term():
+        return gate('and', unary)
+
+    def unary():
+        nonlocal depth
+        depth += 1
+        if depth > MAX_POLICY_DEPTH:
+            raise PolicyError(f'Politique trop imbriquée (plus de {MAX_POLICY_DEPTH} niveaux)')
+        node = nested()
+        depth -= 1
+        return node
+
+    def nested():
+        nonlocal pos
+        tok = peek()
+        if tok == 'not':
+            pos += 1
+            return ('not', unary())
+        if tok == '(':
+            pos += 1
+            node = expr()
+            if peek() != ')':
+                raise PolicyError('Parenthèse fermante manquante')
+            pos += 1
+            return node
+        if isinstance(tok, tuple) and tok[0] == 'num':
+            pos += 1
+            if peek() != 'of':
+                raise PolicyError(f"'of' attendu après le seuil {tok[1]}")
+            pos += 1
+            opening = peek()
+            if opening not in _CLOSING:
+                raise PolicyError("'(' attendue après 'of'")
+            pos += 1
+            children = [expr()]
+            while peek() == ',':
+                pos += 1
+                children.append(expr())
+            if peek() != _CLOSING[opening]:
+                raise PolicyError(f'{_CLOSING[opening]!r} manquante après la liste du seuil')
+            pos += 1
+            return _threshold(tok[1], children)
+        if isinstance(tok, tuple):
+            pos += 1
+            return tok
+        raise PolicyError(f'Jeton inattendu: {tok!r}')
+
+    ast = expr()
+    if pos != len(tokens):
+        raise PolicyError(f'Jeton inattendu: {tokens[pos]!r}')
+    return ast
+
+
+def _leaves(node: tuple) -> set:
+    if node[0] == 'attr':
+        return {node[1]}
+    if node[0] == 'not':
+        return _leaves(node[1])
+    out = set()
+    for child in node[-1]:
+        out |= _leaves(child)
+    return out
+
+
+def _compile_node(node: tuple) -> Callable[[AbstractSet[str]], bool]:
+    """
+    Transforme un nœud de l’AST en fonction aset -> bool.
+    Les feuilles directes d’une porte ET/OU/seuil sont regroupées dans
+    un frozenset testé en une seule opération ensembliste.
+    """
+    kind = node[0]
+
+    if kind == 'attr':
+        name = node[1]
+        return lambda aset: name in aset
+
+    if kind == 'not':
+        inner = _compile_node(node[1])
+        return lambda aset: not inner(aset)
 
-    expr = policy_str.lower().strip()
+    leaves = frozenset(c[1] for c in node[-1] if c[0] == 'attr')
+    subs = tuple(_compile_node(c) for c in node[-1] if c[0] != 'attr')
 
-    # Refuser JSON / listes / objets
-    if expr.startswith('[') or expr.startswith('{'):
+    if kind == 'thr':
+        k = node[1]
+        if not subs:
+            return lambda aset: len(leaves.intersection(aset)) >= k
+
+        def _thr(aset):
+            # Comptage : arrêt dès k succès, ou dès que k devient inaccessible
+            need = k - len(leaves.intersection(aset))
+            spare = len(subs) - need
+            if need <= 0 or spare < 0:
+                return need <= 0
+            for f in subs:
+                if f(aset):
+                    need -= 1
+                    if not need:
+                        return True
+                else:
+                    spare -= 1
+                    if spare < 0:
+                        return False
+            return False
+        return _thr
+
+    if kind == 'and':
+        if not subs:
+            return leaves.issubset
+
+        def _and(aset):
+            if not leaves.issubset(aset):
+                return False
+            for f in subs:
+                if not f(aset):
+                    return False
+            return True
+        return _and
+
+    if not subs:
+        return lambda aset: not leaves.isdisjoint(aset)
+
+    def _or(aset):
+        if not leaves.isdisjoint(aset):
+            return True
+        for f in subs:
+            if f(aset):
+                return True
         return False
+    return _or
 
-    aset = set(a.lower() for a in attrs_list)
 
-    import re
+def _leaf_group(node: tuple, kind: str, dictionary: 'AttributeDictionary'):
+    """Masque d’une porte `kind` dont tous les enfants sont des feuilles, sinon None."""
+    if node[0] == kind and all(c[0] == 'attr' for c in node[1]):
+        return dictionary.intern(c[1] for c in node[1])
+    return None
 
-    # Extraire uniquement les attributs (ex: role:medecin)
-    tokens = re.findall(r'[\w:]+', expr)
-    tokens = [t for t in tokens if ':' in t]
 
-    replaced = expr
-    for t in set(tokens):
-        replaced = re.sub(
-            r'\b' + re.escape(t) + r'\b',
-            str(t in aset),
-            replaced
-        )
+def _compile_mask_node(node: tuple, dictionary: 'AttributeDictionary') -> Callable[[int], bool]:
+    """
+    Variante de _compile_node sur des masques : les feuilles directes
+    d’une porte sont réunies en un seul masque, testé par
+    (m & requis) == requis (ET), m & l’un != 0 (OU) ou
+    (m & feuilles).bit_count() >= k (seuil). Les sous-portes faites
+    uniquement de feuilles (OU sous un ET, ET sous un OU : la forme
+    courante des politiques) sont testées sur place, sans appel de
+    fonction imbriqué.
+    """
+    kind = node[0]
 
-    # Normalisation Python
-    safe = (
-        replaced
-        .replace('true', 'True')
-        .replace('false', 'False')
-    )
+    if kind == 'attr':
+        bit = dictionary.intern((node[1],))
+        return lambda m: m & bit != 0
+
+    if kind == 'not':
+        inner = _compile_mask_node(node[1], dictionary)
+        return lambda m: not inner(m)
 
-    # Sécurité finale : pas de listes
-    if '[' in safe or ']' in safe or '{' in safe or '}' in safe:
+    leaves = dictionary.intern(c[1] for c in node[-1] if c[0] == 'attr')
+
+    if kind == 'thr':
+        k = node[1]
+        subs = tuple(_compile_mask_node(c, dictionary) for c in node[2] if c[0] != 'attr')
+        if not subs:
+            return lambda m: (m & leaves).bit_count() >= k
+
+        def _thr(m):
+            need = k - (m & leaves).bit_count()
+            spare = len(subs) - need
+            if need <= 0 or spare < 0:
+                return need <= 0
+            for f in subs:
+                if f(m):
+                    need -= 1
+                    if not need:
+                        return True
+                else:
+                    spare -= 1
+                    if spare < 0:
+                        return False
+            return False
+        return _thr
+
+    groups, subs = [], []
+    for child in node[1]:
+        if child[0] == 'attr':
+            continue
+        group = _leaf_group(child, 'or' if kind == 'and' else 'and', dictionary)
+        if group is not None:
+            groups.append(group)
+        else:
+            subs.append(_compile_mask_node(child, dictionary))
+    groups, subs = tuple(groups), tuple(subs)
+
+    if kind == 'and':
+        if not groups and not subs:
+            return lambda m: m & leaves == leaves
+
+        def _and(m):
+            if m & leaves != leaves:
+                return False
+            for any_of in groups:
+                if not m & any_of:
+                    return False
+            for f in subs:
+                if not f(m):
+                    return False
+            return True
+        return _and
+
+    if not groups and not subs:
+        return lambda m: m & leaves != 0
+
+    def _or(m):
+        if m & leaves:
+            return True
+        for all_of in groups:
+            if m & all_of == all_of:
+                return True
+        for f in subs:
+            if f(m):
+                return True
         return False
+    return _or
+
+
+def compile_policy(policy_str: str) -> CompiledPolicy:
+    """
+    Compile une politique textuelle en CompiledPolicy.
+    Lève PolicyError si la politique est invalide. Ses feuilles sont
+    internées dans le dictionnaire d’attributs ; s’il est plein,
+    evaluate_mask vaut None (évaluation sur ensembles, voir policy_allows).
+    """
+    ast = parse_policy(policy_str)
+    try:
+        evaluate_mask = _compile_mask_node(ast, _attribute_dictionary)
+    except AttributeLimitError:
+        evaluate_mask = None
+    return CompiledPolicy(
+        text=policy_str.lower().strip(),
+        ast=ast,
+        attributes=frozenset(_leaves(ast)),
+        evaluate=_compile_node(ast),
+        evaluate_mask=evaluate_mask,
+    )
+
+
+# ==========================================================
+# CACHE LRU DES POLITIQUES COMPILÉES
+# ==========================================================
+
+class PolicyCache:
+    """
+    Cache LRU borné et thread-safe : texte de politique -> CompiledPolicy.
+    Les politiques invalides sont aussi mémorisées pour ne pas être
+    ré-analysées : seul le message est conservé, une PolicyError neuve
+    est levée à chaque accès (une instance relancée accumulerait les
+    traces d’appel, et leurs variables locales, de tous les appelants).
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, policy_str: str) -> CompiledPolicy:
+        with self._lock:
+            entry = self._data.get(policy_str)
+            if entry is not None:
+                self._data.move_to_end(policy_str)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            # Compilation hors verrou : deux threads peuvent compiler la même
+            # politique en parallèle, le résultat est identique.
+            try:
+                entry = compile_policy(policy_str)
+            except PolicyError as e:
+                entry = str(e)
+            self._put(policy_str, entry)
+
+        if isinstance(entry, str):
+            raise PolicyError(entry)
+        return entry
+
+    def _put(self, policy_str, entry):
+        with self._lock:
+            self._data[policy_str] = entry
+            self._data.move_to_end(policy_str)
+            self._shrink()
+
+    def _shrink(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int):
+        with self._lock:
+            self.maxsize = maxsize
+            self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
 
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_policy_cache = PolicyCache(int(os.environ.get('IOMT_POLICY_CACHE_SIZE', '256')))
+
+
+def get_compiled_policy(policy_str: str) -> CompiledPolicy:
+    """
+    Retourne la politique compilée depuis le cache (compilation au besoin).
+    Lève PolicyError si la politique est invalide.
+    """
+    return _policy_cache.get(policy_str)
+
+
+def configure_policy_cache(maxsize: int):
+    """
+    Modifie la taille maximale du cache (les entrées en trop sont évincées).
+    """
+    _policy_cache.resize(maxsize)
+
+
+def policy_cache_stats() -> Dict[str, int]:
+    """
+    Compteurs du cache : taille, hits, misses, évictions.
+    """
+    return _policy_cache.stats()
+
+
+def clear_policy_cache():
+    _policy_cache.clear()
+
+
+def prewarm_policy_cache(policies: Iterable[str]) -> int:
+    """
+    Pré-compile une série de politiques (ex: valeurs distinctes de
+    Record.policy_text et ABEKey.policy_blob au démarrage).
+    Retourne le nombre de politiques valides chargées.
+    """
+    loaded = 0
+    for policy_str in policies:
+        if not policy_str:
+            continue
+        try:
+            get_compiled_policy(policy_str)
+            loaded += 1
+        except PolicyError:
+            pass
+    return loaded
+
+
+# ==========================================================
+# DICTIONNAIRE D’ATTRIBUTS INTERNÉS (BITSETS)
+# ==========================================================
+#
+# Chaque attribut (en minuscules) reçoit un petit identifiant entier ;
+# un ensemble d’attributs devient un entier dont le bit i vaut 1 si
+# l’attribut i est présent. Un masque occupe quelques dizaines d’octets
+# (contre un set de chaînes) et une politique compilée le teste en
+# quelques opérations entières (CompiledPolicy.evaluate_mask).
+
+# Seules les feuilles des politiques compilées sont internées : un
+# attribut inconnu du dictionnaire n’apparaît dans aucune politique
+# compilée et reçoit le bit 0 (sans effet sur le résultat). Un masque
+# doit donc être calculé après la compilation des politiques qui
+# l’évaluent (policy_allows).
+
+# Nombre maximal d’attributs internés par processus
+MAX_ATTRIBUTES = int(os.environ.get('IOMT_MAX_ATTRIBUTES', '65536'))
+
+
+class AttributeDictionary:
+    """
+    Attribut -> bit, thread-safe et sans suppression : un identifiant
+    attribué reste valable pour toute la durée du processus. Les masques
+    ne quittent pas le processus, la numérotation n’est pas persistée.
+    Au plus max_size attributs (en minuscules) sont internés : au-delà,
+    intern() lève AttributeLimitError.
+    entries : {attribut: identifiant} déjà attribués.
+    """
+
+    def __init__(self, entries: Dict[str, int] = None, max_size: int = MAX_ATTRIBUTES):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._bits = {}    # attribut normalisé -> 1 << identifiant
+        for name, ident in (entries or {}).items():
+            self._bits[name.lower()] = 1 << ident
+        self._next = max((entries or {}).values(), default=-1) + 1
+
+    def intern(self, attrs: Iterable[str]) -> int:
+        """Masque d’attributs (feuilles de politique), internés au besoin."""
+        m = 0
+        for attr in attrs:
+            name = attr.lower()
+            bit = self._bits.get(name)
+            if bit is None:
+                with self._lock:
+                    bit = self._bits.get(name)
+                    if bit is None:
+                        if len(self._bits) >= self.max_size:
+                            raise AttributeLimitError(
+                                f'Dictionnaire d’attributs plein ({self.max_size} attributs)')
+                        bit = self._bits[name] = 1 << self._next
+                        self._next += 1
+            m |= bit
+        return m
+
+    def mask(self, attrs: Iterable[str]) -> int:
+        """Masque d’une liste d’attributs (casse ignorée, inconnus ignorés)."""
+        bits = self._bits
+        m = 0
+        for attr in attrs:
+            bit = bits.get(attr)
+            if bit is None:
+                bit = bits.get(attr.lower(), 0)
+            m |= bit
+        return m
+
+    def id(self, attr: str) -> int:
+        """Identifiant (numéro de bit) d’un attribut interné, sinon -1."""
+        return self.mask((attr,)).bit_length() - 1
+
+    def names(self, mask: int) -> List[str]:
+        with self._lock:
+            return sorted(name for name, bit in self._bits.items() if mask & bit)
+
+    def entries(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: bit.bit_length() - 1 for name, bit in self._bits.items()}
+
+    def __len__(self):
+        return len(self._bits)
+
+
+_attribute_dictionary = AttributeDictionary()
+
+
+def attribute_mask(attrs: Iterable[str]) -> int:
+    """
+    Masque (bitset) d’une liste d’attributs, pour
+    CompiledPolicy.evaluate_mask, valable dans le processus courant pour
+    les politiques compilées avant son calcul.
+    """
+    return _attribute_dictionary.mask(attrs)
+
+
+def get_attribute_dictionary() -> AttributeDictionary:
+    return _attribute_dictionary
+
+
+def policy_allows(policy: CompiledPolicy, attrs: Iterable[str]) -> bool:
+    """
+    Évalue une politique compilée sur une liste d’attributs : par masque
+    (calculé ici, après la compilation), ou sur l’ensemble des chaînes
+    si la politique n’a pas d’evaluate_mask (dictionnaire plein).
+    """
+    if policy.evaluate_mask is None:
+        return policy.evaluate({a.lower() for a in attrs})
+    return policy.evaluate_mask(_attribute_dictionary.mask(attrs))
+
+
+def _policy_satisfied(policy_str: str, attrs_list: list) -> bool:
+    """
+    Vérifie si une liste d’attributs satisfait une politique logique.
+    Politique valide = expression booléenne (and / or / not / parenthèses).
+    """
     try:
-        result = eval(safe)
-        # Accepter UNIQUEMENT un booléen True
-        return isinstance(result, bool) and result
-    except Exception:
+        policy = get_compiled_policy(policy_str)
+    except PolicyError:
         return False
+    return policy_allows(policy, attrs_list)
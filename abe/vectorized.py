@@ -0,0 +1,116 @@
+"""
+Évaluation vectorisée (NumPy) d’une politique sur des milliers d’entités.
+
+Pour les audits d’accès (toutes les clés CP, tous les records KP), les
+ensembles d’attributs sont rangés attribut par attribut (lignes des
+entités qui le portent) ; une politique compilée (mêmes règles que
+_policy_satisfied) s’évalue alors par ET / OU / comptage (seuils)
+colonne par colonne sur toutes les entités à la fois et renvoie le
+masque des entités qui la satisfont. Seules les colonnes des feuilles
+de la politique évaluée sont matérialisées : la mémoire suit le nombre
+d’attributs portés, pas entités × attributs distincts.
+"""
+from collections import OrderedDict
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+
+from abe.sim_abe import CompiledPolicy, get_compiled_policy
+
+# Colonnes booléennes gardées entre deux évaluations (feuilles communes)
+MAX_CACHED_COLUMNS = 64
+
+
+class AttributeMatrix:
+    """
+    Matrice booléenne creuse entités × attributs : pour chaque attribut
+    (en minuscules), les lignes des entités qui le portent. Les colonnes
+    sont indexées localement, sans passer par le dictionnaire d’attributs
+    du processus. ids : identifiants des entités (lignes), retournés par
+    select().
+    """
+
+    def __init__(self, attribute_lists: Iterable[Sequence[str]], ids: Sequence[int] = None):
+        rows_of = {}
+        count = 0
+        for row, attrs in enumerate(attribute_lists):
+            count = row + 1
+            for attr in attrs:
+                rows = rows_of.get(attr)
+                if rows is None:
+                    rows = rows_of.setdefault(attr.lower(), [])
+                    rows_of[attr] = rows
+                rows.append(row)
+        # Une liste par attribut normalisé (les autres graphies la partagent)
+        self._rows = {}
+        for attr, rows in rows_of.items():
+            if attr == attr.lower():
+                self._rows[attr] = np.asarray(rows, dtype=np.int32)
+        self._count = count
+        self._columns = OrderedDict()
+        self.ids = np.arange(count) if ids is None else np.asarray(ids)
+        self._none = np.zeros(count, dtype=bool)
+        self._none.flags.writeable = False
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """Octets des listes de lignes et des colonnes en cache."""
+        return (sum(rows.nbytes for rows in self._rows.values())
+                + sum(col.nbytes for col in self._columns.values()))
+
+    def _column(self, attr: str) -> np.ndarray:
+        """Colonne en lecture seule ; attribut absent de toutes les entités : zéros."""
+        col = self._columns.get(attr)
+        if col is not None:
+            self._columns.move_to_end(attr)
+            return col
+        rows = self._rows.get(attr)
+        if rows is None:
+            return self._none
+        col = np.zeros(self._count, dtype=bool)
+        col[rows] = True
+        col.flags.writeable = False
+        self._columns[attr] = col
+        if len(self._columns) > MAX_CACHED_COLUMNS:
+            self._columns.popitem(last=False)
+        return col
+
+    def _evaluate(self, node: tuple) -> np.ndarray:
+        """Vecteur booléen du nœud ; une feuille est une vue en lecture seule."""
+        kind = node[0]
+        if kind == 'attr':
+            return self._column(node[1])
+        if kind == 'not':
+            return ~self._evaluate(node[1])
+        if kind == 'thr':
+            # Nombre d’enfants satisfaits par entité, comparé au seuil
+            counts = np.zeros(len(self), dtype=np.uint8 if len(node[2]) < 256 else np.int32)
+            for child in node[2]:
+                counts += self._evaluate(child)
+            return counts >= node[1]
+
+        combine = np.logical_and if kind == 'and' else np.logical_or
+        # Feuilles d’abord (colonnes déjà calculées), sous-portes ensuite
+        children = sorted(node[1], key=lambda c: c[0] != 'attr')
+        out = self._evaluate(children[0]).copy()
+        for child in children[1:]:
+            combine(out, self._evaluate(child), out=out)
+        return out
+
+    def evaluate(self, policy: Union[str, CompiledPolicy]) -> np.ndarray:
+        """
+        Masque booléen (une valeur par entité) des entités dont les
+        attributs satisfont la politique. Lève PolicyError si la
+        politique est invalide.
+        """
+        if isinstance(policy, str):
+            policy = get_compiled_policy(policy)
+        result = self._evaluate(policy.ast)
+        return result.copy() if not result.flags.writeable or result.base is not None else result
+
+    def select(self, policy: Union[str, CompiledPolicy]) -> np.ndarray:
+        """Identifiants des entités qui satisfont la politique."""
+        return self.ids[self.evaluate(policy)]
@@ -0,0 +1,335 @@
+"""
+Questions d’accès à partir de l’index inversé des attributs (access_index).
+
+« Que peut lire cette clé ? », « qui peut lire ce record ? », « quels
+utilisateurs satisfont cette politique ? » : l’index réduit d’abord les
+candidats par intersection / union des listes d’attributs (en SQL), la
+politique n’est ensuite évaluée que sur ces candidats. Les lignes en
+file (access_index_pending) sont indexées avant chaque question.
+"""
+import json
+
+from abe.sim_abe import get_compiled_policy, policy_allows, PolicyError
+from models import (ABEKey, AccessGrant, AccessIndexPending, AccessPending, Attribute, Record, User,
+                    policy_candidates, attribute_candidates, reset_access_grants, update_access_index)
+
+
+def _keyobj(key):
+    return json.loads(bytes.fromhex(key.private_key_blob).decode())
+
+
+def _ensure_index(session):
+    if session.query(AccessIndexPending.seq).first() is not None:
+        update_access_index(session)
+
+
+def _restrict(query, column, candidates):
+    # None : pas d’élagage possible (politique avec NOT)
+    return query if candidates is None else query.filter(column.in_(candidates))
+
+
+def readable_records(session, key, page_size=1000):
+    """
+    Générateur des records (CP pour une clé CP, KP pour une clé KP) dont
+    la politique / les attributs sont satisfaits par la clé : lignes
+    (id, storage_path, created_at). Les records partagent peu de
+    politiques / ensembles d'attributs distincts : le verdict est
+    mémorisé par texte.
+    """
+    _ensure_index(session)
+    keyobj = _keyobj(key)
+    if key.key_type == 'CP':
+        attrs = keyobj.get('attributes', [])
+        candidates = attribute_candidates('cp_record', attrs)
+
+        def allowed(policy_text):
+            try:
+                return policy_allows(get_compiled_policy(policy_text or ''), attrs)
+            except PolicyError:
+                return False
+    else:
+        try:
+            policy = get_compiled_policy(keyobj.get('policy', ''))
+        except PolicyError:
+            return
+        candidates = policy_candidates('kp_record', policy.text)
+
+        def allowed(attributes_json):
+            try:
+                return policy_allows(policy, json.loads(attributes_json or '[]'))
+            except (ValueError, TypeError, AttributeError):
+                return False
+
+    text_column = Record.policy_text if key.key_type == 'CP' else Record.attributes_json
+    query = (session.query(Record.id, Record.storage_path, Record.created_at, text_column)
+             .filter(Record.encryption_type == key.key_type))
+    query = _restrict(query, Record.id, candidates).order_by(Record.id)
+    verdicts = {}
+    for row in query.yield_per(page_size):
+        ok = verdicts.get(row[3])
+        if ok is None:
+            ok = verdicts[row[3]] = allowed(row[3])
+        if ok:
+            yield row
+
+
+def readable_record_ids(session, key):
+    return [rec.id for rec in readable_records(session, key)]
+
+
+def record_readers(session, record):
+    """Ids des clés ABE (du même type que le record) capables de le lire."""
+    _ensure_index(session)
+    query = session.query(ABEKey).filter(ABEKey.key_type == record.encryption_type).order_by(ABEKey.id)
+
+    if record.encryption_type == 'CP':
+        try:
+            policy = get_compiled_policy(record.policy_text or '')
+        except PolicyError:
+            return []
+        return [key.id for key in _restrict(query, ABEKey.id, policy_candidates('cp_key', policy.text))
+                if policy_allows(policy, _keyobj(key).get('attributes', []))]
+
+    try:
+        attrs = json.loads(record.attributes_json or '[]')
+        aset = {a.lower() for a in attrs}
+    except (ValueError, TypeError, AttributeError):
+        return []
+    readers = []
+    for key in _restrict(query, ABEKey.id, attribute_candidates('kp_key', attrs)):
+        try:
+            if policy_allows(get_compiled_policy(_keyobj(key).get('policy', '')), aset):
+                readers.append(key.id)
+        except PolicyError:
+            pass
+    return readers
+
+
+def matching_users(session, policy_str):
+    """
+    Ids des utilisateurs dont les attributs (table attributes) satisfont
+    la politique. Lève PolicyError si la politique est invalide.
+    """
+    policy = get_compiled_policy(policy_str)
+    _ensure_index(session)
+    query = _restrict(session.query(User.id).order_by(User.id), User.id, policy_candidates('user', policy.text))
+    user_ids = [uid for (uid,) in query]
+    attrs = {uid: [] for uid in user_ids}
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        for uid, name, value in (session.query(Attribute.user_id, Attribute.name, Attribute.value)
+                                 .filter(Attribute.user_id.in_(chunk))):
+            attrs[uid].append(f'{name}:{value}'.replace(' ', ''))
+    return [uid for uid in user_ids if policy_allows(policy, attrs[uid])]
+
+
+def cp_key_matrix(session):
+    """
+    Matrice d'attributs de toutes les clés CP (lignes = ABEKey.id) pour
+    les audits : cp_key_matrix(session).select(politique) donne les
+    clés capables de lire un record de cette politique.
+    """
+    from abe.vectorized import AttributeMatrix
+    rows = session.query(ABEKey.id, ABEKey.private_key_blob).filter(ABEKey.key_type == 'CP').order_by(ABEKey.id)
+    ids, attrs = [], []
+    for key_id, blob in rows.yield_per(5000):
+        try:
+            key_attrs = json.loads(bytes.fromhex(blob).decode()).get('attributes', [])
+        except (ValueError, TypeError, AttributeError):
+            key_attrs = []
+        ids.append(key_id)
+        attrs.append(key_attrs)
+    return AttributeMatrix(attrs, ids)
+
+
+def kp_record_matrix(session):
+    """
+    Matrice d'attributs de tous les records KP (lignes = Record.id) :
+    kp_record_matrix(session).select(politique) donne les records
+    qu'une clé KP de cette politique peut lire.
+    """
+    from abe.vectorized import AttributeMatrix
+    rows = (session.query(Record.id, Record.attributes_json)
+            .filter(Record.encryption_type == 'KP').order_by(Record.id))
+    ids, attrs = [], []
+    for record_id, attributes_json in rows.yield_per(5000):
+        try:
+            record_attrs = json.loads(attributes_json or '[]')
+        except ValueError:
+            record_attrs = []
+        ids.append(record_id)
+        valid = isinstance(record_attrs, list) and all(isinstance(a, str) for a in record_attrs)
+        attrs.append(record_attrs if valid else [])
+    return AttributeMatrix(attrs, ids)
+
+
+# ==========================================================
+# Matrice d'accès matérialisée (access_grants)
+# ==========================================================
+#
+# Les droits ne dépendent que du texte de la politique (records CP) ou
+# des attributs (records KP) : les records sont regroupés par classe
+# (policy_text / attributes_json distincts), les politiques évaluées une
+# fois par classe sur une AttributeMatrix, puis les couples (clé, record)
+# insérés par une jointure SQL sur la classe.
+
+GRANT_CHUNK = 20000
+
+# Schéma -> colonne de classe du record
+_GRANT_SCHEMES = {'CP': 'policy_text', 'KP': 'attributes_json'}
+
+
+def _key_side(session, scheme, ids=None):
+    """[(key_id, attributs ou politique)] des clés du schéma (toutes ou `ids`)."""
+    query = (session.query(ABEKey.id, ABEKey.private_key_blob)
+             .filter(ABEKey.key_type == scheme).order_by(ABEKey.id))
+    if ids is not None:
+        query = query.filter(ABEKey.id.in_(ids))
+    out = []
+    for key_id, blob in query.yield_per(5000):
+        try:
+            keyobj = json.loads(bytes.fromhex(blob).decode())
+        except (ValueError, TypeError, AttributeError):
+            continue
+        out.append((key_id, keyobj.get('attributes', []) if scheme == 'CP' else keyobj.get('policy', '')))
+    return out
+
+
+def _class_attributes(text):
+    try:
+        attrs = json.loads(text or '[]')
+    except ValueError:
+        return []
+    return attrs if isinstance(attrs, list) and all(isinstance(a, str) for a in attrs) else []
+
+
+def _class_pairs(scheme, keys, classes):
+    """Couples (classe, key_id) où la clé lit les records de la classe."""
+    from abe.vectorized import AttributeMatrix
+    pairs = []
+    if not keys or not classes:
+        return pairs
+    if scheme == 'CP':
+        # Politiques = classes, attributs = clés
+        matrix = AttributeMatrix([attrs for _, attrs in keys], [key_id for key_id, _ in keys])
+        for text in classes:
+            try:
+                pairs.extend((text, key_id) for key_id in matrix.select(text or '').tolist())
+            except PolicyError:
+                pass
+        return pairs
+    # Politiques = clés, attributs = classes
+    matrix = AttributeMatrix([_class_attributes(text) for text in classes], list(classes))
+    for key_id, policy in keys:
+        try:
+            pairs.extend((text, key_id) for text in matrix.select(policy).tolist())
+        except PolicyError:
+            pass
+    return pairs
+
+
+def _insert_grants(conn, scheme, pairs, record_ids=None):
+    """Insère (key_id, record) pour chaque record du schéma dont la classe figure dans pairs."""
+    column = _GRANT_SCHEMES[scheme]
+    conn.exec_driver_sql('CREATE TEMP TABLE IF NOT EXISTS grant_classes (text TEXT, key_id INTEGER)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS temp.ix_grant_classes_text ON grant_classes (text)')
+    conn.exec_driver_sql('DELETE FROM grant_classes')
+    if not pairs:
+        return
+    conn.exec_driver_sql('INSERT INTO grant_classes (text, key_id) VALUES (?, ?)', pairs)
+    source = 'records r'
+    if record_ids is not None:
+        source = 'grant_records p JOIN records r ON r.id = p.id'
+    conn.exec_driver_sql(
+        f'INSERT OR IGNORE INTO access_grants (key_id, record_id) '
+        f'SELECT c.key_id, r.id FROM {source} JOIN grant_classes c ON c.text = r.{column} '
+        f'WHERE r.encryption_type = ?', (scheme,))
+    conn.exec_driver_sql('DELETE FROM grant_classes')
+
+
+def _grant_records(session, record_ids):
+    """Droits de records nouveaux : toutes les clés, classes de ces records."""
+    conn = session.connection()
+    conn.exec_driver_sql('CREATE TEMP TABLE IF NOT EXISTS grant_records (id INTEGER PRIMARY KEY)')
+    conn.exec_driver_sql('DELETE FROM grant_records')
+    conn.exec_driver_sql('INSERT INTO grant_records (id) VALUES (?)', [(rid,) for rid in record_ids])
+    for scheme, column in _GRANT_SCHEMES.items():
+        classes = [text for (text,) in conn.exec_driver_sql(
+            f'SELECT DISTINCT r.{column} FROM grant_records p JOIN records r ON r.id = p.id '
+            f'WHERE r.encryption_type = ?', (scheme,))]
+        if classes:
+            _insert_grants(conn, scheme, _class_pairs(scheme, _key_side(session, scheme), classes), record_ids)
+    conn.exec_driver_sql('DELETE FROM grant_records')
+
+
+def _grant_keys(session, key_ids):
+    """Droits de clés nouvelles : ces clés, toutes les classes de records."""
+    conn = session.connection()
+    for scheme, column in _GRANT_SCHEMES.items():
+        keys = _key_side(session, scheme, key_ids)
+        if keys:
+            classes = [text for (text,) in conn.exec_driver_sql(
+                f'SELECT DISTINCT {column} FROM records WHERE encryption_type = ?', (scheme,))]
+            _insert_grants(conn, scheme, _class_pairs(scheme, keys, classes))
+
+
+def pending_grants(session):
+    return session.query(AccessPending.seq).count()
+
+
+def update_access_grants(session, chunk=GRANT_CHUNK):
+    """
+    Applique la file access_pending par lots de `chunk` entrées, une
+    transaction par lot (les autres écrivains ne restent pas bloqués
+    pendant un recalcul complet). Chaque couple (clé, record) est couvert
+    par celle des deux lignes traitée en dernier. Retourne le nombre
+    d'entrées traitées.
+    """
+    done = 0
+    while True:
+        claimed = session.connection().exec_driver_sql(
+            'DELETE FROM access_pending WHERE seq IN '
+            '(SELECT seq FROM access_pending ORDER BY seq LIMIT ?) RETURNING entity, row_id',
+            (chunk,)).fetchall()
+        if not claimed:
+            session.commit()
+            return done
+        keys = sorted({row_id for entity, row_id in claimed if entity == 'key'})
+        records = sorted({row_id for entity, row_id in claimed if entity == 'record'})
+        if keys:
+            _grant_keys(session, keys)
+        if records:
+            _grant_records(session, records)
+        session.commit()
+        done += len(claimed)
+
+
+def rebuild_access_grants(session):
+    """Recalcule toute la matrice d'accès ; retourne le nombre de couples."""
+    reset_access_grants(session)
+    update_access_grants(session)
+    return session.query(AccessGrant).count()
+
+
+def _ensure_grants(session):
+    if session.query(AccessPending.seq).first() is not None:
+        update_access_grants(session)
+
+
+def granted_records(session, key_id):
+    """
+    Records que la clé peut déchiffrer, lus dans access_grants : lignes
+    (id, storage_path, created_at) triées par id. La file est appliquée
+    au préalable si besoin.
+    """
+    _ensure_grants(session)
+    return (session.query(Record.id, Record.storage_path, Record.created_at)
+            .join(AccessGrant, AccessGrant.record_id == Record.id)
+            .filter(AccessGrant.key_id == key_id).order_by(AccessGrant.record_id).all())
+
+
+def granted_keys(session, record_id):
+    """Ids des clés capables de déchiffrer le record (access_grants)."""
+    _ensure_grants(session)
+    return [key_id for (key_id,) in session.query(AccessGrant.key_id)
+            .filter(AccessGrant.record_id == record_id).order_by(AccessGrant.key_id)]
@@ -0,0 +1,182 @@
+"""
+Benchmark : index inversé des attributs (access_index) contre parcours complet.
+
+Base temporaire de --records records (moitié CP, moitié KP) et --keys
+clés (moitié CP, moitié KP), politiques et attributs de
+benchmarks/workload.py. Mesure :
+- le coût de l'index à l'insertion : records/s sans et avec les
+  triggers (mise en file), puis débit du calcul des entrées
+  (models.update_access_index) ;
+- « que peut lire cette clé » : access.readable_record_ids contre
+  l'ancien parcours de tous les records du type de la clé ;
+- « qui peut lire ce record » : access.record_readers contre
+  l'évaluation de toutes les clés.
+Les résultats des deux méthodes sont comparés.
+
+Usage : python benchmarks/bench_access_index.py [--records 1000000] [--keys 10000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import workload  # noqa: E402
+from abe.sim_abe import keygen_cp, keygen_kp, _policy_satisfied  # noqa: E402
+from access import readable_record_ids, record_readers  # noqa: E402
+from models import get_engine, get_session, update_access_index, User, ABEKey, Record, AccessIndex  # noqa: E402
+
+CHUNK = 50000
+
+
+def record_rows(rng, pols, count):
+    for i in range(count):
+        if i % 2:
+            yield {'sensor_id': f'sensor-{i % 100:03d}', 'encryption_type': 'CP',
+                   'policy_text': rng.choice(pols), 'attributes_json': '[]'}
+        else:
+            yield {'sensor_id': f'sensor-{i % 100:03d}', 'encryption_type': 'KP', 'policy_text': '',
+                   'attributes_json': json.dumps(workload.random_attributes(rng, rng.randint(2, 4)))}
+
+
+def insert_records(session, rows, count):
+    start = time.perf_counter()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            session.bulk_insert_mappings(Record, batch)
+            session.commit()
+            batch = []
+    if batch:
+        session.bulk_insert_mappings(Record, batch)
+        session.commit()
+    return count / (time.perf_counter() - start)
+
+
+def insert_keys(session, rng, pols, count):
+    session.bulk_insert_mappings(User, [{'username': f'user{i:06d}', 'role': 'medecin'} for i in range(count)])
+    user_ids = [uid for (uid,) in session.query(User.id).order_by(User.id)]
+    keys = []
+    for i, uid in enumerate(user_ids):
+        if i % 2:
+            policy = rng.choice(pols)
+            keys.append({'user_id': uid, 'key_type': 'KP', 'policy_blob': policy,
+                         'private_key_blob': keygen_kp(None, policy).hex()})
+        else:
+            attrs = workload.random_attributes(rng, rng.randint(2, 4))
+            keys.append({'user_id': uid, 'key_type': 'CP', 'policy_blob': '',
+                         'private_key_blob': keygen_cp(None, attrs).hex()})
+    session.bulk_insert_mappings(ABEKey, keys)
+    session.commit()
+
+
+def scan_key(session, key):
+    """Ancien bulk.readable_records : tous les records du type de la clé."""
+    keyobj = json.loads(bytes.fromhex(key.private_key_blob).decode())
+    out = []
+    for rid, policy, attrs in (session.query(Record.id, Record.policy_text, Record.attributes_json)
+                               .filter(Record.encryption_type == key.key_type).order_by(Record.id)
+                               .yield_per(5000)):
+        if key.key_type == 'CP':
+            ok = _policy_satisfied(policy or '', keyobj.get('attributes', []))
+        else:
+            ok = _policy_satisfied(keyobj.get('policy', ''), json.loads(attrs or '[]'))
+        if ok:
+            out.append(rid)
+    return out
+
+
+def scan_record(keys, record):
+    out = []
+    for key in keys:
+        if key.key_type != record.encryption_type:
+            continue
+        keyobj = json.loads(bytes.fromhex(key.private_key_blob).decode())
+        if record.encryption_type == 'CP':
+            ok = _policy_satisfied(record.policy_text or '', keyobj.get('attributes', []))
+        else:
+            ok = _policy_satisfied(keyobj.get('policy', ''), json.loads(record.attributes_json or '[]'))
+        if ok:
+            out.append(key.id)
+    return out
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--keys', type=int, default=10000)
+    parser.add_argument('--policies', type=int, default=100, help='politiques distinctes par niveau')
+    parser.add_argument('--samples', type=int, default=6, help='clés / records interrogés par type')
+    parser.add_argument('--scan-samples', type=int, default=2,
+                        help='clés mesurées aussi par parcours complet (lent)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = workload.make_rng(args.seed)
+    pols = [p for level in workload.policies(rng, args.policies).values() for p in level]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Coût d'insertion des triggers d'index (échantillon, base sans triggers)
+        sample = min(args.records, 100000)
+        bare_path = os.path.join(workdir, 'bare.db')
+        bare = get_session(bare_path)
+        for (name,) in bare.connection().exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE '%_index'").fetchall():
+            bare.connection().exec_driver_sql(f'DROP TRIGGER {name}')
+        bare.commit()
+        rate_bare = insert_records(bare, record_rows(workload.make_rng(1), pols, sample), sample)
+        bare.close()
+        get_engine(bare_path).dispose()
+
+        db_path = os.path.join(workdir, 'bench.db')
+        session = get_session(db_path)
+        rate = insert_records(session, record_rows(rng, pols, args.records), args.records)
+        _, index_ms = timed(update_access_index, session)
+        insert_keys(session, rng, pols, args.keys)
+        update_access_index(session)
+        postings = session.query(AccessIndex).count()
+        print(f'insertion : {rate_bare:.0f} records/s sans index, {rate:.0f} records/s avec la file, '
+              f'indexation {args.records / index_ms * 1000:.0f} records/s ({postings} entrées d’index)')
+
+        print(f"\n{'question':<34} {'type':>4} {'index ms':>9} {'parcours ms':>12} {'résultat':>9}")
+        for key_type in ('CP', 'KP'):
+            keys = (session.query(ABEKey).filter(ABEKey.key_type == key_type)
+                    .order_by(ABEKey.id).limit(args.samples).all())
+            for i, key in enumerate(keys):
+                ids, ms = timed(readable_record_ids, session, key)
+                scan_ms = ''
+                if i < args.scan_samples:
+                    expected, scan = timed(scan_key, session, key)
+                    if expected != ids:
+                        sys.exit(f'résultats différents pour la clé {key.id}')
+                    scan_ms = f'{scan:.0f}'
+                print(f"{'que peut lire la clé ' + str(key.id):<34} {key_type:>4} {ms:>9.1f} {scan_ms:>12} {len(ids):>9}")
+
+        all_keys = session.query(ABEKey).all()
+        for enc in ('CP', 'KP'):
+            records = (session.query(Record).filter(Record.encryption_type == enc)
+                       .order_by(Record.id).limit(args.samples).all())
+            for record in records:
+                readers, ms = timed(record_readers, session, record)
+                expected, scan = timed(scan_record, all_keys, record)
+                if sorted(readers) != expected:
+                    sys.exit(f'résultats différents pour le record {record.id}')
+                print(f"{'qui peut lire le record ' + str(record.id):<34} {enc:>4} {ms:>9.1f} {scan:>12.0f} {len(readers):>9}")
+        session.close()
+        get_engine(db_path).dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark : chiffrement par lots vs appel par lecture.
+
+Simule une passerelle qui envoie des rafales de petites lectures de
+signes vitaux sous une même politique et compare encrypt_cp (une clé
+de données par lecture) à encrypt_cp_batch pour plusieurs fenêtres de
+réutilisation de clé.
+
+Usage : python benchmarks/bench_batch.py [--readings 20000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from abe.sim_abe import setup_abe, encrypt_cp, encrypt_cp_batch  # noqa: E402
+
+POLICY = 'role:medecin and service:cardio'
+
+
+def make_readings(n, rng):
+    return [json.dumps({'sensor': 'sensor-001', 'seq': i, 'hr': rng.randint(50, 140),
+                        'spo2': rng.randint(88, 100), 'temp': round(rng.uniform(35.5, 40), 1)}).encode()
+            for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readings', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500, help='lectures par appel batch')
+    args = parser.parse_args()
+
+    state = setup_abe()
+    readings = make_readings(args.readings, random.Random(0))
+
+    start = time.perf_counter()
+    for r in readings:
+        encrypt_cp(state, POLICY, r)
+    base = args.readings / (time.perf_counter() - start)
+    print(f"{'mode':>22} {'lectures/s':>12} {'gain':>6}")
+    print(f"{'encrypt_cp':>22} {base:>12.0f} {1:>5.1f}x")
+
+    for key_reuse in (1, 16, 256):
+        start = time.perf_counter()
+        for i in range(0, len(readings), args.batch):
+            encrypt_cp_batch(state, POLICY, readings[i:i + args.batch], key_reuse=key_reuse)
+        rate = args.readings / (time.perf_counter() - start)
+        print(f"{f'batch key_reuse={key_reuse}':>22} {rate:>12.0f} {rate / base:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark : ensembles d’attributs en bitsets contre sets de chaînes.
+
+Pour --keys clés (attributs de benchmarks/workload.py, relus depuis
+leur JSON comme dans l’application) :
+- mémoire par clé : set de chaînes en minuscules contre masque entier ;
+- évaluation d’une politique (simple / moyenne / complexe) sur toutes
+  les clés : CompiledPolicy.evaluate(set) contre evaluate_mask(masque) ;
+- _policy_satisfied(politique, liste) : construction du set à chaque
+  appel (ancienne version) contre masque via le dictionnaire interné.
+
+Usage : python benchmarks/bench_bitset.py [--keys 10000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import workload  # noqa: E402
+from abe.sim_abe import (_policy_satisfied, attribute_mask, get_attribute_dictionary,  # noqa: E402
+                         get_compiled_policy, PolicyError)
+
+
+def legacy_policy_satisfied(policy_str, attrs_list):
+    """_policy_satisfied avant les masques : set construit à chaque appel."""
+    try:
+        policy = get_compiled_policy(policy_str)
+    except PolicyError:
+        return False
+    return policy.evaluate(set(a.lower() for a in attrs_list))
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return kept, size
+
+
+def per_call_us(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (repeat * len(items)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keys', type=int, default=10000)
+    parser.add_argument('--attrs', type=int, default=4, help='attributs par clé')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = workload.make_rng(args.seed)
+    blobs = [json.dumps({'attributes': workload.random_attributes(rng, args.attrs)}) for _ in range(args.keys)]
+    lists = [json.loads(blob)['attributes'] for blob in blobs]
+    # Dictionnaire déjà rempli par les politiques compilées (cas courant) :
+    # les masques calculés ensuite voient toutes les feuilles
+    get_attribute_dictionary().intern(workload.all_attributes())
+
+    sets, set_bytes = measure_memory(lambda: [set(a.lower() for a in json.loads(b)['attributes']) for b in blobs])
+    masks, mask_bytes = measure_memory(lambda: [attribute_mask(json.loads(b)['attributes']) for b in blobs])
+    print(f'mémoire par clé : set {set_bytes / args.keys:.0f} o, masque {mask_bytes / args.keys:.0f} o')
+
+    print(f"\n{'politique':<10} {'set µs/clé':>11} {'masque µs/clé':>14} {'gain':>6} "
+          f"{'ancien _policy_satisfied µs':>28} {'nouveau µs':>11} {'gain':>6}")
+    pols = workload.policies(rng, 20)
+    for level, policies in pols.items():
+        compiled = [get_compiled_policy(p) for p in policies]
+        t_set = t_mask = t_old = t_new = 0.0
+        for policy, text in zip(compiled, policies):
+            expected = [policy.evaluate(s) for s in sets]
+            if [policy.evaluate_mask(m) for m in masks] != expected:
+                sys.exit(f'résultats différents : {text}')
+            t_set += per_call_us(policy.evaluate, sets, args.repeat)
+            t_mask += per_call_us(policy.evaluate_mask, masks, args.repeat)
+            t_old += per_call_us(lambda attrs: legacy_policy_satisfied(text, attrs), lists, 1)
+            t_new += per_call_us(lambda attrs: _policy_satisfied(text, attrs), lists, 1)
+        n = len(policies)
+        print(f'{level:<10} {t_set / n:>11.3f} {t_mask / n:>14.3f} {t_set / t_mask:>5.1f}x '
+              f'{t_old / n:>28.3f} {t_new / n:>11.3f} {t_old / t_new:>5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
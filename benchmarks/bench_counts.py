@@ -0,0 +1,58 @@
+"""
+Benchmark : compteurs de la barre latérale (models.table_counts).
+
+Compare, pour des tables de taille croissante, l’ancien
+App.refresh_status_counts (deux SELECT COUNT(*)) à la lecture des
+compteurs tenus par triggers, ainsi que le recalcul périodique
+(reconcile_counts).
+
+Usage : python benchmarks/bench_counts.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models import get_engine, get_session, User, Record, table_counts, reconcile_counts  # noqa: E402
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        session = get_session(db_path)
+        print(f"{'records':>9} {'COUNT(*) ms':>12} {'compteurs ms':>13} {'recalcul ms':>12}")
+        for size in sorted(args.sizes):
+            have = session.query(Record).count()
+            for first in range(have, size, 50000):
+                count = min(50000, size - first)
+                session.bulk_insert_mappings(Record, [{'sensor_id': 's', 'encryption_type': 'CP',
+                                                       'policy_text': 'role:medecin'}] * count)
+                session.bulk_insert_mappings(User, [{'username': f'user{first + i}', 'role': 'medecin'}
+                                                    for i in range(0, count, 10)])
+                session.commit()
+
+            legacy = timed(lambda: (session.query(User).count(), session.query(Record).count()))
+            cached = timed(lambda: table_counts(session))
+            recount = timed(lambda: reconcile_counts(session), repeat=3)
+            print(f'{size:>9} {legacy:>12.2f} {cached:>13.3f} {recount:>12.2f}')
+        session.close()
+        get_engine(db_path).dispose()
+
+
+if __name__ == '__main__':
+    main()
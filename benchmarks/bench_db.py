@@ -0,0 +1,100 @@
+"""
+Benchmark : moteur SQLite partagé et pragmas (models.get_engine).
+
+Compare l’ancienne configuration (nouveau moteur à chaque get_session,
+journal par défaut, synchronous=FULL) au moteur en cache configuré par
+models.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, cache, mmap) :
+ouverture de session, insertions avec un commit par lecture (comme
+IoMTPage.send_reading) et relecture de la liste des enregistrements.
+Le moteur « ancien » n’active que les clés étrangères : il vérifie au
+passage qu’une base migrée reste modifiable par une connexion qui
+n’enregistre rien (triggers en SQL pur).
+
+Usage : python benchmarks/bench_db.py [--records 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models  # noqa: E402
+from models import Base, Record, get_engine, get_session, migrate  # noqa: E402
+
+
+def _foreign_keys_only(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+_legacy_engines = []
+
+
+def legacy_session(db_path):
+    """Ancien get_session : moteur, schéma et migration à chaque appel."""
+    engine = create_engine('sqlite:///' + db_path, connect_args={'check_same_thread': False})
+    event.listen(engine, 'connect', _foreign_keys_only)
+    _legacy_engines.append(engine)
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    return sessionmaker(bind=engine)()
+
+
+def run(open_session, n_sessions, n_records):
+    timings = {}
+
+    start = time.perf_counter()
+    for _ in range(n_sessions):
+        open_session().close()
+    timings['sessions/s'] = n_sessions / (time.perf_counter() - start)
+
+    session = open_session()
+    start = time.perf_counter()
+    for i in range(n_records):
+        session.add(Record(sensor_id=f'sensor{i % 50}', storage_path=f'/tmp/{i}.bin',
+                           encryption_type='CP', policy_text='role:medecin and dept:cardio',
+                           attributes_json=''))
+        session.commit()
+    timings['insert/s'] = n_records / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(5):
+        session.expunge_all()
+        rows = session.query(Record).order_by(Record.created_at.desc()).all()
+    timings['lecture/s'] = 5 * len(rows) / (time.perf_counter() - start)
+    session.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        legacy_path = os.path.join(workdir, 'legacy.db')
+        tuned_path = os.path.join(workdir, 'tuned.db')
+
+        results = [('ancien', run(lambda: legacy_session(legacy_path), args.sessions, args.records)),
+                   ('pragmas', run(lambda: get_session(tuned_path), args.sessions, args.records))]
+        get_engine(tuned_path).dispose()
+        for engine in _legacy_engines:
+            engine.dispose()
+
+        print(f'{args.records} enregistrements, un commit par insertion')
+        print(f"{'moteur':>10} {'sessions/s':>11} {'insert/s':>10} {'lecture/s':>11}")
+        for name, t in results:
+            print(f"{name:>10} {t['sessions/s']:>11.0f} {t['insert/s']:>10.0f} {t['lecture/s']:>11.0f}")
+        print('pragmas :', ', '.join(f'{k}={v}' for k, v in models.SQLITE_PRAGMAS.items()))
+
+
+if __name__ == '__main__':
+    main()
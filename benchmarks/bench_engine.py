@@ -0,0 +1,69 @@
+"""
+Benchmark : montée en charge du moteur parallèle (abe/engine.py).
+
+Construit un corpus de fichiers .bin chiffrés puis les déchiffre avec
+CryptoEngine de 1 à N workers, en mode thread et process.
+
+Usage : python benchmarks/bench_engine.py [--files 64] [--size-kb 1024] [--max-workers N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from abe.sim_abe import setup_abe, encrypt_cp, keygen_cp  # noqa: E402
+from abe.engine import CryptoEngine  # noqa: E402
+
+POLICY = 'role:medecin and service:cardio'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=64)
+    parser.add_argument('--size-kb', type=int, default=1024)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    state = setup_abe()
+    sk = keygen_cp(state, ['role:medecin', 'service:cardio'])
+    total_mb = args.files * args.size_kb / 1024
+
+    with tempfile.TemporaryDirectory() as corpus:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(corpus, f'{i}.bin')
+            with open(path, 'wb') as f:
+                f.write(encrypt_cp(state, POLICY, os.urandom(args.size_kb * 1024))[0])
+            paths.append(path)
+
+        print(f'Corpus : {args.files} fichiers, {total_mb:.0f} Mo')
+        print(f"{'mode':>8} {'workers':>7} {'fichiers/s':>11} {'Mo/s':>8} {'accélération':>13}")
+        workers = 1
+        counts = []
+        while workers <= args.max_workers:
+            counts.append(workers)
+            workers *= 2
+        if counts[-1] != args.max_workers:
+            counts.append(args.max_workers)
+
+        for kind in ('thread', 'process'):
+            base = None
+            for n in counts:
+                with CryptoEngine(state, workers=n, kind=kind) as engine:
+                    # Amorçage du pool (démarrage des processus)
+                    list(engine.decrypt_files('CP', sk, enumerate(paths[:n])))
+                    start = time.perf_counter()
+                    for _, pt in engine.decrypt_files('CP', sk, enumerate(paths)):
+                        assert pt is not None
+                    elapsed = time.perf_counter() - start
+                base = base or elapsed
+                print(f'{kind:>8} {n:>7} {args.files / elapsed:>11.1f} '
+                      f'{total_mb / elapsed:>8.1f} {base / elapsed:>12.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark : enveloppe binaire vs ancien format JSON + ':::' + Fernet.
+
+Pour chaque record de la base (politique / attributs réels), construit
+les deux formats et compare taille, temps de lecture de l’en-tête et
+temps de déchiffrement complet. La base est lue sur une copie : la
+migration faite à l’ouverture ne modifie pas le fichier d’origine.
+
+Usage : python benchmarks/bench_envelope.py [--db data.db] [--size 4096]
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from abe.sim_abe import (setup_abe, encrypt_cp, encrypt_kp, decrypt_cp, decrypt_kp,  # noqa: E402
+                         keygen_cp, keygen_kp, parse_envelope, _wrap_message)
+from models import get_engine, get_session, Record  # noqa: E402
+
+
+def legacy_payload(state, meta_fields, plaintext):
+    """Ancien format, reproduit à l’identique pour la comparaison."""
+    data_key = Fernet.generate_key()
+    ct = Fernet(data_key).encrypt(plaintext)
+    wrapped_key = _wrap_message(state, data_key)
+    meta = dict(meta_fields, wrapped_key_b64=base64.b64encode(wrapped_key).decode())
+    return json.dumps(meta).encode() + b':::' + ct
+
+
+def legacy_parse(blob):
+    meta_raw, ct = blob.split(b':::', 1)
+    meta = json.loads(meta_raw.decode())
+    return meta, base64.b64decode(meta['wrapped_key_b64']), ct
+
+
+def per_call_us(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=os.path.join(ROOT, 'data.db'))
+    parser.add_argument('--size', type=int, default=4096,
+                        help='taille du clair si le fichier du record est absent')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        copy = os.path.join(workdir, 'bench.db')
+        shutil.copy(args.db, copy)
+        session = get_session(copy)
+        records = session.query(Record).order_by(Record.id).all()
+        session.close()
+        get_engine(copy).dispose()
+    if not records:
+        print('Aucun record dans la base')
+        return
+
+    state = setup_abe()
+    print(f"{'record':>6} {'clair':>9} {'legacy':>9} {'binaire':>9} {'gain':>6} "
+          f"{'en-tête leg. µs':>16} {'en-tête bin. µs':>16} {'déch. leg. µs':>14} {'déch. bin. µs':>14}")
+    totals = [0, 0]
+    for r in records:
+        size = args.size
+        if r.storage_path and os.path.exists(r.storage_path):
+            size = os.path.getsize(r.storage_path)
+        plaintext = os.urandom(size)
+
+        if r.encryption_type == 'CP':
+            policy = r.policy_text or ''
+            sk = keygen_cp(state, sorted(t for t in policy.replace('(', ' ').replace(')', ' ').split() if ':' in t))
+            new, _ = encrypt_cp(state, policy, plaintext)
+            old = legacy_payload(state, {'policy': policy}, plaintext)
+            decrypt = decrypt_cp
+        else:
+            attrs = json.loads(r.attributes_json or '[]')
+            sk = keygen_kp(state, ' or '.join(attrs) or 'role:aucun')
+            new, _ = encrypt_kp(state, attrs, plaintext)
+            old = legacy_payload(state, {'attributes': attrs}, plaintext)
+            decrypt = decrypt_kp
+
+        totals[0] += len(old)
+        totals[1] += len(new)
+        print(f'{r.id:>6} {size:>9} {len(old):>9} {len(new):>9} {1 - len(new) / len(old):>6.1%} '
+              f'{per_call_us(lambda: legacy_parse(old), args.repeat):>16.1f} '
+              f'{per_call_us(lambda: parse_envelope(new), args.repeat):>16.1f} '
+              f'{per_call_us(lambda: decrypt(state, sk, old), args.repeat):>14.1f} '
+              f'{per_call_us(lambda: decrypt(state, sk, new), args.repeat):>14.1f}')
+
+    print(f'Total : legacy {totals[0]} o, binaire {totals[1]} o '
+          f'({1 - totals[1] / totals[0]:.1%} de moins)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark : passerelle asyncio (gateway.py) sous charge.
+
+Démarre la passerelle dans le processus (base et stockage temporaires)
+puis la charge en TCP et en HTTP avec un nombre croissant de
+connexions : débit, latences p50 / p99 (envoi -> acquittement après
+commit) et réponses « occupé ».
+
+Usage : python benchmarks/bench_gateway.py [--connections 10 50 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gateway import Gateway, run_load, ACK_BUSY  # noqa: E402
+from ingest import Ingestor, SensorRules  # noqa: E402
+from models import get_engine, get_session, load_abe_state  # noqa: E402
+
+RULES = [{'sensor': 'sensor-0*', 'mode': 'CP', 'policy': 'role:medecin and service:cardio'},
+         {'sensor': '*', 'mode': 'KP', 'attributes': ['type:vitals']}]
+
+
+async def bench(workdir, args):
+    db_path = os.path.join(workdir, 'bench.db')
+    session = get_session(db_path)
+    ingestor = Ingestor(session, load_abe_state(session), SensorRules(RULES),
+                        os.path.join(workdir, 'storage'), batch_size=500, batch_interval=0.02)
+    gateway = Gateway(ingestor, workers=args.workers, max_queue=args.max_queue)
+    tcp, http = await gateway.start(tcp=('127.0.0.1', 0), http=('127.0.0.1', 0))
+
+    print(f"{'protocole':>9} {'connexions':>10} {'lectures/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'occupé':>7}")
+    for connections in args.connections:
+        for name, target in (('tcp', {'tcp': tcp}), ('http', {'http': http})):
+            readings = max(1, args.total // connections)
+            result = await run_load(connections=connections, readings=readings, size=args.size, **target)
+            busy = result['codes'].get(ACK_BUSY, 0) + result['codes'].get(503, 0)
+            print(f"{name:>9} {connections:>10} {result['rate']:>10.0f} {result['p50_ms']:>8.1f} "
+                  f"{result['p99_ms']:>8.1f} {busy:>7}")
+    print(f"{gateway.counts['stored']} lectures en {gateway.counts['commits']} transactions")
+    await gateway.close()
+    session.close()
+    get_engine(db_path).dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--total', type=int, default=5000, help='lectures par mesure')
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-queue', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(bench(workdir, args))
+
+
+if __name__ == '__main__':
+    main()
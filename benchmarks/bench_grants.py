@@ -0,0 +1,133 @@
+"""
+Benchmark : matrice d’accès matérialisée (access_grants).
+
+Base temporaire de --records records et --keys clés (moitié CP, moitié
+KP, benchmarks/workload.py). Mesure :
+- le recalcul complet (access.rebuild_access_grants) et la taille obtenue ;
+- « quels records puis-je ouvrir » : access.granted_records contre
+  access.readable_record_ids (index inversé + évaluation) ;
+- le coût incrémental : un record, un lot de 500 records (lot
+  d’ingestion), une clé CP, une clé KP (insertion puis
+  update_access_grants), suppression d’un record et d’une clé.
+
+Usage : python benchmarks/bench_grants.py [--records 100000] [--keys 1000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import workload  # noqa: E402
+from abe.sim_abe import keygen_cp, keygen_kp  # noqa: E402
+from access import (granted_records, readable_record_ids, rebuild_access_grants,  # noqa: E402
+                    update_access_grants)
+from models import get_engine, get_session, load_abe_state, User, ABEKey, Record  # noqa: E402
+
+
+def record_row(rng, pols, i):
+    if i % 2:
+        return {'sensor_id': f'sensor-{i % 100:03d}', 'encryption_type': 'CP',
+                'policy_text': rng.choice(pols), 'attributes_json': '[]'}
+    return {'sensor_id': f'sensor-{i % 100:03d}', 'encryption_type': 'KP', 'policy_text': '',
+            'attributes_json': json.dumps(workload.random_attributes(rng, rng.randint(2, 4)))}
+
+
+def key_row(rng, pols, user_id, key_type):
+    if key_type == 'KP':
+        policy = rng.choice(pols)
+        return {'user_id': user_id, 'key_type': 'KP', 'policy_blob': policy,
+                'private_key_blob': keygen_kp(None, policy).hex()}
+    return {'user_id': user_id, 'key_type': 'CP', 'policy_blob': '',
+            'private_key_blob': keygen_cp(None, workload.random_attributes(rng, rng.randint(2, 4))).hex()}
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--policies', type=int, default=100, help='politiques distinctes par niveau')
+    parser.add_argument('--samples', type=int, default=4, help='clés interrogées par type')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = workload.make_rng(args.seed)
+    pols = [p for level in workload.policies(rng, args.policies).values() for p in level]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        session = get_session(db_path)
+        load_abe_state(session)
+        for first in range(0, args.records, 50000):
+            session.bulk_insert_mappings(Record, [record_row(rng, pols, i)
+                                                  for i in range(first, min(first + 50000, args.records))])
+            session.commit()
+        session.bulk_insert_mappings(User, [{'username': f'user{i:06d}'} for i in range(args.keys)])
+        user_ids = [uid for (uid,) in session.query(User.id).order_by(User.id)]
+        session.bulk_insert_mappings(ABEKey, [key_row(rng, pols, uid, 'KP' if i % 2 else 'CP')
+                                              for i, uid in enumerate(user_ids)])
+        session.commit()
+
+        grants, ms = timed_ms(lambda: rebuild_access_grants(session))
+        size = sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+        print(f'recalcul complet : {ms / 1000:.1f} s, {grants} couples (clé, record), '
+              f'{grants / args.keys:.0f} records par clé, base {size / 1e6:.0f} Mo')
+
+        print(f"\n{'clé':>6} {'type':>4} {'access_grants ms':>17} {'index + évaluation ms':>22} {'records':>8}")
+        for key_type in ('CP', 'KP'):
+            for key in (session.query(ABEKey).filter(ABEKey.key_type == key_type)
+                        .order_by(ABEKey.id).limit(args.samples)):
+                rows, ms = timed_ms(lambda: granted_records(session, key.id))
+                ids, scan = timed_ms(lambda: readable_record_ids(session, key))
+                if [r.id for r in rows] != ids:
+                    sys.exit(f'résultats différents pour la clé {key.id}')
+                print(f'{key.id:>6} {key_type:>4} {ms:>17.1f} {scan:>22.1f} {len(rows):>8}')
+
+        print(f"\n{'mise à jour incrémentale':<28} {'insertion ms':>13} {'droits ms':>10}")
+        counter = [args.records]
+
+        def add_records(count):
+            rows = [record_row(rng, pols, counter[0] + i) for i in range(count)]
+            counter[0] += count
+            session.bulk_insert_mappings(Record, rows)
+            session.commit()
+
+        def add_key(key_type):
+            user = User(username=f'new{counter[0]}')
+            counter[0] += 1
+            session.add(user)
+            session.flush()
+            session.bulk_insert_mappings(ABEKey, [key_row(rng, pols, user.id, key_type)])
+            session.commit()
+
+        for label, write in (('1 record', lambda: add_records(1)),
+                             ('500 records', lambda: add_records(500)),
+                             ('1 clé CP', lambda: add_key('CP')),
+                             ('1 clé KP', lambda: add_key('KP'))):
+            _, insert = timed_ms(write)
+            _, update = timed_ms(lambda: update_access_grants(session))
+            print(f'{label:<28} {insert:>13.1f} {update:>10.1f}')
+
+        record = session.query(Record).order_by(Record.id.desc()).first()
+        _, ms = timed_ms(lambda: (session.delete(record), session.commit()))
+        print(f"{'suppression d’un record':<28} {ms:>13.1f} {'(cascade)':>10}")
+        key = session.query(ABEKey).order_by(ABEKey.id).first()
+        _, ms = timed_ms(lambda: (session.delete(key), session.commit()))
+        print(f"{'suppression d’une clé':<28} {ms:>13.1f} {'(cascade)':>10}")
+        session.close()
+        get_engine(db_path).dispose()
+
+
+if __name__ == '__main__':
+    main()
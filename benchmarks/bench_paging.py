@@ -0,0 +1,90 @@
+"""
+Benchmark : listes paginées par clé (models.iter_records / records_page).
+
+Pour des tables de taille croissante, compare l’ancien chargement
+(.all() sur toute la table) à la pagination par clé : délai avant la
+première page affichable, pic mémoire Python (tracemalloc) et coût
+d’une page lointaine (OFFSET contre reprise après la dernière clé).
+
+Usage : python benchmarks/bench_paging.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models import (get_engine, get_session, Record, DEFAULT_PAGE_SIZE,  # noqa: E402
+                    iter_record_pages, records_page)
+
+COLUMNS = (Record.id, Record.sensor_id, Record.encryption_type, Record.policy_text,
+           Record.attributes_json, Record.created_at)
+
+
+def populate(session, target):
+    have = session.query(Record).count()
+    start = datetime.datetime(2024, 1, 1)
+    for first in range(have, target, 50000):
+        session.bulk_insert_mappings(Record, [
+            {'sensor_id': f'sensor{i % 200}', 'storage_path': f'storage/{i}.bin',
+             'encryption_type': 'CP' if i % 2 else 'KP',
+             'policy_text': 'role:medecin and service:cardio' if i % 2 else '',
+             'attributes_json': '' if i % 2 else '["role:medecin"]',
+             'created_at': start + datetime.timedelta(seconds=i)}
+            for i in range(first, min(first + 50000, target))])
+        session.commit()
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        session = get_session(db_path)
+        print(f"{'records':>9} {'.all() s':>9} {'.all() Mo':>10} {'1re page s':>11} "
+              f"{'1re page Mo':>12} {'OFFSET s':>9} {'keyset s':>9}")
+        for size in sorted(args.sizes):
+            populate(session, size)
+            session.expunge_all()
+
+            full_t, full_mem = measure(lambda: session.query(Record)
+                                       .order_by(Record.created_at.desc()).all())
+            session.expunge_all()
+            first_t, first_mem = measure(lambda: next(iter_record_pages(session, args.page_size, COLUMNS)))
+
+            # Page lointaine (fin de liste) : saut OFFSET contre reprise par clé
+            offset = max(0, size - args.page_size)
+            start = time.perf_counter()
+            page = records_page(session, None, args.page_size, COLUMNS, offset=offset)
+            offset_t = time.perf_counter() - start
+            after = (page[0].created_at, page[0].id)
+            start = time.perf_counter()
+            records_page(session, after, args.page_size, COLUMNS)
+            keyset_t = time.perf_counter() - start
+
+            print(f'{size:>9} {full_t:>9.2f} {full_mem:>10.1f} {first_t:>11.4f} '
+                  f'{first_mem:>12.2f} {offset_t:>9.4f} {keyset_t:>9.4f}')
+        session.close()
+        get_engine(db_path).dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark : évaluation des politiques d’accès.
+
+Compare l’ancienne évaluation (regex + re.sub + eval) au compilateur
+de politiques de abe/sim_abe.py, pour des politiques de 2 à 200 feuilles.
+
+Usage : python benchmarks/bench_policy.py [--seconds 0.5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from abe.sim_abe import _policy_satisfied, compile_policy  # noqa: E402
+
+
+def legacy_policy_satisfied(policy_str, attrs_list):
+    """Implémentation d’origine (regex + eval), conservée pour comparaison."""
+    if not policy_str or policy_str.strip() == '':
+        return False
+    expr = policy_str.lower().strip()
+    if expr.startswith('[') or expr.startswith('{'):
+        return False
+    aset = set(a.lower() for a in attrs_list)
+    tokens = re.findall(r'[\w:]+', expr)
+    tokens = [t for t in tokens if ':' in t]
+    replaced = expr
+    for t in set(tokens):
+        replaced = re.sub(r'\b' + re.escape(t) + r'\b', str(t in aset), replaced)
+    safe = replaced.replace('true', 'True').replace('false', 'False')
+    if '[' in safe or ']' in safe or '{' in safe or '}' in safe:
+        return False
+    try:
+        result = eval(safe)
+        return isinstance(result, bool) and result
+    except Exception:
+        return False
+
+
+def make_policy(n_leaves, rng):
+    """Politique aléatoire : ET de groupes OU de 2 à 4 attributs."""
+    leaves = [f'attr{i}:v{rng.randint(0, 9)}' for i in range(n_leaves)]
+    groups, i = [], 0
+    while i < n_leaves:
+        size = rng.randint(2, 4)
+        groups.append('(' + ' or '.join(leaves[i:i + size]) + ')')
+        i += size
+    return ' and '.join(groups)
+
+
+def rate(fn, seconds):
+    n, start = 0, time.perf_counter()
+    while True:
+        for _ in range(50):
+            fn()
+        n += 50
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    attrs = [f'attr{i}:v{rng.randint(0, 9)}' for i in range(200)]
+
+    print(f"{'feuilles':>8} {'legacy/s':>12} {'compilé/s':>12} {'pré-compilé/s':>14} {'gain':>7}")
+    for n in (2, 5, 10, 20, 50, 100, 200):
+        policy = make_policy(n, rng)
+        assert legacy_policy_satisfied(policy, attrs) == _policy_satisfied(policy, attrs)
+
+        legacy = rate(lambda: legacy_policy_satisfied(policy, attrs), args.seconds)
+        full = rate(lambda: _policy_satisfied(policy, attrs), args.seconds)
+        compiled = compile_policy(policy)
+        aset = set(a.lower() for a in attrs)
+        pre = rate(lambda: compiled.evaluate(aset), args.seconds)
+        print(f'{n:>8} {legacy:>12.0f} {full:>12.0f} {pre:>14.0f} {pre / legacy:>6.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark : latence d’un accès refusé sur des records de plusieurs Mo.
+
+Compare l’ancien chemin de IoMTPage.attempt_decrypt (lecture complète du
+fichier puis decrypt_cp) au contrôle sur l’en-tête seul (check_access_cp)
+et au pré-filtre sur les métadonnées du record (check_access_meta).
+Les fichiers sont dans le cache disque : les chiffres sont des minima.
+
+Usage : python benchmarks/bench_prefilter.py [--sizes-mb 1 16 64]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from abe.sim_abe import (setup_abe, encrypt_cp_stream, decrypt_cp, decrypt_cp_stream,  # noqa: E402
+                         keygen_cp, check_access_cp, check_access_meta)
+
+POLICY = 'role:medecin and service:cardio'
+
+
+def latency_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    state = setup_abe()
+    denied = keygen_cp(state, ['role:infirmier', 'service:cardio'])
+
+    def full_read(path):
+        with open(path, 'rb') as f:
+            assert decrypt_cp(state, denied, f.read()) is None
+
+    print(f"{'taille Mo':>9} {'lecture+decrypt ms':>19} {'decrypt_stream ms':>18} "
+          f"{'en-tête ms':>11} {'métadonnées ms':>15}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size_mb in args.sizes_mb:
+            src, enc = os.path.join(workdir, 'src.raw'), os.path.join(workdir, 'rec.bin')
+            with open(src, 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            encrypt_cp_stream(state, POLICY, src, enc)
+            out = os.path.join(workdir, 'plain.bin')
+
+            print(f'{size_mb:>9} '
+                  f'{latency_ms(lambda: full_read(enc), args.repeat):>19.3f} '
+                  f'{latency_ms(lambda: decrypt_cp_stream(state, denied, enc, out), args.repeat):>18.3f} '
+                  f'{latency_ms(lambda: check_access_cp(state, denied, enc), args.repeat):>11.3f} '
+                  f'{latency_ms(lambda: check_access_meta(state, denied, "CP", POLICY, "[]"), args.repeat):>15.3f}')
+            assert not os.path.exists(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark : rafraîchissement incrémental (models.changes_since).
+
+Après l’insertion d’un record, compare la relecture complète de la
+liste (ancien refresh_records, O(N)) à la lecture du journal des
+modifications puis des seules lignes changées (O(delta)), pour des
+tables de taille croissante. Mesure aussi le surcoût des triggers du
+journal sur des insertions groupées.
+
+Usage : python benchmarks/bench_refresh.py [--sizes 10000 100000]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models import (get_engine, get_session, Record, iter_records,  # noqa: E402
+                    change_watermark, changes_since)
+
+COLUMNS = (Record.id, Record.sensor_id, Record.encryption_type, Record.policy_text,
+           Record.attributes_json, Record.created_at)
+
+
+def rows(first, count):
+    start = datetime.datetime(2024, 1, 1)
+    return [{'sensor_id': f'sensor{i % 200}', 'storage_path': f'storage/{i}.bin',
+             'encryption_type': 'CP', 'policy_text': 'role:medecin and service:cardio',
+             'attributes_json': '', 'created_at': start + datetime.timedelta(seconds=i)}
+            for i in range(first, first + count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        session = get_session(db_path)
+
+        # Surcoût des triggers : insertions groupées avec / sans journal
+        start = time.perf_counter()
+        session.bulk_insert_mappings(Record, rows(0, 20000))
+        session.commit()
+        with_log = time.perf_counter() - start
+        triggers = session.connection().exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND tbl_name='records'").fetchall()
+        for name, _ in triggers:
+            session.connection().exec_driver_sql(f'DROP TRIGGER {name}')
+        start = time.perf_counter()
+        session.bulk_insert_mappings(Record, rows(20000, 20000))
+        session.commit()
+        without_log = time.perf_counter() - start
+        for _, sql in triggers:
+            session.connection().exec_driver_sql(sql)
+        session.commit()
+        print(f'20000 insertions : {without_log:.2f} s sans journal, {with_log:.2f} s avec')
+
+        print(f"{'records':>9} {'complet s':>10} {'incrémental s':>14}")
+        for size in sorted(args.sizes):
+            have = session.query(Record).count()
+            if size > have:
+                session.bulk_insert_mappings(Record, rows(have, size - have))
+                session.commit()
+            watermark = change_watermark(session)
+            session.add(Record(**rows(size, 1)[0]))
+            session.commit()
+
+            start = time.perf_counter()
+            sum(1 for _ in iter_records(session, columns=COLUMNS))
+            full = time.perf_counter() - start
+
+            start = time.perf_counter()
+            _, ids = changes_since(session, 'records', watermark)
+            session.query(*COLUMNS).filter(Record.id.in_(ids)).all()
+            delta = time.perf_counter() - start
+            print(f'{size:>9} {full:>10.3f} {delta:>14.4f}')
+        session.close()
+        get_engine(db_path).dispose()
+
+
+if __name__ == '__main__':
+    main()
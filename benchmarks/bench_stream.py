@@ -0,0 +1,95 @@
+"""
+Benchmark : chiffrement en streaming vs chiffrement en mémoire.
+
+Mesure le débit (Mo/s) et le pic de mémoire (RSS) de encrypt_cp_stream /
+decrypt_cp_stream comparés à encrypt_cp / decrypt_cp sur un gros fichier.
+Chaque mesure tourne dans un sous-processus pour isoler le pic RSS.
+
+Usage : python benchmarks/bench_stream.py [--size-mb 256]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from abe.sim_abe import (setup_abe, encrypt_cp, decrypt_cp, keygen_cp,  # noqa: E402
+                         encrypt_cp_stream, decrypt_cp_stream)
+
+POLICY = 'role:medecin and service:cardio'
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float('nan')
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(mode, src, workdir):
+    state = setup_abe()
+    sk = keygen_cp(state, ['role:medecin', 'service:cardio'])
+    enc, out = os.path.join(workdir, f'{mode}.bin'), os.path.join(workdir, f'{mode}.out')
+    size_mb = os.path.getsize(src) / (1024 * 1024)
+
+    start = time.perf_counter()
+    if mode == 'stream':
+        encrypt_cp_stream(state, POLICY, src, enc)
+    else:
+        with open(src, 'rb') as f:
+            payload, _ = encrypt_cp(state, POLICY, f.read())
+        with open(enc, 'wb') as f:
+            f.write(payload)
+        del payload
+    t_enc = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if mode == 'stream':
+        assert decrypt_cp_stream(state, sk, enc, out) is not None
+    else:
+        with open(enc, 'rb') as f:
+            pt = decrypt_cp(state, sk, f.read())
+        with open(out, 'wb') as f:
+            f.write(pt)
+        del pt
+    t_dec = time.perf_counter() - start
+
+    ratio = os.path.getsize(enc) / os.path.getsize(src)
+    print(f'{mode:>8} {size_mb / t_enc:>10.1f} {size_mb / t_dec:>10.1f} {ratio:>8.3f} {peak_rss_mb():>10.1f}')
+    os.remove(enc)
+    os.remove(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--worker', choices=['stream', 'memory'], help=argparse.SUPPRESS)
+    parser.add_argument('--src', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.src, args.workdir)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        src = os.path.join(workdir, 'capture.raw')
+        with open(src, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f'Fichier de {args.size_mb} Mo')
+        print(f"{'mode':>8} {'enc Mo/s':>10} {'dec Mo/s':>10} {'taille':>8} {'pic RSS Mo':>10}")
+        for mode in ('stream', 'memory'):
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode,
+                            '--src', src, '--workdir', workdir], check=True)
+
+
+if __name__ == '__main__':
+    main()
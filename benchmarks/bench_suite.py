@@ -0,0 +1,301 @@
+"""
+Benchmark de bout en bout : génération de clés, chiffrement, stockage, base, déchiffrement.
+
+Génère une charge IoMT synthétique (benchmarks/workload.py) : population
+d’utilisateurs avec attributs et clés CP, politiques simples / moyennes /
+complexes, lectures « vitals » (~256 o), fenêtres ECG (~24 Ko) et images
+(~4 Mo, chiffrées en streaming comme dans IoMTPage). Chaque lecture suit
+le chemin de l’application : chiffrement, écriture dans le stockage,
+insertion du Record (une transaction), puis relecture et déchiffrement
+avec une clé satisfaisante.
+
+Par étape : nombre d’opérations, débit (op/s, Mo/s), latences p50 / p95 /
+p99 / max ; en fin de run : pic mémoire (RSS, et tracemalloc avec
+--tracemalloc), taille de la base (avec WAL) et du stockage.
+
+--output enregistre les résultats en JSON ; --compare compare à un JSON
+précédent et sort en erreur si une étape régresse au-delà de --tolerance.
+
+Usage : python benchmarks/bench_suite.py [--output run.json] [--compare base.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import workload  # noqa: E402
+from abe.sim_abe import (keygen_cp, keygen_kp, encrypt_cp, encrypt_kp, decrypt_cp, decrypt_kp,  # noqa: E402
+                         encrypt_cp_stream, encrypt_kp_stream, decrypt_cp_stream, decrypt_kp_stream,
+                         get_compiled_policy)
+from gateway import percentile  # noqa: E402
+from models import get_engine, get_session, load_abe_state, User, Attribute, ABEKey, Record  # noqa: E402
+
+# Profils chiffrés en streaming (fichier source -> stockage), comme IoMTPage
+STREAMED = {'imaging'}
+
+# En dessous, le p99 n'est qu'un maximum bruité : seul le débit est comparé
+MIN_OPS_P99 = 50
+
+
+class Stage:
+    """Latences et volume d’une étape."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.bytes = 0
+
+    def add(self, seconds, nbytes=0):
+        self.latencies.append(seconds)
+        self.bytes += nbytes
+
+    def result(self):
+        lat = sorted(self.latencies)
+        total = sum(lat)
+        out = {'ops': len(lat), 'seconds': round(total, 6),
+               'ops_per_s': round(len(lat) / total, 2) if total else 0.0,
+               'p50_ms': round(percentile(lat, 50) * 1000, 3),
+               'p95_ms': round(percentile(lat, 95) * 1000, 3),
+               'p99_ms': round(percentile(lat, 99) * 1000, 3),
+               'max_ms': round(lat[-1] * 1000, 3) if lat else 0.0}
+        if self.bytes:
+            out['mb_per_s'] = round(self.bytes / total / 1e6, 2) if total else 0.0
+        return out
+
+
+class Suite:
+    def __init__(self):
+        self.stages = {}
+
+    def timed(self, name, fn, *args, nbytes=0):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.stage(name).add(time.perf_counter() - start, nbytes)
+        return result
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = Stage(name)
+        return self.stages[name]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Ko sous Linux, octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def populate(suite, session, state, people):
+    """Utilisateurs + attributs + clé CP, une transaction par utilisateur (UserPage)."""
+    for username, role, attrs in people:
+        sk = suite.timed('keygen_cp', keygen_cp, state, attrs)
+
+        def insert():
+            user = User(username=username, role=role)
+            session.add(user)
+            session.flush()
+            for attr in attrs:
+                name, _, value = attr.partition(':')
+                session.add(Attribute(user_id=user.id, name=name, value=value))
+            session.add(ABEKey(user_id=user.id, key_type='CP', private_key_blob=sk.hex(), policy_blob=''))
+            session.commit()
+        suite.timed('db.users', insert)
+
+
+def scenarios(rng, pols):
+    """Cycle (nom, mode, cible) : CP à chaque niveau de complexité, puis KP."""
+    levels = list(pols)
+    i = 0
+    while True:
+        if i % (len(levels) + 1) < len(levels):
+            level = levels[i % (len(levels) + 1)]
+            yield level, 'CP', rng.choice(pols[level])
+        else:
+            yield 'attrs', 'KP', workload.random_attributes(rng, 4)
+        i += 1
+
+
+def decrypt_key(suite, state, mode, target):
+    """Clé qui satisfait la cible : tous les attributs de la politique (CP), leur conjonction (KP)."""
+    if mode == 'CP':
+        attrs = sorted(get_compiled_policy(target).attributes)
+        return suite.timed('keygen_cp', keygen_cp, state, attrs)
+    return suite.timed('keygen_kp', keygen_kp, state, ' and '.join(target))
+
+
+def run_profile(suite, session, state, rng, pols, profile, count, workdir):
+    storage = os.path.join(workdir, 'storage')
+    os.makedirs(storage, exist_ok=True)
+    size = workload.PAYLOAD_PROFILES[profile]
+    stored = []
+    for i, (level, mode, target) in zip(range(count), scenarios(rng, pols)):
+        payload = workload.payloads(rng, profile, 1)[0]
+        path = os.path.join(storage, f'{profile}_{i:06d}.bin')
+        tag = f'{profile}.{level}'
+        if profile in STREAMED:
+            src = os.path.join(workdir, 'source.raw')
+            with open(src, 'wb') as f:
+                f.write(payload)
+            enc = encrypt_cp_stream if mode == 'CP' else encrypt_kp_stream
+            meta = suite.timed(f'encrypt_{mode.lower()}_stream.{tag}', enc, state, target, src, path, nbytes=size)
+        else:
+            enc = encrypt_cp if mode == 'CP' else encrypt_kp
+            blob, meta = suite.timed(f'encrypt_{mode.lower()}.{tag}', enc, state, target, payload, nbytes=size)
+
+            def write():
+                with open(path, 'wb') as f:
+                    f.write(blob)
+            suite.timed(f'storage.write.{profile}', write, nbytes=len(blob))
+
+        def insert():
+            session.add(Record(sensor_id=f'sensor-{i % 50:03d}', storage_path=path, encryption_type=mode,
+                               policy_text=meta.get('policy', ''),
+                               attributes_json=json.dumps(meta.get('attributes', [])),
+                               created_at=datetime.datetime.utcnow()))
+            session.commit()
+        suite.timed(f'db.records.{profile}', insert)
+        stored.append((tag, mode, target, path, payload if profile not in STREAMED else len(payload)))
+
+    for tag, mode, target, path, expected in stored:
+        sk = decrypt_key(suite, state, mode, target)
+        if isinstance(expected, int):
+            dec = decrypt_cp_stream if mode == 'CP' else decrypt_kp_stream
+            out = os.path.join(workdir, 'plain.raw')
+            written = suite.timed(f'decrypt_{mode.lower()}_stream.{tag}', dec, state, sk, path, out, nbytes=size)
+            ok = written == expected
+        else:
+            def read_decrypt():
+                with open(path, 'rb') as f:
+                    blob = f.read()
+                return (decrypt_cp if mode == 'CP' else decrypt_kp)(state, sk, blob)
+            ok = suite.timed(f'decrypt_{mode.lower()}.{tag}', read_decrypt, nbytes=size) == expected
+        if not ok:
+            raise RuntimeError(f'déchiffrement incorrect : {path}')
+
+
+def run(args):
+    rng = workload.make_rng(args.seed)
+    suite = Suite()
+    memory = {}
+    if args.tracemalloc:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        session = get_session(db_path)
+        state = load_abe_state(session)
+        pols = workload.policies(rng, args.policies)
+        for level in pols.values():
+            for policy in level:
+                suite.timed('keygen_kp', keygen_kp, state, policy)
+
+        people = workload.population(rng, args.users, args.attrs_per_user)
+        populate(suite, session, state, people)
+        for profile in workload.PAYLOAD_PROFILES:
+            count = getattr(args, profile)
+            if count:
+                if args.tracemalloc:
+                    tracemalloc.reset_peak()
+                run_profile(suite, session, state, rng, pols, profile, count, workdir)
+                if args.tracemalloc:
+                    memory[f'tracemalloc_peak_mb.{profile}'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+
+        db_bytes = sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+        storage_bytes = dir_size(os.path.join(workdir, 'storage'))
+        session.close()
+        get_engine(db_path).dispose()
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    memory['peak_rss_mb'] = peak_rss_mb()
+    return {
+        'meta': {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'python': platform.python_version(), 'platform': platform.platform(),
+                 'args': vars(args)},
+        'stages': {name: stage.result() for name, stage in sorted(suite.stages.items())},
+        'memory': memory,
+        'storage': {'db_bytes': db_bytes, 'storage_bytes': storage_bytes},
+    }
+
+
+def print_results(results):
+    print(f"{'étape':<36} {'ops':>6} {'op/s':>9} {'Mo/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for name, r in results['stages'].items():
+        print(f"{name:<36} {r['ops']:>6} {r['ops_per_s']:>9.1f} {r.get('mb_per_s', 0):>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+    for name, value in results['memory'].items():
+        print(f'{name}: {value}')
+    storage = results['storage']
+    print(f"base : {storage['db_bytes'] / 1e6:.1f} Mo, stockage : {storage['storage_bytes'] / 1e6:.1f} Mo")
+
+
+def compare(results, baseline, tolerance):
+    """Compare débit et p99 par étape ; retourne la liste des régressions."""
+    regressions = []
+    if baseline.get('meta', {}).get('args', {}).get('tracemalloc') != results['meta']['args']['tracemalloc']:
+        print('attention : --tracemalloc diffère entre les deux runs, les temps ne sont pas comparables')
+    print(f"\n{'étape':<36} {'op/s':>8} {'p99':>8}   (rapport nouveau / référence)")
+    for name, new in results['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if not old or not old['ops_per_s'] or not old['p99_ms']:
+            continue
+        rate = new['ops_per_s'] / old['ops_per_s']
+        p99 = new['p99_ms'] / old['p99_ms']
+        flag = rate < 1 - tolerance or (new['ops'] >= MIN_OPS_P99 and p99 > 1 + tolerance)
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36} {rate:>8.2f} {p99:>8.2f}{'   <- régression' if flag else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vitals', type=int, default=2000, help='lectures « vitals »')
+    parser.add_argument('--ecg', type=int, default=200, help='fenêtres ECG')
+    parser.add_argument('--imaging', type=int, default=8, help='images')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--attrs-per-user', type=int, default=4)
+    parser.add_argument('--policies', type=int, default=20, help='politiques par niveau de complexité')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tracemalloc', action='store_true', help='pic mémoire Python par profil (plus lent)')
+    parser.add_argument('--output', help='fichier JSON des résultats')
+    parser.add_argument('--compare', help='JSON de référence')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='écart toléré (0.15 = 15 %%)')
+    args = parser.parse_args()
+
+    results = run(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} étape(s) en régression')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
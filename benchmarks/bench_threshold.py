@@ -0,0 +1,91 @@
+"""
+Micro-benchmark : porte à seuil native contre sa forme développée.
+
+Pour chaque n (--sizes), la politique « k of (a1, ..., an) » (k = ⌈n/2⌉,
+attributs de benchmarks/workload.py) est comparée à son équivalent en
+OU de C(n, k) conjonctions, seule écriture possible sans seuil :
+- longueur du texte et temps de compilation (compile_policy) ;
+- évaluation par clé : CompiledPolicy.evaluate(set) et evaluate_mask ;
+- évaluation vectorisée (AttributeMatrix) sur --keys ensembles.
+Les résultats des deux formes sont comparés.
+
+Usage : python benchmarks/bench_threshold.py [--sizes 3 6 9 12 14] [--keys 10000]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import workload  # noqa: E402
+from abe.sim_abe import attribute_mask, compile_policy, get_attribute_dictionary  # noqa: E402
+from abe.vectorized import AttributeMatrix  # noqa: E402
+
+
+def expanded(k, attrs):
+    """OU de toutes les conjonctions de k attributs parmi attrs."""
+    return ' or '.join('(' + ' and '.join(comb) + ')' for comb in itertools.combinations(attrs, k))
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def per_call_us(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (repeat * len(items)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3, 6, 9, 12, 14])
+    parser.add_argument('--keys', type=int, default=10000)
+    parser.add_argument('--attrs', type=int, default=6, help='attributs par clé')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = workload.make_rng(args.seed)
+    universe = workload.all_attributes()
+    lists = [workload.random_attributes(rng, args.attrs) for _ in range(args.keys)]
+    sets = [set(attrs) for attrs in lists]
+    # Feuilles internées avant le calcul des masques (voir policy_allows)
+    get_attribute_dictionary().intern(universe)
+    masks = [attribute_mask(attrs) for attrs in lists]
+    matrix = AttributeMatrix(lists)
+
+    print(f"{'n':>3} {'k':>3} {'forme':<10} {'texte':>9} {'compil. ms':>11} {'set µs':>8} "
+          f"{'masque µs':>10} {'numpy ms':>9} {'satisfaites':>12}")
+    for n in args.sizes:
+        if n > len(universe):
+            sys.exit(f'n = {n} dépasse les {len(universe)} attributs de la charge')
+        k = (n + 1) // 2
+        attrs = rng.sample(universe, n)
+        native_text = f"{k} of ({', '.join(attrs)})"
+        results = []
+        for label, text in (('seuil', native_text), ('développée', expanded(k, attrs))):
+            policy, build = timed_ms(lambda: compile_policy(text))
+            by_set = [policy.evaluate(s) for s in sets]
+            if [policy.evaluate_mask(m) for m in masks] != by_set or matrix.evaluate(policy).tolist() != by_set:
+                sys.exit(f'évaluateurs en désaccord : {label}, n = {n}')
+            results.append(by_set)
+            t_set = per_call_us(policy.evaluate, sets, args.repeat)
+            t_mask = per_call_us(policy.evaluate_mask, masks, args.repeat)
+            _, t_np = timed_ms(lambda: matrix.evaluate(policy))
+            print(f'{n:>3} {k:>3} {label:<10} {len(text):>9} {build:>11.2f} {t_set:>8.3f} '
+                  f'{t_mask:>10.3f} {t_np:>9.2f} {sum(by_set):>12}')
+        if results[0] != results[1]:
+            sys.exit(f'seuil et forme développée en désaccord, n = {n}')
+
+
+if __name__ == '__main__':
+    main()
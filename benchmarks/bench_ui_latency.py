@@ -0,0 +1,109 @@
+"""
+Benchmark : latence de la boucle d’événements pendant un gros chiffrement.
+
+Chiffre un fichier avec encrypt_cp_stream via TaskRunner (tasks.py) et
+relève l’écart maximal entre deux passages de la boucle after() : c’est
+la borne de latence d’affichage vue par l’utilisateur. À comparer avec
+l’appel direct sur le thread de l’interface, qui bloque pendant toute
+la durée du chiffrement.
+
+Sans affichage disponible, un ordonnanceur minimal (module sched) tient
+lieu de boucle Tk.
+
+Usage : python benchmarks/bench_ui_latency.py [--size-mb 1024]
+"""
+import argparse
+import os
+import sched
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from abe.sim_abe import setup_abe, encrypt_cp_stream  # noqa: E402
+from tasks import TaskRunner  # noqa: E402
+
+POLICY = 'role:medecin and service:cardio'
+
+
+class HeadlessRoot:
+    """Remplace Tk : after() / mainloop() / quit() sur un sched.scheduler."""
+
+    def __init__(self):
+        self._sched = sched.scheduler(time.perf_counter, time.sleep)
+        self._running = False
+
+    def after(self, ms, fn, *args):
+        if self._running:
+            self._sched.enter(ms / 1000, 0, fn, args)
+
+    def mainloop(self):
+        while self._running and not self._sched.empty():
+            self._sched.run(blocking=False)
+            time.sleep(0.001)
+
+    def quit(self):
+        self._running = False
+        for event in self._sched.queue:
+            self._sched.cancel(event)
+
+
+def make_root():
+    try:
+        import tkinter
+        root = tkinter.Tk()
+        root.withdraw()
+        return root, 'Tk'
+    except Exception:
+        root = HeadlessRoot()
+        root._running = True
+        return root, 'sans affichage (sched)'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=1024)
+    args = parser.parse_args()
+
+    state = setup_abe()
+    with tempfile.TemporaryDirectory() as workdir:
+        src, dst = os.path.join(workdir, 'capture.raw'), os.path.join(workdir, 'capture.bin')
+        with open(src, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        root, kind = make_root()
+        runner = TaskRunner(root)
+        progress_events = []
+        result = {}
+
+        def job(task):
+            return encrypt_cp_stream(state, POLICY, src, dst,
+                                     progress=lambda done: task.report(done, args.size_mb << 20))
+
+        def done(meta):
+            result['elapsed'] = time.perf_counter() - start
+            root.quit()
+
+        start = time.perf_counter()
+        runner.submit(job, on_done=done, on_error=lambda e: root.quit(),
+                      on_progress=lambda d, t: progress_events.append(d))
+        root.mainloop()
+        runner.shutdown()
+
+        start = time.perf_counter()
+        encrypt_cp_stream(state, POLICY, src, dst)
+        blocking = time.perf_counter() - start
+
+    print(f'Boucle : {kind}, fichier de {args.size_mb} Mo, passage toutes les {runner.poll_ms} ms')
+    print(f"Arrière-plan : {result.get('elapsed', float('nan')):.2f} s, "
+          f'écart max de la boucle {runner.max_tick_gap_ms:.1f} ms, '
+          f'{len(progress_events)} mises à jour de progression')
+    print(f'Thread interface : {blocking:.2f} s, interface bloquée {blocking * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark : rafraîchissement de la liste des utilisateurs (UserPage).
+
+Compare l’ancien chargement (1 requête utilisateurs, puis attributs et
+clés par utilisateur, et attributs à nouveau pour chaque clé CP) au
+chargement groupé models.users_with_keys (selectin).
+
+Usage : python benchmarks/bench_users.py [--users 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import event  # noqa: E402
+
+from models import get_session, users_with_keys, User, Attribute, ABEKey  # noqa: E402
+
+
+def populate(session, n_users, n_attrs, n_keys):
+    session.bulk_insert_mappings(User, [{'id': i, 'username': f'user{i}', 'role': 'medecin'}
+                                        for i in range(1, n_users + 1)])
+    session.bulk_insert_mappings(Attribute, [{'user_id': u, 'name': f'attr{j}', 'value': f'v{u % 7}'}
+                                             for u in range(1, n_users + 1) for j in range(n_attrs)])
+    session.bulk_insert_mappings(ABEKey, [{'user_id': u, 'key_type': 'CP' if j % 2 == 0 else 'KP',
+                                           'private_key_blob': '00',
+                                           'policy_blob': '' if j % 2 == 0 else 'role:medecin'}
+                                          for u in range(1, n_users + 1) for j in range(n_keys)])
+    session.commit()
+
+
+def legacy_refresh(session):
+    """Requêtes de l’ancien UserPage.refresh_users (N+1)."""
+    lines = 0
+    for u in session.query(User).all():
+        attrs = session.query(Attribute).filter(Attribute.user_id == u.id).all()
+        for k in session.query(ABEKey).filter(ABEKey.user_id == u.id).all():
+            if not (k.key_type == 'KP' and k.policy_blob):
+                attrs = session.query(Attribute).filter(Attribute.user_id == u.id).all()
+            lines += 1
+        lines += len(attrs)
+    return lines
+
+
+def grouped_refresh(session):
+    lines = 0
+    for u in users_with_keys(session):
+        lines += len(u.keys) + len(u.attributes)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--attrs', type=int, default=5)
+    parser.add_argument('--keys', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        session = get_session(os.path.join(workdir, 'bench.db'))
+        populate(session, args.users, args.attrs, args.keys)
+        queries = [0]
+        event.listen(session.get_bind(), 'before_cursor_execute',
+                     lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+        print(f'{args.users} utilisateurs, {args.attrs} attributs et {args.keys} clés chacun')
+        print(f"{'chargement':>12} {'durée s':>9} {'requêtes':>9}")
+        for name, fn in (('N+1', legacy_refresh), ('selectin', grouped_refresh)):
+            session.expunge_all()
+            queries[0] = 0
+            start = time.perf_counter()
+            fn(session)
+            print(f'{name:>12} {time.perf_counter() - start:>9.2f} {queries[0]:>9}')
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
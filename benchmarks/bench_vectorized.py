@@ -0,0 +1,70 @@
+"""
+Benchmark : évaluation vectorisée (abe/vectorized.py) contre boucle Python.
+
+Une politique (simple / moyenne / complexe, benchmarks/workload.py) est
+évaluée sur N ensembles d’attributs :
+- boucle _policy_satisfied(politique, attributs) par entité (audit actuel) ;
+- boucle evaluate_mask sur des masques déjà calculés ;
+- AttributeMatrix.evaluate (matrice construite une fois, temps indiqué).
+Les trois résultats sont comparés.
+
+Usage : python benchmarks/bench_vectorized.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import workload  # noqa: E402
+from abe.sim_abe import _policy_satisfied, attribute_mask, get_attribute_dictionary, get_compiled_policy  # noqa: E402
+from abe.vectorized import AttributeMatrix  # noqa: E402
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--policies', type=int, default=5, help='politiques par niveau')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = workload.make_rng(args.seed)
+    pols = workload.policies(rng, args.policies)
+    # Feuilles internées avant le calcul des masques (voir policy_allows)
+    get_attribute_dictionary().intern(workload.all_attributes())
+    print(f"{'entités':>8} {'politique':<10} {'boucle ms':>10} {'masques ms':>11} {'numpy ms':>9} "
+          f"{'gain':>7} {'vs masques':>11}")
+    for size in args.sizes:
+        lists = [workload.random_attributes(rng, rng.randint(2, 5)) for _ in range(size)]
+        masks = [attribute_mask(attrs) for attrs in lists]
+        matrix, build = timed_ms(lambda: AttributeMatrix(lists))
+        for level, policies in pols.items():
+            t_loop = t_mask = t_np = 0.0
+            for text in policies:
+                policy = get_compiled_policy(text)
+                expected, ms = timed_ms(lambda: [_policy_satisfied(text, attrs) for attrs in lists])
+                t_loop += ms
+                by_mask, ms = timed_ms(lambda: [policy.evaluate_mask(m) for m in masks])
+                t_mask += ms
+                vector, ms = timed_ms(lambda: matrix.evaluate(policy))
+                t_np += ms
+                if by_mask != expected or vector.tolist() != expected:
+                    sys.exit(f'résultats différents : {text}')
+            n = len(policies)
+            print(f'{size:>8} {level:<10} {t_loop / n:>10.1f} {t_mask / n:>11.1f} {t_np / n:>9.2f} '
+                  f'{t_loop / t_np:>6.0f}x {t_mask / t_np:>10.0f}x')
+        print(f'{size:>8} construction de la matrice : {build:.0f} ms '
+              f'({matrix.nbytes / 1e6:.1f} Mo)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Vérification des index : EXPLAIN QUERY PLAN des requêtes de main.py.
+
+Crée une base temporaire au schéma courant, plus une copie d’un ancien
+data.db migrée par models.migrate, et vérifie que chaque requête des
+vues utilise un index (pas de SCAN complet ni de B-TREE temporaire pour
+le tri). Code de sortie non nul en cas d’échec.
+
+Usage : python benchmarks/check_query_plans.py [--legacy-db data.db]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import datetime  # noqa: E402
+
+from sqlalchemy import tuple_  # noqa: E402
+from sqlalchemy.dialects import sqlite  # noqa: E402
+
+from models import get_session, User, Attribute, ABEKey, Record, AccessGrant, AccessIndex, policy_candidates  # noqa: E402
+
+
+def view_queries(session):
+    """(nom, requête, index attendu) pour les accès des vues de main.py."""
+    return [
+        ('attributs par utilisateur',
+         session.query(Attribute).filter(Attribute.user_id == 1), 'ix_attributes_user_id'),
+        ('attributs selectin',
+         session.query(Attribute).filter(Attribute.user_id.in_([1, 2, 3])), 'ix_attributes_user_id'),
+        ('clés par utilisateur',
+         session.query(ABEKey).filter(ABEKey.user_id == 1), 'ix_abe_keys_user_id'),
+        ('records par date',
+         session.query(Record).order_by(Record.created_at.desc()), 'ix_records_created_at_id'),
+        ('records d’un capteur',
+         session.query(Record).filter(Record.sensor_id == 'sensor-001')
+         .order_by(Record.created_at.desc()), 'ix_records_sensor_id_created_at'),
+        ('records page suivante (keyset)',
+         session.query(Record)
+         .filter(tuple_(Record.created_at, Record.id) < tuple_(datetime.datetime(2024, 1, 1), 1000))
+         .order_by(Record.created_at.desc(), Record.id.desc()).limit(500), 'ix_records_created_at_id'),
+        ('utilisateurs page suivante (keyset)',
+         session.query(User).filter(User.id > 1000).order_by(User.id).limit(500), 'PRIMARY KEY'),
+        ('records par type',
+         session.query(Record).filter(Record.encryption_type == 'CP').order_by(Record.id),
+         'ix_records_encryption_type_id'),
+        ('records KP candidats (index inversé)',
+         session.query(Record).filter(Record.id.in_(policy_candidates('kp_record', 'role:medecin'))),
+         'access_index USING PRIMARY KEY'),
+        ('entrées d’index d’une ligne (recalcul)',
+         session.query(AccessIndex).filter(AccessIndex.entity.in_(['cp_record', 'kp_record']),
+                                           AccessIndex.row_id.in_([1, 2, 3])),
+         'ix_access_index_entity_row_id'),
+        ('records accordés à une clé',
+         session.query(Record.id, Record.storage_path).join(AccessGrant, AccessGrant.record_id == Record.id)
+         .filter(AccessGrant.key_id == 1).order_by(AccessGrant.record_id), 'access_grants USING PRIMARY KEY'),
+        ('clés d’un record',
+         session.query(AccessGrant.key_id).filter(AccessGrant.record_id == 1), 'ix_access_grants_record_id'),
+    ]
+
+
+def explain(session, query):
+    sql = str(query.statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+
+
+def check(db_path, label):
+    session = get_session(db_path)
+    failures = 0
+    for name, query, index in view_queries(session):
+        plan = explain(session, query)
+        ok = any(index in step for step in plan) and not any('TEMP B-TREE' in step for step in plan)
+        failures += not ok
+        print(f"[{'OK' if ok else 'ÉCHEC'}] {label} — {name}: {' | '.join(plan)}")
+    session.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--legacy-db', default=os.path.join(ROOT, 'data.db'))
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        failures += check(os.path.join(workdir, 'fresh.db'), 'nouvelle base')
+        if os.path.exists(args.legacy_db):
+            migrated = os.path.join(workdir, 'legacy.db')
+            shutil.copy(args.legacy_db, migrated)
+            failures += check(migrated, 'base migrée')
+    if failures:
+        sys.exit(f'{failures} requête(s) sans index')
+    print('Tous les plans utilisent un index')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Charge synthétique IoMT pour les benchmarks.
+
+Lectures de capteurs de trois profils (constantes vitales, fenêtres ECG,
+imagerie), populations d’utilisateurs et d’attributs, politiques d’accès
+de complexité croissante. Tout est déterministe pour une graine donnée.
+"""
+import json
+import math
+import random
+import struct
+
+# Valeurs possibles de chaque attribut (attribut = « nom:valeur »)
+ATTRIBUTE_SPACE = {
+    'role': ['medecin', 'infirmier', 'chef_service', 'interne', 'technicien', 'admin'],
+    'service': ['cardio', 'urgence', 'neuro', 'pediatrie', 'radiologie', 'reanimation', 'oncologie'],
+    'site': ['nord', 'sud', 'est', 'ouest'],
+    'niveau': ['1', '2', '3'],
+    'equipe': ['jour', 'nuit', 'garde'],
+}
+
+# Nombre de feuilles des politiques par niveau de complexité
+POLICY_COMPLEXITY = {'simple': 1, 'moyenne': 4, 'complexe': 12}
+
+# Taille indicative d’une lecture par profil (octets)
+PAYLOAD_PROFILES = {'vitals': 256, 'ecg': 24000, 'imaging': 4 * 1024 * 1024}
+
+
+def all_attributes():
+    return [f'{name}:{value}' for name, values in ATTRIBUTE_SPACE.items() for value in values]
+
+
+def random_attributes(rng, count):
+    """`count` attributs distincts, au plus une valeur par nom sauf si count l’exige."""
+    names = list(ATTRIBUTE_SPACE)
+    rng.shuffle(names)
+    attrs = [f'{name}:{rng.choice(ATTRIBUTE_SPACE[name])}' for name in names[:count]]
+    if count > len(names):
+        attrs += rng.sample(sorted(set(all_attributes()) - set(attrs)), count - len(names))
+    return attrs
+
+
+def random_policy(rng, leaves):
+    """Politique and/or (parenthésée) à `leaves` feuilles."""
+    if leaves <= 1:
+        return rng.choice(all_attributes())
+    left = rng.randint(1, leaves - 1)
+    op = rng.choice(('and', 'or'))
+    return f'({random_policy(rng, left)} {op} {random_policy(rng, leaves - left)})'
+
+
+def policies(rng, per_level):
+    """{niveau: [politiques]} pour chaque niveau de POLICY_COMPLEXITY."""
+    return {level: [random_policy(rng, leaves) for _ in range(per_level)]
+            for level, leaves in POLICY_COMPLEXITY.items()}
+
+
+def vitals_payload(rng, size=PAYLOAD_PROFILES['vitals']):
+    body = json.dumps({'hr': rng.randint(45, 140), 'spo2': rng.randint(85, 100),
+                       'temp': round(rng.uniform(35.0, 40.0), 1),
+                       'bp': [rng.randint(90, 160), rng.randint(50, 100)],
+                       'rr': rng.randint(10, 30)}).encode()
+    return body + b' ' * max(0, size - len(body))
+
+
+def ecg_payload(rng, size=PAYLOAD_PROFILES['ecg']):
+    """Fenêtre ECG : échantillons int16 (onde périodique + bruit)."""
+    count = size // 2
+    rate = 500.0
+    period = rate * 60 / rng.randint(50, 120)
+    samples = [int(1000 * math.exp(-((i % period) - period / 3) ** 2 / 40) + rng.gauss(0, 30))
+               for i in range(count)]
+    return struct.pack(f'<{count}h', *[max(-32768, min(32767, s)) for s in samples])
+
+
+def imaging_payload(rng, size=PAYLOAD_PROFILES['imaging']):
+    # Données d’image déjà compressées : octets quasi aléatoires
+    return rng.randbytes(size)
+
+
+PAYLOAD_FACTORIES = {'vitals': vitals_payload, 'ecg': ecg_payload, 'imaging': imaging_payload}
+
+
+def payloads(rng, profile, count, size=None):
+    make = PAYLOAD_FACTORIES[profile]
+    size = size or PAYLOAD_PROFILES[profile]
+    return [make(rng, size) for _ in range(count)]
+
+
+def population(rng, users, attrs_per_user):
+    """[(username, role, [attributs])] pour `users` utilisateurs."""
+    out = []
+    for i in range(users):
+        attrs = random_attributes(rng, attrs_per_user)
+        role = next((a.split(':', 1)[1] for a in attrs if a.startswith('role:')), 'medecin')
+        out.append((f'user{i:06d}', role, attrs))
+    return out
+
+
+def make_rng(seed=0):
+    return random.Random(seed)
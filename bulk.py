@@ -0,0 +1,60 @@
+"""
+Déchiffrement en masse : tous les records qu’une clé ABE peut ouvrir.
+
+Les records lisibles sont lus dans la matrice d’accès matérialisée
+(access_grants, voir access.py), sans lire les fichiers chiffrés ; seuls
+ces records sont déchiffrés, en parallèle (CryptoEngine, abe/engine.py).
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+
+from abe.engine import CryptoEngine
+from access import granted_records
+
+
+def decrypt_all_for_key(session, state, key, out_dir=None, archive=None, workers=None, progress=None):
+    """
+    Déchiffre tous les records lisibles par `key`.
+    - out_dir : dossier recevant un fichier plain_<id>.bin par record
+    - archive : chemin d’une archive .zip (alternative à out_dir)
+    - progress : appelé avec (records traités, total) après chaque record ;
+      une exception levée par progress (annulation) abandonne les records
+      restants
+    Retourne (liste des record_id déchiffrés, liste des record_id en échec).
+    """
+    if (out_dir is None) == (archive is None):
+        raise ValueError('Indiquer soit out_dir, soit archive')
+
+    sk_blob = bytes.fromhex(key.private_key_blob)
+    targets = [(r.id, r.storage_path) for r in granted_records(session, key.id)]
+
+    work_dir = out_dir if archive is None else tempfile.mkdtemp(prefix='iomt_bulk_')
+    os.makedirs(work_dir, exist_ok=True)
+    done, failed = [], []
+    zf = zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) if archive else None
+
+    try:
+        # Le moteur borne les déchiffrements en vol ; à la sortie du bloc
+        # (annulation comprise), ceux qui n’ont pas démarré sont abandonnés
+        with CryptoEngine(state, workers=workers) as engine:
+            results = engine.decrypt_files(key.key_type, sk_blob, targets, out_dir=work_dir)
+            for n, (rid, written) in enumerate(results, 1):
+                if written is None:
+                    failed.append(rid)
+                else:
+                    done.append(rid)
+                    if zf is not None:
+                        # L’archive est écrite par un seul thread
+                        outpath = os.path.join(work_dir, f'plain_{rid}.bin')
+                        zf.write(outpath, os.path.basename(outpath))
+                        os.remove(outpath)
+                if progress is not None:
+                    progress(n, len(targets))
+    finally:
+        if zf is not None:
+            zf.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return sorted(done), sorted(failed)
@@ -0,0 +1,447 @@
+"""
+Passerelle asyncio d’ingestion (TCP et HTTP) devant abe/sim_abe.py.
+
+Les connexions des capteurs sont servies par une boucle asyncio ; le
+chiffrement des lots tourne dans un pool de threads et les lignes
+Record sont écrites par un seul thread, plusieurs lots prêts étant
+regroupés dans une même transaction. Contre-pression : file bornée,
+nombre de lots en vol borné, fenêtre d’acquittements par connexion ;
+quand la file est pleine, réponse « occupé » (TCP) ou 503 + Retry-After
+(HTTP).
+
+Usage :
+    python gateway.py serve --rules rules.json --tcp 127.0.0.1:9100 --http 127.0.0.1:8080
+    python gateway.py load --tcp 127.0.0.1:9100 --connections 50 --readings 200
+    python gateway.py load --http 127.0.0.1:8080 --connections 20 --readings 100
+
+TCP : trames d’ingest.py (u16 + capteur, u32 + données), acquittées dans
+l’ordre par un octet : 0 stockée, 1 refusée (aucune règle), 2 occupé
+(réessayer plus tard), 3 erreur, 4 trop grande (plus de
+MAX_READING_SIZE octets, la connexion est fermée).
+HTTP : POST /readings/<sensor_id> (corps = données) -> 201, 404, 413,
+503 ; GET /stats -> compteurs et latences serveur (JSON).
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ingest import (Ingestor, Reading, SensorRules, MAX_READING_SIZE, READING_TOO_LARGE, STORAGE_DIR,
+                    _SENSOR_LEN, _DATA_LEN)
+from models import get_session, load_abe_state
+
+ACK_STORED, ACK_REFUSED, ACK_BUSY, ACK_ERROR = 0, 1, 2, 3
+ACK_TOO_LARGE = READING_TOO_LARGE
+
+_HTTP_STATUS = {
+    ACK_STORED: (201, 'Created'),
+    ACK_REFUSED: (404, 'Not Found'),
+    ACK_BUSY: (503, 'Service Unavailable'),
+    ACK_ERROR: (500, 'Internal Server Error'),
+}
+
+
+def percentile(sorted_values, p):
+    """Percentile (rang le plus proche) d’une liste déjà triée."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+# ==========================================================
+# Serveur
+# ==========================================================
+
+class Gateway:
+    """
+    gateway = Gateway(ingestor)
+    await gateway.start(tcp=('127.0.0.1', 9100), http=('127.0.0.1', 8080))
+    """
+
+    def __init__(self, ingestor, workers=4, max_queue=5000, max_batches=4,
+                 window=64, put_timeout=0.5, retry_after=1):
+        self.ingestor = ingestor
+        self.max_queue = max_queue
+        self.max_batches = max_batches
+        self.window = window
+        self.put_timeout = put_timeout
+        self.retry_after = retry_after
+        self.seal_pool = ThreadPoolExecutor(workers, thread_name_prefix='gw-seal')
+        # SQLite : un seul écrivain
+        self.db_pool = ThreadPoolExecutor(1, thread_name_prefix='gw-db')
+        self.latencies = collections.deque(maxlen=10000)
+        self.counts = collections.Counter()
+        self.servers = []
+        self._tasks = []
+        # Lots en cours de chiffrement : la boucle ne garde qu’une référence faible
+        self._batches = set()
+
+    async def start(self, tcp=None, http=None):
+        self.queue = asyncio.Queue(self.max_queue)
+        self.sealed = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.max_batches)
+        self._tasks = [asyncio.create_task(self._batcher()), asyncio.create_task(self._writer())]
+        if tcp:
+            self.servers.append(await asyncio.start_server(self._serve_tcp, *tcp))
+        if http:
+            self.servers.append(await asyncio.start_server(self._serve_http, *http))
+        return [s.sockets[0].getsockname()[:2] for s in self.servers]
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+        self.seal_pool.shutdown(wait=True)
+        self.db_pool.shutdown(wait=True)
+
+    # ----- admission -----
+    async def submit(self, sensor_id, data, wait):
+        """
+        Future résolue par un code ACK_* une fois la lecture en base.
+        `wait` : délai d’attente d’une place dans la file (0 : aucun).
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self.ingestor.rules.match(sensor_id) is None:
+            self.counts['refused'] += 1
+            future.set_result(ACK_REFUSED)
+            return future
+        item = (Reading(sensor_id, data), future, time.perf_counter())
+        try:
+            if wait:
+                await asyncio.wait_for(self.queue.put(item), wait)
+            else:
+                self.queue.put_nowait(item)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.counts['busy'] += 1
+            future.set_result(ACK_BUSY)
+        return future
+
+    # ----- lots : chiffrement puis écriture groupée -----
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        batch_size, interval = self.ingestor.batch_size, self.ingestor.batch_interval
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + interval
+            while len(items) < batch_size:
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            # Lots en vol bornés : si la base prend du retard, la file se
+            # remplit et les capteurs reçoivent « occupé »
+            await self.slots.acquire()
+            task = asyncio.create_task(self._seal(items))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _seal(self, items):
+        loop = asyncio.get_running_loop()
+        try:
+            rows, written = await loop.run_in_executor(
+                self.seal_pool, self.ingestor.seal, [reading for reading, _, _ in items])
+        except Exception:
+            self.slots.release()
+            self._finish(items, ACK_ERROR)
+            return
+        await self.sealed.put((items, rows, written))
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ready = [await self.sealed.get()]
+            while not self.sealed.empty():
+                ready.append(self.sealed.get_nowait())
+            items = [item for batch, _, _ in ready for item in batch]
+            rows = [row for _, batch_rows, _ in ready for row in batch_rows]
+            written = [path for _, _, paths in ready for path in paths]
+            try:
+                await loop.run_in_executor(self.db_pool, self.ingestor.store,
+                                           [reading for reading, _, _ in items], rows, written)
+            except Exception:
+                code = ACK_ERROR
+            else:
+                code = ACK_STORED
+                self.counts['commits'] += 1
+            for _ in ready:
+                self.slots.release()
+            self._finish(items, code)
+
+    def _finish(self, items, code):
+        now = time.perf_counter()
+        for _, future, received in items:
+            if code == ACK_STORED:
+                self.latencies.append(now - received)
+                self.counts['stored'] += 1
+            if not future.done():
+                future.set_result(code)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {**self.counts, 'queued': self.queue.qsize(),
+                'p50_ms': percentile(latencies, 50) * 1000, 'p99_ms': percentile(latencies, 99) * 1000}
+
+    # ----- TCP -----
+    async def _serve_tcp(self, reader, writer):
+        # Acquittements écrits dans l’ordre des trames ; au-delà de
+        # `window` lectures non acquittées, la lecture de la socket s’arrête
+        pending = asyncio.Queue(self.window)
+
+        async def acknowledge():
+            while True:
+                future = await pending.get()
+                if future is None:
+                    return
+                writer.write(bytes([await future]))
+                await writer.drain()
+
+        acks = asyncio.create_task(acknowledge())
+
+        async def enqueue(future):
+            # Si acknowledge() s’est arrêtée (client parti), plus rien ne
+            # vide la file : ne pas attendre une place indéfiniment
+            if not pending.full():
+                return pending.put_nowait(future)
+            put = asyncio.ensure_future(pending.put(future))
+            await asyncio.wait((put, acks), return_when=asyncio.FIRST_COMPLETED)
+            if not put.done():
+                put.cancel()
+                raise ConnectionError('acquittements interrompus')
+
+        try:
+            while not acks.done():
+                head = await reader.readexactly(_SENSOR_LEN.size)
+                sensor = await reader.readexactly(_SENSOR_LEN.unpack(head)[0])
+                size = _DATA_LEN.unpack(await reader.readexactly(_DATA_LEN.size))[0]
+                if size > MAX_READING_SIZE:
+                    # Corps non lu : trame refusée, puis fermeture
+                    self.counts['too_large'] += 1
+                    refused = asyncio.get_running_loop().create_future()
+                    refused.set_result(ACK_TOO_LARGE)
+                    await enqueue(refused)
+                    break
+                data = await reader.readexactly(size)
+                await enqueue(await self.submit(sensor.decode('utf-8'), data, self.put_timeout))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            try:
+                if not acks.done():
+                    await enqueue(None)
+                await acks
+            except ConnectionError:
+                pass
+            writer.close()
+
+    # ----- HTTP (requêtes successives, connexion persistante) -----
+    async def _serve_http(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    method, target, _ = line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    return await self._respond(writer, 400, 'Bad Request', close=True)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if not 0 <= length <= MAX_READING_SIZE:
+                    # Corps non lu : la requête suivante est introuvable, on ferme
+                    self.counts['too_large'] += 1
+                    return await self._respond(writer, 413, 'Payload Too Large', close=True)
+                body = await reader.readexactly(length)
+                close = headers.get('connection', '').lower() == 'close'
+
+                if method == 'GET' and target == '/stats':
+                    await self._respond(writer, 200, 'OK', json.dumps(self.stats()).encode(), close,
+                                        'application/json')
+                elif method == 'POST' and target.startswith('/readings/') and len(target) > 10:
+                    # Pas d’attente en HTTP : file pleine -> 503 immédiat
+                    code = await (await self.submit(target[10:], body, 0))
+                    status, reason = _HTTP_STATUS[code]
+                    extra = {'Retry-After': str(self.retry_after)} if code == ACK_BUSY else {}
+                    await self._respond(writer, status, reason, close=close, headers=extra)
+                else:
+                    await self._respond(writer, 404, 'Not Found', close=close)
+                if close:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, reason, body=b'', close=False,
+                       content_type='text/plain', headers=None):
+        lines = [f'HTTP/1.1 {status} {reason}', f'Content-Length: {len(body)}',
+                 f'Content-Type: {content_type}']
+        lines += [f'{k}: {v}' for k, v in (headers or {}).items()]
+        if close:
+            lines.append('Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+# ==========================================================
+# Générateur de charge
+# ==========================================================
+
+async def _tcp_client(address, sensor, readings, payload, window, latencies, counts):
+    reader, writer = await asyncio.open_connection(*address)
+    head = _SENSOR_LEN.pack(len(sensor)) + sensor.encode()
+    frame = head + _DATA_LEN.pack(len(payload)) + payload
+    sent = collections.deque()
+    # Au plus `window` lectures envoyées non acquittées
+    slots = asyncio.Semaphore(window)
+
+    async def receive():
+        for _ in range(readings):
+            code = (await reader.readexactly(1))[0]
+            latencies.append(time.perf_counter() - sent.popleft())
+            counts[code] += 1
+            slots.release()
+
+    receiver = asyncio.create_task(receive())
+    for _ in range(readings):
+        await slots.acquire()
+        sent.append(time.perf_counter())
+        writer.write(frame)
+        await writer.drain()
+    await receiver
+    writer.close()
+
+
+async def _http_client(address, sensor, readings, payload, latencies, counts):
+    reader, writer = await asyncio.open_connection(*address)
+    request = (f'POST /readings/{sensor} HTTP/1.1\r\nHost: {address[0]}\r\n'
+               f'Content-Length: {len(payload)}\r\n\r\n').encode() + payload
+    for _ in range(readings):
+        while True:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            retry, length = 0, 0
+            while True:
+                header = await reader.readline()
+                if header in (b'\r\n', b''):
+                    break
+                name, _, value = header.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'retry-after':
+                    retry = int(value)
+            await reader.readexactly(length)
+            counts[status] += 1
+            if status != 503:
+                latencies.append(time.perf_counter() - start)
+                break
+            # Ralentissement demandé par la passerelle
+            await asyncio.sleep(retry)
+    writer.close()
+
+
+async def run_load(tcp=None, http=None, connections=50, readings=200, size=256, window=16):
+    """Retourne {'readings', 'elapsed', 'rate', 'p50_ms', 'p99_ms', 'max_ms', 'codes'}."""
+    latencies, counts = [], collections.Counter()
+    payload = os.urandom(size)
+    start = time.perf_counter()
+    if tcp:
+        clients = [_tcp_client(tcp, f'sensor-{i:03d}', readings, payload, window, latencies, counts)
+                   for i in range(connections)]
+    else:
+        clients = [_http_client(http, f'sensor-{i:03d}', readings, payload, latencies, counts)
+                   for i in range(connections)]
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {'readings': len(latencies), 'elapsed': elapsed, 'rate': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000, 'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0, 'codes': dict(counts)}
+
+
+def print_load(result):
+    print(f"{result['readings']} lectures en {result['elapsed']:.2f} s : {result['rate']:.0f} lectures/s")
+    print(f"latence p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+          f"max {result['max_ms']:.1f} ms ; réponses {result['codes']}")
+
+
+# ==========================================================
+# Point d’entrée
+# ==========================================================
+
+async def _serve(args):
+    session = get_session(args.db)
+    ingestor = Ingestor(session, load_abe_state(session), SensorRules.load(args.rules),
+                        args.storage, args.batch_size, args.batch_interval)
+    gateway = Gateway(ingestor, args.workers, args.max_queue, args.max_batches)
+    addresses = await gateway.start(tcp=args.tcp and _address(args.tcp),
+                                    http=args.http and _address(args.http))
+    print('Passerelle à l’écoute sur', ', '.join(f'{h}:{p}' for h, p in addresses))
+    try:
+        while True:
+            await asyncio.sleep(args.report_every)
+            print(json.dumps(gateway.stats()))
+    finally:
+        await gateway.close()
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='démarrer la passerelle')
+    serve.add_argument('--rules', required=True, help='règles par capteur (JSON, voir ingest.py)')
+    serve.add_argument('--tcp', metavar='HÔTE:PORT')
+    serve.add_argument('--http', metavar='HÔTE:PORT')
+    serve.add_argument('--db', help='base SQLite (défaut : data.db)')
+    serve.add_argument('--storage', default=STORAGE_DIR)
+    serve.add_argument('--workers', type=int, default=4, help='threads de chiffrement')
+    serve.add_argument('--batch-size', type=int, default=500)
+    serve.add_argument('--batch-interval', type=float, default=0.02)
+    serve.add_argument('--max-queue', type=int, default=5000)
+    serve.add_argument('--max-batches', type=int, default=4, help='lots en vol au plus')
+    serve.add_argument('--report-every', type=float, default=5.0)
+
+    load = commands.add_parser('load', help='générateur de charge local')
+    target = load.add_mutually_exclusive_group(required=True)
+    target.add_argument('--tcp', metavar='HÔTE:PORT')
+    target.add_argument('--http', metavar='HÔTE:PORT')
+    load.add_argument('--connections', type=int, default=50)
+    load.add_argument('--readings', type=int, default=200, help='lectures par connexion')
+    load.add_argument('--size', type=int, default=256, help='taille d’une lecture (octets)')
+    load.add_argument('--window', type=int, default=16, help='lectures TCP non acquittées par connexion')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if not (args.tcp or args.http):
+            parser.error('--tcp et/ou --http requis')
+        try:
+            asyncio.run(_serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        print_load(asyncio.run(run_load(args.tcp and _address(args.tcp), args.http and _address(args.http),
+                                        args.connections, args.readings, args.size, args.window)))
+
+
+if __name__ == '__main__':
+    main()
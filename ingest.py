@@ -0,0 +1,409 @@
+"""
+Ingestion sans interface des lectures de capteurs.
+
+Les lectures arrivent par un dossier d’entrée (un sous-dossier par
+capteur : inbox/<sensor_id>/<fichier>), par une socket locale ou par un
+générateur synthétique ; elles sont chiffrées selon la règle de leur
+capteur, écrites dans storage/ puis enregistrées en base par lots (une
+transaction par lot). N’importe pas customtkinter.
+
+Usage :
+    python ingest.py --rules rules.json --inbox inbox/
+    python ingest.py --rules rules.json --listen 127.0.0.1:9100
+    python ingest.py --rules rules.json --synthetic 20000
+
+Règles (premier motif correspondant) :
+    [{"sensor": "ecg-*", "mode": "CP", "policy": "role:medecin and service:cardio"},
+     {"sensor": "*", "mode": "KP", "attributes": ["type:vitals"]}]
+
+Protocole socket, par lecture : u16 longueur + identifiant du capteur
+(UTF-8), u32 longueur + données ; réponse d’un octet (0 acceptée,
+1 refusée : aucune règle, 4 refusée : plus de MAX_READING_SIZE octets,
+la connexion est alors fermée).
+"""
+import argparse
+import datetime
+import fnmatch
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+from abe.sim_abe import encrypt_cp_batch, encrypt_kp_batch, get_compiled_policy
+from models import get_session, load_abe_state, Record
+
+STORAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage')
+
+# Fichiers en cours d’écriture dans le dossier d’entrée : ignorés
+_PARTIAL_SUFFIXES = ('.tmp', '.part')
+_REJECTED_DIR = '_rejected'
+
+_SENSOR_LEN = struct.Struct('>H')
+_DATA_LEN = struct.Struct('>I')
+
+# Taille maximale d’une lecture reçue par le réseau : la longueur u32 vient
+# du client et ne doit pas faire mettre en mémoire jusqu’à 4 Gio
+MAX_READING_SIZE = int(os.environ.get('IOMT_MAX_READING_SIZE', str(16 * 1024 * 1024)))
+READING_TOO_LARGE = 4
+
+# Capteurs distincts dont la règle reste en cache (identifiants venus du réseau)
+MATCH_CACHE_SIZE = 4096
+
+# L’identifiant du capteur vient du réseau : dans un nom de fichier, seuls
+# ces caractères sont gardés (ni '/', ni '..', longueur bornée)
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+_NAME_MAX = 64
+
+log = logging.getLogger(__name__)
+
+
+class Reading(NamedTuple):
+    sensor_id: str
+    data: bytes
+    source: Optional[str] = None    # fichier du dossier d’entrée, supprimé après commit
+
+
+# ==========================================================
+# Règles par capteur
+# ==========================================================
+
+def _file_label(sensor_id):
+    """Identifiant du capteur utilisable dans un nom de fichier de storage/."""
+    return _UNSAFE_NAME.sub('_', sensor_id)[:_NAME_MAX].lstrip('.') or '_'
+
+
+class SensorRules:
+    """
+    Associe un capteur à son chiffrement (motifs fnmatch, premier trouvé).
+    Les politiques sont compilées au chargement : une règle invalide
+    arrête le démarrage plutôt que l’ingestion.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        for rule in rules:
+            mode = rule.get('mode', 'CP').upper()
+            if mode == 'CP':
+                get_compiled_policy(rule['policy'])
+                target = rule['policy']
+            elif mode == 'KP':
+                target = list(rule['attributes'])
+            else:
+                raise ValueError(f"mode inconnu pour {rule.get('sensor')!r} : {mode}")
+            self.rules.append((rule.get('sensor', '*'), mode, target))
+        self.match = functools.lru_cache(maxsize=MATCH_CACHE_SIZE)(self._match)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _match(self, sensor_id):
+        """
+        Index de la règle du capteur, ou None. Appelée par match(), cache
+        LRU borné (MATCH_CACHE_SIZE) : les identifiants viennent du réseau.
+        """
+        return next((i for i, (pattern, _, _) in enumerate(self.rules)
+                     if fnmatch.fnmatchcase(sensor_id, pattern)), None)
+
+
+# ==========================================================
+# Ingestion par lots
+# ==========================================================
+
+class Ingestor:
+    """
+    File bornée de lectures (les producteurs bloquent quand elle est
+    pleine) vidée par lots : au plus `batch_size` lectures ou
+    `batch_interval` secondes d’attente.
+    """
+
+    def __init__(self, session, state, rules, storage_dir=STORAGE_DIR,
+                 batch_size=500, batch_interval=0.5, max_pending=10000):
+        self.session = session
+        self.state = state
+        self.rules = rules
+        self.storage_dir = storage_dir
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue(max_pending)
+        self.stored = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        os.makedirs(storage_dir, exist_ok=True)
+
+    def submit(self, reading, timeout=None) -> bool:
+        """Ajoute une lecture ; False si son capteur n’a aucune règle."""
+        if self.rules.match(reading.sensor_id) is None:
+            self.rejected += 1
+            return False
+        self.queue.put(reading, timeout=timeout)
+        return True
+
+    def close(self):
+        """Termine run() une fois les lectures déjà soumises traitées."""
+        self.queue.put(None)
+
+    def run(self, stop=None, report=None):
+        """
+        Boucle principale. `report(stored, elapsed)` est appelé après
+        chaque lot. Un lot en échec (disque, base) est journalisé et
+        compté dans `failed`, la boucle continue.
+        """
+        start = time.perf_counter()
+        closed = False
+        while not closed and not (stop is not None and stop.is_set()):
+            try:
+                first = self.queue.get(timeout=self.batch_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            deadline = time.perf_counter() + self.batch_interval
+            item = first
+            while True:
+                if item is None:
+                    closed = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.process(batch)
+                except Exception:
+                    self.failed += len(batch)
+                    log.exception('Lot de %d lectures abandonné', len(batch))
+                if report is not None:
+                    report(self.stored, time.perf_counter() - start)
+        return time.perf_counter() - start
+
+    def process(self, batch):
+        self.store(batch, *self.seal(batch))
+
+    def seal(self, batch):
+        """
+        Chiffre un lot et écrit ses enveloppes dans storage/ ; retourne
+        (lignes Record, fichiers écrits). Sans accès à la base : peut
+        tourner dans plusieurs threads.
+        """
+        # Regroupement par règle : une clé de données par fenêtre de lot
+        groups = {}
+        for reading in batch:
+            groups.setdefault(self.rules.match(reading.sensor_id), []).append(reading)
+
+        now = datetime.datetime.utcnow()
+        stamp = int(now.timestamp())
+        rows, written = [], []
+        try:
+            for index, readings in groups.items():
+                _, mode, target = self.rules.rules[index]
+                plaintexts = [r.data for r in readings]
+                if mode == 'CP':
+                    sealed = encrypt_cp_batch(self.state, target, plaintexts)
+                else:
+                    sealed = encrypt_kp_batch(self.state, target, plaintexts)
+                for reading, (payload, meta) in zip(readings, sealed):
+                    name = f'{stamp}_{_file_label(reading.sensor_id)}_{uuid.uuid4().hex[:12]}.bin'
+                    path = os.path.join(self.storage_dir, name)
+                    with open(path, 'wb') as f:
+                        f.write(payload)
+                    written.append(path)
+                    rows.append({'sensor_id': reading.sensor_id, 'storage_path': path, 'encryption_type': mode,
+                                 'policy_text': meta.get('policy', ''),
+                                 'attributes_json': json.dumps(meta.get('attributes', [])),
+                                 'created_at': now})
+        except Exception:
+            _remove_files(written)
+            raise
+        return rows, written
+
+    def store(self, batch, rows, written):
+        """Enregistre les lignes d’un ou plusieurs lots scellés en une transaction."""
+        try:
+            self.session.bulk_insert_mappings(Record, rows)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            _remove_files(written)
+            raise
+
+        # Fichiers d’entrée supprimés seulement une fois le lot en base
+        for reading in batch:
+            if reading.source is not None:
+                try:
+                    os.remove(reading.source)
+                except FileNotFoundError:
+                    pass
+        self.stored += len(rows)
+        self.batches += 1
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# ==========================================================
+# Sources : dossier d’entrée, socket, charge synthétique
+# ==========================================================
+
+def watch_inbox(ingestor, inbox, stop, poll=0.5):
+    """
+    Scrute inbox/<sensor_id>/ ; les fichiers sans règle sont déplacés
+    dans inbox/_rejected/. Écrire les lectures sous un nom .tmp puis les
+    renommer pour qu’elles ne soient pas lues incomplètes.
+    """
+    queued = set()
+    rejected_dir = os.path.join(inbox, _REJECTED_DIR)
+    while not stop.is_set():
+        # Fichiers supprimés après commit : ne plus les suivre
+        queued = {p for p in queued if os.path.exists(p)}
+        for sensor in os.scandir(inbox):
+            if not sensor.is_dir() or sensor.name == _REJECTED_DIR:
+                continue
+            for entry in os.scandir(sensor.path):
+                if (not entry.is_file() or entry.path in queued
+                        or entry.name.startswith('.') or entry.name.endswith(_PARTIAL_SUFFIXES)):
+                    continue
+                with open(entry.path, 'rb') as f:
+                    reading = Reading(sensor.name, f.read(), entry.path)
+                if ingestor.submit(reading):
+                    queued.add(entry.path)
+                else:
+                    os.makedirs(rejected_dir, exist_ok=True)
+                    os.replace(entry.path, os.path.join(rejected_dir, f'{sensor.name}_{entry.name}'))
+        stop.wait(poll)
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def serve_socket(ingestor, host, port):
+    """Serveur TCP local (un thread par connexion) ; à arrêter par shutdown()."""
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                head = _recv_exact(self.request, _SENSOR_LEN.size)
+                if head is None:
+                    return
+                sensor = _recv_exact(self.request, _SENSOR_LEN.unpack(head)[0])
+                head = _recv_exact(self.request, _DATA_LEN.size)
+                if sensor is None or head is None:
+                    return
+                size = _DATA_LEN.unpack(head)[0]
+                if size > MAX_READING_SIZE:
+                    # Corps non lu : la trame suivante est introuvable, on ferme
+                    self.request.sendall(bytes([READING_TOO_LARGE]))
+                    return
+                data = _recv_exact(self.request, size)
+                if data is None:
+                    return
+                accepted = ingestor.submit(Reading(sensor.decode('utf-8'), data))
+                self.request.sendall(b'\x00' if accepted else b'\x01')
+
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def synthetic_readings(count, sensors=50, size=256, seed=0):
+    """Lectures de constantes vitales JSON (≈ `size` octets) réparties sur `sensors` capteurs."""
+    rng = random.Random(seed)
+    for i in range(count):
+        vitals = {'seq': i, 'hr': rng.randint(50, 130), 'spo2': rng.randint(88, 100),
+                  'temp': round(rng.uniform(35.5, 39.5), 1), 'ts': time.time()}
+        body = json.dumps(vitals).encode()
+        yield Reading(f'sensor-{i % sensors:03d}', body + b' ' * max(0, size - len(body)))
+
+
+# ==========================================================
+# Point d’entrée
+# ==========================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rules', required=True, help='règles par capteur (JSON)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--inbox', help='dossier d’entrée (un sous-dossier par capteur)')
+    source.add_argument('--listen', metavar='HÔTE:PORT', help='socket TCP locale')
+    source.add_argument('--synthetic', type=int, metavar='N', help='N lectures synthétiques puis arrêt')
+    parser.add_argument('--db', help='base SQLite (défaut : data.db)')
+    parser.add_argument('--storage', default=STORAGE_DIR)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--batch-interval', type=float, default=0.5)
+    parser.add_argument('--reading-size', type=int, default=256, help='taille des lectures synthétiques')
+    parser.add_argument('--report-every', type=float, default=5.0, help='secondes entre deux rapports')
+    args = parser.parse_args()
+
+    session = get_session(args.db)
+    ingestor = Ingestor(session, load_abe_state(session), SensorRules.load(args.rules),
+                        args.storage, args.batch_size, args.batch_interval)
+
+    last = [0.0]
+
+    def report(stored, elapsed):
+        if elapsed - last[0] >= args.report_every:
+            last[0] = elapsed
+            print(f'{stored} lectures stockées, {stored / elapsed:.0f} lectures/s')
+
+    stop = threading.Event()
+    server = None
+    if args.inbox:
+        os.makedirs(args.inbox, exist_ok=True)
+        threading.Thread(target=watch_inbox, args=(ingestor, args.inbox, stop), daemon=True).start()
+    elif args.listen:
+        host, _, port = args.listen.rpartition(':')
+        server = serve_socket(ingestor, host or '127.0.0.1', int(port))
+    else:
+        def produce():
+            for reading in synthetic_readings(args.synthetic, size=args.reading_size):
+                ingestor.submit(reading)
+            ingestor.close()
+        threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        elapsed = ingestor.run(stop, report)
+    except KeyboardInterrupt:
+        elapsed = None
+    finally:
+        stop.set()
+        if server is not None:
+            server.shutdown()
+        session.close()
+    if elapsed:
+        print(f'Terminé : {ingestor.stored} lectures en {ingestor.batches} lots, '
+              f'{elapsed:.2f} s, {ingestor.stored / elapsed:.0f} lectures/s '
+              f'({ingestor.rejected} refusées, {ingestor.failed} en échec)')
+    else:
+        print(f'Arrêt : {ingestor.stored} lectures stockées '
+              f'({ingestor.rejected} refusées, {ingestor.failed} en échec)')
+
+
+if __name__ == '__main__':
+    main()
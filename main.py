@@ -1,14 +1,207 @@
 import sys
 import customtkinter as ctk
 from tkinter import messagebox, filedialog
-import base64, json, os, datetime
-from models import get_session
-from abe.sim_abe import setup_abe, encrypt_cp, encrypt_kp, keygen_cp, keygen_kp, decrypt_cp, decrypt_kp
+import json, os, datetime
+from models import get_session, worker_session, distinct_policies, load_abe_state, table_counts
+from bulk import decrypt_all_for_key
+from tasks import TaskRunner, TaskCancelled
+from virtual_list import VirtualList
+from abe.sim_abe import (keygen_cp, keygen_kp, encrypt_cp_stream, encrypt_kp_stream,
+                         decrypt_cp_stream, decrypt_kp_stream, check_access_meta, prewarm_policy_cache)
 
 db = get_session()
-abe_state = setup_abe()
+# Clés maîtresses persistées dans data.db (stables d'une session à l'autre)
+abe_state = load_abe_state(db)
+# Pré-compiler les politiques déjà utilisées (records CP / clés KP)
+prewarm_policy_cache(distinct_policies(db))
 STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'storage')
 os.makedirs(STORAGE_DIR, exist_ok=True)
+# Intervalle de recalcul des compteurs de la barre latérale
+RECONCILE_COUNTS_MS = 5 * 60 * 1000
+
+# -------------------- CHARGEMENTS EN ARRIÈRE-PLAN --------------------
+# Exécutés par TaskRunner dans un thread de travail, avec la session de
+# ce thread (la session `db` reste réservée au thread Tk). Le texte est
+# publié page par page (pagination par clé) : affichage dès la première
+# page, une seule page en mémoire côté base. Chaque ligne est un bloc
+# (tag, texte) pour pouvoir être remplacée ensuite (IncrementalText).
+
+def _user_block(u):
+    # ===== En-tête utilisateur =====
+    lines = [f"🆔 ID: {u.id} | 👤 {u.username} | 🎯 Rôle: {u.role}\n"]
+
+    # ===== Attributs (style preview) =====
+    attrs_text = ", ".join([f"{a.name}={a.value}" for a in u.attributes])
+    if attrs_text:
+        preview_attrs = attrs_text[:80] + "..." if len(attrs_text) > 80 else attrs_text
+        lines.append(f"📋 Attributs: {preview_attrs}\n")
+
+    # ===== Clés ABE / Policy (style record) =====
+    for k in u.keys:
+        # Clé KP : policy_blob ; sinon les attributs de l'utilisateur
+        if k.key_type == 'KP' and k.policy_blob:
+            policy_text = k.policy_blob
+        else:
+            policy_text = attrs_text or "—"
+
+        policy_preview = policy_text[:80] + "..." if len(policy_text) > 80 else policy_text
+        lines.append(f"🔑 KeyID: {k.id} | 🔐 Type: {k.key_type}\n"
+                     f"📜 Policy/Attribs: {policy_preview}\n")
+
+    # ===== Séparateur =====
+    lines.append("─" * 60 + "\n\n")
+    return ''.join(lines)
+
+
+def _record_block(r):
+    policy_text = r.policy_text or r.attributes_json
+    preview = policy_text[:80] + "..." if len(policy_text) > 80 else policy_text
+    return (f"🆔 ID: {r.id} | 📡 Capteur: {r.sensor_id} | "
+            f"🔐 Type: {r.encryption_type}\n"
+            f"📋 Policy/Attributs: {preview}\n"
+            f"🕐 Créé le: {r.created_at.strftime('%Y-%m-%d %H:%M')}\n"
+            f"{'─'*60}\n\n")
+
+
+def _record_columns():
+    from models import Record as R
+    return (R.id, R.sensor_id, R.encryption_type, R.policy_text, R.attributes_json, R.created_at)
+
+
+# La marque du journal est lue avant la liste : une ligne modifiée entre
+# les deux est relue à la mise à jour suivante, sans doublon puisque son
+# bloc (tag) est remplacé.
+
+def _load_users_text(task):
+    from models import users_with_keys, change_watermark, DEFAULT_PAGE_SIZE
+    blocks = []
+    with worker_session() as session:
+        watermark = change_watermark(session)
+        for n, u in enumerate(users_with_keys(session), 1):
+            blocks.append((f'user{u.id}', _user_block(u)))
+            if n % DEFAULT_PAGE_SIZE == 0:
+                task.publish(blocks)
+                blocks = []
+    if blocks:
+        task.publish(blocks)
+    return watermark
+
+
+def _load_user_changes(task, after):
+    from models import users_with_keys, changes_since
+    with worker_session() as session:
+        watermark, ids = changes_since(session, 'users', after)
+        if ids is None:
+            return watermark, None
+        users = {u.id: u for u in users_with_keys(session, ids=ids)}
+        return watermark, [(f'user{i}', _user_block(users[i]) if i in users else None) for i in ids]
+
+
+def _load_records_text(task):
+    from models import iter_record_pages, change_watermark
+    with worker_session() as session:
+        watermark = change_watermark(session)
+        for page in iter_record_pages(session, columns=_record_columns()):
+            task.publish([(f'record{r.id}', _record_block(r)) for r in page])
+    return watermark
+
+
+def _load_record_changes(task, after):
+    from models import Record as R, changes_since
+    with worker_session() as session:
+        watermark, ids = changes_since(session, 'records', after)
+        if ids is None:
+            return watermark, None
+        rows = {r.id: r for r in session.query(*_record_columns()).filter(R.id.in_(ids))}
+        return watermark, [(f'record{i}', _record_block(rows[i]) if i in rows else None) for i in ids]
+
+
+def _reconcile_counts(task):
+    from models import reconcile_counts
+    with worker_session() as session:
+        return reconcile_counts(session)
+
+
+class IncrementalText:
+    """
+    Liste affichée dans un CTkTextbox : chargement complet page par page
+    (reload), puis mises à jour limitées aux lignes modifiées depuis la
+    marque du journal (update). Chaque ligne porte un tag Tk qui permet de
+    la remplacer ou de la retirer ; les nouvelles lignes vont à `new_at`.
+    """
+
+    def __init__(self, page, box, load_all, load_changes, new_at='end'):
+        self.page = page
+        self.box = box
+        self.load_all = load_all
+        self.load_changes = load_changes
+        self.new_at = new_at
+        self.task = None
+        self.generation = 0
+        self.watermark = None
+        self.pending = False
+
+    def reload(self):
+        # Un chargement en cours est annulé et ses pages ignorées
+        if self.task is not None and not self.task.done:
+            self.task.cancel()
+        self.generation += 1
+        generation = self.generation
+        self.watermark = None
+        self.pending = False
+        self.box.delete('1.0', 'end')
+        self.task = self.page.main_app.tasks.submit(
+            self.load_all,
+            on_item=lambda blocks: self._apply(generation, blocks, 'end'),
+            on_done=lambda watermark: self._loaded(generation, watermark))
+
+    def update(self):
+        # Chargement ou mise à jour en cours : relancée à sa fin
+        if self.task is not None and not self.task.done:
+            self.pending = True
+            return
+        if self.watermark is None:
+            self.reload()
+            return
+        generation = self.generation
+        self.task = self.page.main_app.tasks.submit(
+            self.load_changes, self.watermark,
+            on_done=lambda result: self._patched(generation, result))
+
+    def _alive(self, generation):
+        return generation == self.generation and self.page.winfo_exists()
+
+    def _apply(self, generation, blocks, new_at):
+        if not self._alive(generation):
+            return
+        for tag, text in blocks:
+            index = new_at
+            ranges = self.box.tag_ranges(tag)
+            if ranges:
+                index = str(ranges[0])
+                self.box.delete(ranges[0], ranges[-1])
+            if text:
+                self.box.insert(index, text, tag)
+
+    def _loaded(self, generation, watermark):
+        if not self._alive(generation):
+            return
+        self.watermark = watermark
+        if self.pending:
+            self.pending = False
+            self.update()
+
+    def _patched(self, generation, result):
+        if not self._alive(generation):
+            return
+        watermark, blocks = result
+        if blocks is None:
+            # Trop de changements ou journal purgé : rechargement complet
+            self.reload()
+            return
+        self._apply(generation, blocks, self.new_at)
+        self._loaded(generation, watermark)
+
 
 # Configuration du thème personnalisé
 ctk.set_appearance_mode('Dark')
@@ -106,12 +299,10 @@ class App(ctk.CTk):
                                    fg_color=self.colors['card_bg'])
         status_frame.pack(side='bottom', fill='x', padx=10, pady=10)
         
-        from models import User, Record
-        user_count = db.query(User).count()
-        record_count = db.query(Record).count()
+        counts = table_counts(db)
         
         self.status_label = ctk.CTkLabel(status_frame, 
-                    text=f"👥 {user_count} users\n📁 {record_count} records",
+                    text=f"👥 {counts.get('users', 0)} users\n📁 {counts.get('records', 0)} records",
                     font=('Arial', 11),
                     text_color=self.colors['text_muted'],
                     justify='center')
@@ -121,6 +312,12 @@ class App(ctk.CTk):
                                          fg_color=self.colors['light_bg'])
         self.content_frame.pack(side='right', fill='both', expand=True)
 
+        # Exécution des opérations longues hors du thread Tk
+        self.tasks = TaskRunner(self)
+
+        # Recalcul périodique des compteurs (COUNT(*) en arrière-plan)
+        self.after(RECONCILE_COUNTS_MS, self.reconcile_status_counts)
+
         # Initialisation des pages
         self.user_page = None
         self.iomt_page = None
@@ -130,14 +327,24 @@ class App(ctk.CTk):
         # Afficher par défaut la page utilisateurs
         self.show_user_page()
     def refresh_status_counts(self):
-        from models import User, Record
-        user_count = db.query(User).count()
-        record_count = db.query(Record).count()
+        # Compteurs tenus à jour par triggers : lecture O(1)
+        self._show_counts(table_counts(db))
 
+    def _show_counts(self, counts):
         self.status_label.configure(
-            text=f"👥 {user_count} users\n📁 {record_count} records"
+            text=f"👥 {counts.get('users', 0)} users\n📁 {counts.get('records', 0)} records"
         )
 
+    def reconcile_status_counts(self):
+        def done(counts):
+            self._show_counts(counts)
+            self.after(RECONCILE_COUNTS_MS, self.reconcile_status_counts)
+
+        def failed(e):
+            self.after(RECONCILE_COUNTS_MS, self.reconcile_status_counts)
+
+        self.tasks.submit(_reconcile_counts, on_done=done, on_error=failed)
+
     def clear_content(self):
         for widget in self.content_frame.winfo_children():
             widget.destroy()
@@ -292,6 +499,8 @@ class UserPage(ctk.CTkFrame):
                                          fg_color=self.main_app.colors['dark_bg'])
         scrollbar_inner.pack(side='right', fill='y')
         self.users_box.configure(yscrollcommand=scrollbar_inner.set)
+        self.users_view = IncrementalText(self, self.users_box, _load_users_text,
+                                          _load_user_changes, new_at='end')
 
         ctk.CTkButton(right_column, text="🔄 Rafraîchir la Liste", 
                      command=self.refresh_users, height=45,
@@ -310,7 +519,7 @@ class UserPage(ctk.CTkFrame):
         db.add(u)
         db.commit()
         messagebox.showinfo('Succès', f'✅ Utilisateur créé - ID: {u.id}')
-        self.refresh_users()
+        self.update_users()
         self.username.delete(0, 'end')
         self.role.delete(0, 'end')
         self.main_app.refresh_status_counts()
@@ -329,12 +538,16 @@ class UserPage(ctk.CTkFrame):
             messagebox.showerror('Erreur', '❌ Le nom et la valeur sont requis')
             return
         
-        from models import Attribute as A
+        from models import Attribute as A, User as U
+        # user_id est une clé étrangère : l'utilisateur doit exister
+        if not db.query(U).get(uid):
+            messagebox.showerror('Erreur', '❌ Utilisateur non trouvé')
+            return
         a = A(user_id=uid, name=name, value=val)
         db.add(a)
         db.commit()
         messagebox.showinfo('Succès', '✅ Attribut ajouté avec succès')
-        self.refresh_users()
+        self.update_users()
         self.attr_userid.delete(0, 'end')
         self.attr_name.delete(0, 'end')
         self.attr_value.delete(0, 'end')
@@ -347,7 +560,10 @@ class UserPage(ctk.CTkFrame):
             return
         ktype = self.key_type.get()
         payload = self.key_policy.get().strip()
-        from models import ABEKey as K
+        from models import ABEKey as K, User as U
+        if not db.query(U).get(uid):
+            messagebox.showerror('Erreur', '❌ Utilisateur non trouvé')
+            return
         if ktype == 'CP':
             try:
                 attrs = json.loads(payload)
@@ -365,67 +581,17 @@ class UserPage(ctk.CTkFrame):
         db.add(key)
         db.commit()
         messagebox.showinfo('Succès', f'✅ Clé créée - ID: {key.id}')
-        self.refresh_users()
+        self.update_users()
         self.key_userid.delete(0, 'end')
         self.key_policy.delete(0, 'end')
 
     def refresh_users(self):
-        from models import User as U, Attribute as A, ABEKey as K
-        self.users_box.delete('1.0', 'end')
-        users = db.query(U).all()
-
-        for u in users:
-            # ===== En-tête utilisateur =====
-            self.users_box.insert(
-                'end',
-                f"🆔 ID: {u.id} | 👤 {u.username} | 🎯 Rôle: {u.role}\n"
-            )
-
-            # ===== Attributs (style preview) =====
-            attrs = db.query(A).filter(A.user_id == u.id).all()
-            if attrs:
-                attrs_text = ", ".join([f"{a.name}={a.value}" for a in attrs])
-                preview_attrs = attrs_text[:80] + "..." if len(attrs_text) > 80 else attrs_text
-                self.users_box.insert(
-                    'end',
-                    f"📋 Attributs: {preview_attrs}\n"
-                )
-            '''else:
-                self.users_box.insert(
-                    'end',
-                    "📋 Attributs: Aucun\n"
-                )'''
-
-           # ===== Clés ABE / Policy (style record) =====
-            keys = db.query(K).filter(K.user_id == u.id).all()
-            if keys:
-                for k in keys:
-                    # Si c'est une clé KP, on prend policy_blob
-                    if k.key_type == 'KP' and k.policy_blob:
-                        policy_text = k.policy_blob
-                    else:
-                        # Sinon, on prend les attributs de l'utilisateur
-                        attrs = db.query(A).filter(A.user_id == u.id).all()
-                        if attrs:
-                            policy_text = ", ".join([f"{a.name}={a.value}" for a in attrs])
-                        else:
-                            policy_text = "—"
-                    
-                    policy_preview = policy_text[:80] + "..." if len(policy_text) > 80 else policy_text
-
-                    self.users_box.insert(
-                        'end',
-                        f"🔑 KeyID: {k.id} | 🔐 Type: {k.key_type}\n"
-                        f"📜 Policy/Attribs: {policy_preview}\n"
-                    )
-            '''else:
-                self.users_box.insert(
-                    'end',
-                    "🔑 Clés ABE: Aucune\n"
-                )'''
-
-            # ===== Séparateur =====
-            self.users_box.insert('end', "─" * 60 + "\n\n")
+        # Requêtes et mise en forme dans un thread de travail
+        self.users_view.reload()
+
+    def update_users(self):
+        # Seuls les utilisateurs modifiés depuis le dernier affichage
+        self.users_view.update()
 
 # -------------------- PAGE IOMT AVEC DESIGN AVANCE ET SCROLL --------------------
 class IoMTPage(ctk.CTkFrame):
@@ -500,6 +666,19 @@ class IoMTPage(ctk.CTkFrame):
                      font=('Arial', 14, 'bold'),
                      fg_color=self.main_app.colors['success']).pack(side='left', fill='x', expand=True)
 
+        # Progression de l'opération en cours (chiffrement / déchiffrement)
+        progress_frame = ctk.CTkFrame(config_section, fg_color='transparent')
+        progress_frame.pack(fill='x', padx=20, pady=(0, 20))
+
+        self.progress = ctk.CTkProgressBar(progress_frame, height=12)
+        self.progress.set(0)
+        self.progress.pack(side='left', fill='x', expand=True, padx=(0, 10))
+
+        ctk.CTkButton(progress_frame, text="⛔ Annuler", width=120,
+                     command=self.cancel_task,
+                     fg_color=self.main_app.colors['error']).pack(side='left')
+        self.current_task = None
+
         # Section historique
         history_section = ctk.CTkFrame(main_container, corner_radius=15,
                                       fg_color=self.main_app.colors['card_bg'])
@@ -522,6 +701,9 @@ class IoMTPage(ctk.CTkFrame):
                                            fg_color=self.main_app.colors['dark_bg'])
         records_scrollbar.pack(side='right', fill='y')
         self.records_box.configure(yscrollcommand=records_scrollbar.set)
+        # Plus récents d'abord : les nouveaux records s'insèrent en tête
+        self.records_view = IncrementalText(self, self.records_box, _load_records_text,
+                                            _load_record_changes, new_at='1.0')
 
         # Section déchiffrement
         decrypt_section = ctk.CTkFrame(main_container, corner_radius=15,
@@ -548,7 +730,12 @@ class IoMTPage(ctk.CTkFrame):
         ctk.CTkButton(decrypt_section, text="🔓 Déchiffrer", 
                      command=self.attempt_decrypt, height=50,
                      font=('Arial', 14, 'bold'),
-                     fg_color=self.main_app.colors['accent']).pack(fill='x', pady=15, padx=20)
+                     fg_color=self.main_app.colors['accent']).pack(fill='x', pady=(15, 5), padx=20)
+
+        ctk.CTkButton(decrypt_section, text="📦 Tout déchiffrer avec cette clé", 
+                     command=self.bulk_decrypt, height=45,
+                     font=('Arial', 14, 'bold'),
+                     fg_color=self.main_app.colors['primary']).pack(fill='x', pady=(5, 15), padx=20)
 
         ctk.CTkButton(history_section, text="🔄 Rafraîchir l'Historique", 
                      command=self.refresh_records, height=45,
@@ -569,60 +756,72 @@ class IoMTPage(ctk.CTkFrame):
         if not self.main_app.selected_file:
             messagebox.showerror('Erreur', '❌ Veuillez choisir un fichier d\'abord')
             return
+        if self.current_task and not self.current_task.done:
+            messagebox.showerror('Erreur', '❌ Une opération est déjà en cours')
+            return
         
         sensor = self.sensor_id.get().strip() or 'sensor-001'
         mode = self.encryption_mode.get()
         payload = self.policy_or_attrs.get().strip()
-        
-        try:
-            with open(self.main_app.selected_file, 'rb') as f:
-                content = f.read()
-            
+        src = self.main_app.selected_file
+
+        if mode == 'KP':
+            try:
+                attrs = json.loads(payload)
+            except Exception:
+                messagebox.showerror('Erreur', 'Pour le chiffrement KP, fournissez une liste JSON d\'attributs')
+                return
+
+        filename = f'{int(datetime.datetime.utcnow().timestamp())}_{os.path.basename(src)}.bin'
+        path = os.path.join(STORAGE_DIR, filename)
+
+        def job(task):
+            total = os.path.getsize(src)
+            progress = lambda done: task.report(done, total)
+            # Chiffrement en streaming : le fichier n'est jamais chargé en mémoire
             if mode == 'CP':
-                ct_blob, meta = encrypt_cp(abe_state, payload, content)
-            else:
-                try:
-                    attrs = json.loads(payload)
-                except Exception:
-                    messagebox.showerror('Erreur', 'Pour le chiffrement KP, fournissez une liste JSON d\'attributs')
-                    return
-                ct_blob, meta = encrypt_kp(abe_state, attrs, content)
-            
-            filename = f'{int(datetime.datetime.utcnow().timestamp())}_{os.path.basename(self.main_app.selected_file)}.bin'
-            path = os.path.join(STORAGE_DIR, filename)
-            
-            with open(path, 'wb') as f:
-                f.write(ct_blob)
-            
+                return encrypt_cp_stream(abe_state, payload, src, path, progress=progress)
+            return encrypt_kp_stream(abe_state, attrs, src, path, progress=progress)
+
+        def done(meta):
+            # Insertion en base sur le thread Tk (session partagée)
             from models import Record as R
             rec = R(sensor_id=sensor, storage_path=path, encryption_type=mode,
                     policy_text=meta.get('policy', ''), attributes_json=json.dumps(meta.get('attributes', [])),
                     created_at=datetime.datetime.utcnow())
             db.add(rec)
             db.commit()
-            
-            messagebox.showinfo('Succès', f'✅ Enregistrement stocké - ID: {rec.id}')
-            self.refresh_records()
             self.main_app.refresh_status_counts()
-            
-        except Exception as e:
-            messagebox.showerror('Erreur', f'❌ Erreur lors de l\'envoi: {str(e)}')
+            if self.winfo_exists():
+                self.progress.set(1)
+                self.update_records()
+            messagebox.showinfo('Succès', f'✅ Enregistrement stocké - ID: {rec.id}')
+
+        def failed(e):
+            if self.winfo_exists():
+                self.progress.set(0)
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo('Annulé', '⛔ Envoi annulé')
+            else:
+                messagebox.showerror('Erreur', f'❌ Erreur lors de l\'envoi: {str(e)}')
+
+        self.progress.set(0)
+        self.current_task = self.main_app.tasks.submit(job, on_done=done, on_error=failed,
+                                                       on_progress=self._on_progress)
+
+    def _on_progress(self, done, total):
+        if self.winfo_exists() and total:
+            self.progress.set(done / total)
+
+    def cancel_task(self):
+        if self.current_task and not self.current_task.done:
+            self.current_task.cancel()
 
     def refresh_records(self):
-        from models import Record as R
-        self.records_box.delete('1.0', 'end')
-        recs = db.query(R).order_by(R.created_at.desc()).all()
-        
-        for r in recs:
-            policy_text = r.policy_text or r.attributes_json
-            preview = policy_text[:80] + "..." if len(policy_text) > 80 else policy_text
-            
-            self.records_box.insert('end', 
-                                  f"🆔 ID: {r.id} | 📡 Capteur: {r.sensor_id} | "
-                                  f"🔐 Type: {r.encryption_type}\n"
-                                  f"📋 Policy/Attributs: {preview}\n"
-                                  f"🕐 Créé le: {r.created_at.strftime('%Y-%m-%d %H:%M')}\n"
-                                  f"{'─'*60}\n\n")
+        self.records_view.reload()
+
+    def update_records(self):
+        self.records_view.update()
 
     def attempt_decrypt(self):
         try:
@@ -637,20 +836,95 @@ class IoMTPage(ctk.CTkFrame):
         if not rec or not key:
             messagebox.showerror('Erreur', '❌ Record ou clé non trouvé')
             return
-        with open(rec.storage_path, 'rb') as f:
-            ct = f.read()
         sk_blob = bytes.fromhex(key.private_key_blob)
-        if rec.encryption_type == 'CP':
-            pt = decrypt_cp(abe_state, sk_blob, ct)
-        else:
-            pt = decrypt_kp(abe_state, sk_blob, ct)
-        if pt is None:
-            messagebox.showerror('Accès Refusé', '❌ Politique non satisfaite ou échec du déchiffrement')
+        # Pré-filtre sur les métadonnées du record : un refus ne lit pas le fichier
+        if not check_access_meta(abe_state, sk_blob, rec.encryption_type,
+                                 rec.policy_text, rec.attributes_json):
+            messagebox.showerror('Accès Refusé', '❌ Politique non satisfaite')
+            return
+        if self.current_task and not self.current_task.done:
+            messagebox.showerror('Erreur', '❌ Une opération est déjà en cours')
             return
-        outpath = os.path.join(os.path.dirname(rec.storage_path), f'plain_{rid}.bin')
-        with open(outpath, 'wb') as f:
-            f.write(pt)
-        messagebox.showinfo('Succès', f'✅ Texte clair sauvegardé dans: {outpath}')
+        src = rec.storage_path
+        enc_type = rec.encryption_type
+        outpath = os.path.join(os.path.dirname(src), f'plain_{rid}.bin')
+
+        def job(task):
+            total = os.path.getsize(src) if os.path.exists(src) else 0
+            progress = lambda done: task.report(done, total)
+            # Déchiffrement en streaming (les anciens payloads sont aussi acceptés)
+            decrypt = decrypt_cp_stream if enc_type == 'CP' else decrypt_kp_stream
+            written = decrypt(abe_state, sk_blob, src, outpath, progress=progress)
+            if written is None and task.cancelled:
+                raise TaskCancelled()
+            return written
+
+        def done(written):
+            if self.winfo_exists():
+                self.progress.set(1 if written is not None else 0)
+            if written is None:
+                messagebox.showerror('Accès Refusé', '❌ Politique non satisfaite ou échec du déchiffrement')
+                return
+            messagebox.showinfo('Succès', f'✅ Texte clair sauvegardé dans: {outpath}')
+
+        def failed(e):
+            if self.winfo_exists():
+                self.progress.set(0)
+            if not isinstance(e, TaskCancelled):
+                messagebox.showerror('Erreur', f'❌ Erreur lors du déchiffrement: {str(e)}')
+
+        self.progress.set(0)
+        self.current_task = self.main_app.tasks.submit(job, on_done=done, on_error=failed,
+                                                       on_progress=self._on_progress)
+
+    def bulk_decrypt(self):
+        try:
+            kid = int(self.dec_key.get().strip())
+        except:
+            messagebox.showerror('Erreur', '❌ ID de clé invalide')
+            return
+        from models import ABEKey as K
+        key = db.query(K).get(kid)
+        if not key:
+            messagebox.showerror('Erreur', '❌ Clé non trouvée')
+            return
+        if self.current_task and not self.current_task.done:
+            messagebox.showerror('Erreur', '❌ Une opération est déjà en cours')
+            return
+        out_dir = filedialog.askdirectory(title='Dossier de sortie des données déchiffrées')
+        if not out_dir:
+            return
+
+        def job(task):
+            # Session du thread de travail : la mise à jour éventuelle de
+            # access_grants (granted_records) ne bloque pas l'interface
+            with worker_session() as session:
+                key = session.query(K).get(kid)
+                if key is None:
+                    raise LookupError('Clé non trouvée')
+                return decrypt_all_for_key(session, abe_state, key, out_dir=out_dir,
+                                           progress=task.report)
+
+        def done(result):
+            ok, ko = result
+            if self.winfo_exists():
+                self.progress.set(1)
+            msg = f'✅ {len(ok)} record(s) déchiffré(s) dans: {out_dir}'
+            if ko:
+                msg += f"\n⚠️ Échec pour: {', '.join(str(r) for r in ko)}"
+            messagebox.showinfo('Déchiffrement en masse', msg)
+
+        def failed(e):
+            if self.winfo_exists():
+                self.progress.set(0)
+            if isinstance(e, TaskCancelled):
+                messagebox.showinfo('Annulé', '⛔ Déchiffrement en masse annulé')
+            else:
+                messagebox.showerror('Erreur', f'❌ Erreur lors du déchiffrement en masse: {str(e)}')
+
+        self.progress.set(0)
+        self.current_task = self.main_app.tasks.submit(job, on_done=done, on_error=failed,
+                                                       on_progress=self._on_progress)
 
 # -------------------- PAGE GESTION UTILISATEURS AVEC DESIGN AVANCE --------------------
 class GestionUsers(ctk.CTkFrame):
@@ -672,21 +946,28 @@ class GestionUsers(ctk.CTkFrame):
         main_container = ctk.CTkFrame(self, fg_color='transparent')
         main_container.pack(fill='both', expand=True)
 
-        # Frame scrollable pour la liste des utilisateurs
-        self.scroll_frame = ctk.CTkScrollableFrame(main_container, 
-                                                  fg_color=self.main_app.colors['card_bg'],
-                                                  corner_radius=15)
-        self.scroll_frame.pack(fill='both', expand=True, pady=10, padx=10)
-
         # Titre pour la section
-        ctk.CTkLabel(self.scroll_frame, text="📋 Liste des Utilisateurs",
+        ctk.CTkLabel(main_container, text="📋 Liste des Utilisateurs",
                     font=('Arial', 18, 'bold'),
                     text_color=self.main_app.colors['text_light']).pack(pady=10)
 
+        # Liste fenêtrée des utilisateurs (pagination par id)
+        self.users_list = VirtualList(main_container,
+                                      row_height=120,
+                                      make_row=self._make_user_row,
+                                      fill_row=self._fill_user_row,
+                                      fetch=self._fetch_users,
+                                      count=self._count_users,
+                                      empty_text="Aucun utilisateur trouvé",
+                                      fg_color=self.main_app.colors['card_bg'],
+                                      corner_radius=15)
+        self.users_list.pack(fill='both', expand=True, pady=10, padx=10)
+
         # Bouton pour rafraîchir
-        ctk.CTkButton(main_container, text="🔄 Rafraîchir la liste", 
+        self.refresh_button = ctk.CTkButton(main_container, text="🔄 Rafraîchir la liste", 
                      command=self.refresh_users, height=45,
-                     font=('Arial', 14, 'bold')).pack(pady=10)
+                     font=('Arial', 14, 'bold'))
+        self.refresh_button.pack(pady=10)
 
         # Frame pour modification utilisateur (cachée au début)
         self.edit_frame = ctk.CTkFrame(main_container, corner_radius=15,
@@ -697,53 +978,62 @@ class GestionUsers(ctk.CTkFrame):
         self.refresh_users()
 
     def refresh_users(self):
-        # Effacer le contenu précédent
-        for widget in self.scroll_frame.winfo_children():
-            widget.destroy()
+        self.users_list.refresh()
 
-        from models import User as U
-        users = db.query(U).all()
+    def _count_users(self):
+        return table_counts(db).get('users', 0)
+
+    def _fetch_users(self, offset, limit, after):
+        from models import User as U, users_page
+        columns = (U.id, U.username, U.role)
+        if after is not None:
+            return users_page(db, after.id, limit, columns)
+        return users_page(db, None, limit, columns, offset=offset)
+
+    def _make_user_row(self, parent, height):
+        user_card = ctk.CTkFrame(parent, corner_radius=10, height=height,
+                               fg_color=self.main_app.colors['dark_bg'])
+
+        # Informations utilisateur
+        info_frame = ctk.CTkFrame(user_card, fg_color='transparent')
+        info_frame.pack(fill='x', padx=15, pady=10)
+
+        user_card.name = ctk.CTkLabel(info_frame, text="",
+                                      font=('Arial', 16, 'bold'),
+                                      text_color=self.main_app.colors['text_light'])
+        user_card.name.pack(anchor='w')
+
+        user_card.info = ctk.CTkLabel(info_frame, text="",
+                                      font=('Arial', 12),
+                                      text_color=self.main_app.colors['text_muted'])
+        user_card.info.pack(anchor='w')
+
+        # Boutons d'action
+        btn_frame = ctk.CTkFrame(user_card, fg_color='transparent')
+        btn_frame.pack(fill='x', padx=15, pady=(5, 10))
 
-        if not users:
-            ctk.CTkLabel(self.scroll_frame, text="Aucun utilisateur trouvé",
-                        font=('Arial', 14),
-                        text_color=self.main_app.colors['text_muted']).pack(pady=20)
+        ctk.CTkButton(btn_frame, text="✏️ Modifier", width=120,
+                     command=lambda: self.edit_user(user_card.row),
+                     fg_color=self.main_app.colors['secondary']).pack(side='left', padx=(0, 10))
+
+        ctk.CTkButton(btn_frame, text="🗑️ Supprimer", width=120,
+                     command=lambda: self.delete_user(user_card.row),
+                     fg_color=self.main_app.colors['error']).pack(side='left')
+        return user_card
+
+    def _fill_user_row(self, user_card, u):
+        user_card.name.configure(text=f"👤 {u.username}")
+        user_card.info.configure(text=f"🆔 ID: {u.id} | 🎯 Rôle: {u.role or 'Non défini'}")
+
+    def edit_user(self, row):
+        from models import User as U
+        user = db.query(U).get(row.id)
+        if user is None:
+            self.refresh_users()
             return
 
-        for u in users:
-            user_card = ctk.CTkFrame(self.scroll_frame, corner_radius=10,
-                                   fg_color=self.main_app.colors['dark_bg'])
-            user_card.pack(fill='x', pady=8, padx=10)
-
-            # Informations utilisateur
-            info_frame = ctk.CTkFrame(user_card, fg_color='transparent')
-            info_frame.pack(fill='x', padx=15, pady=10)
-
-            ctk.CTkLabel(info_frame, 
-                        text=f"👤 {u.username}",
-                        font=('Arial', 16, 'bold'),
-                        text_color=self.main_app.colors['text_light']).pack(anchor='w')
-            
-            ctk.CTkLabel(info_frame,
-                        text=f"🆔 ID: {u.id} | 🎯 Rôle: {u.role or 'Non défini'}",
-                        font=('Arial', 12),
-                        text_color=self.main_app.colors['text_muted']).pack(anchor='w')
-
-            # Boutons d'action
-            btn_frame = ctk.CTkFrame(user_card, fg_color='transparent')
-            btn_frame.pack(fill='x', padx=15, pady=(5, 10))
-
-            ctk.CTkButton(btn_frame, text="✏️ Modifier", width=120,
-                         command=lambda u=u: self.edit_user(u),
-                         fg_color=self.main_app.colors['secondary']).pack(side='left', padx=(0, 10))
-
-            ctk.CTkButton(btn_frame, text="🗑️ Supprimer", width=120,
-                         command=lambda u=u: self.delete_user(u),
-                         fg_color=self.main_app.colors['error']).pack(side='left')
-
-    def edit_user(self, user):
         # Masquer le tableau
-        self.scroll_frame.pack_forget()
+        self.users_list.pack_forget()
 
         # Vider et afficher le frame de modification
         for widget in self.edit_frame.winfo_children():
@@ -787,11 +1077,12 @@ class GestionUsers(ctk.CTkFrame):
             user.role = new_role
             db.commit()
             messagebox.showinfo("Succès", f"✅ Utilisateur {user.id} modifié")
-            self.cancel_changes()
+            cancel_changes()
 
         def cancel_changes():
             self.edit_frame.pack_forget()
-            self.scroll_frame.pack(fill='both', expand=True, pady=10, padx=10)
+            self.users_list.pack(fill='both', expand=True, pady=10, padx=10,
+                                 before=self.refresh_button)
             self.refresh_users()
 
         ctk.CTkButton(btn_frame, text="💾 Sauvegarder", 
@@ -804,12 +1095,15 @@ class GestionUsers(ctk.CTkFrame):
                      font=('Arial', 14, 'bold'),
                      fg_color=self.main_app.colors['error']).pack(side='left', padx=10)
 
-    def delete_user(self, user):
+    def delete_user(self, row):
         if messagebox.askyesno("Confirmation", 
-                             f"Êtes-vous sûr de vouloir supprimer l'utilisateur {user.username} ?\nCette action est irréversible."):
-            db.delete(user)
-            db.commit()
-            messagebox.showinfo("Succès", f"✅ Utilisateur {user.username} supprimé")
+                             f"Êtes-vous sûr de vouloir supprimer l'utilisateur {row.username} ?\nCette action est irréversible."):
+            from models import User as U
+            user = db.query(U).get(row.id)
+            if user is not None:
+                db.delete(user)
+                db.commit()
+            messagebox.showinfo("Succès", f"✅ Utilisateur {row.username} supprimé")
             self.refresh_users()
             self.main_app.refresh_status_counts()
 
@@ -831,12 +1125,20 @@ class GestionRecords(ctk.CTkFrame):
             text_color=self.main_app.colors['text_light']
         ).pack(expand=True)
 
-        self.scroll = ctk.CTkScrollableFrame(
+        # Liste fenêtrée : widgets pour les seules lignes visibles,
+        # enregistrements lus page par page
+        self.records = VirtualList(
             self,
+            row_height=150,
+            make_row=self._make_record_row,
+            fill_row=self._fill_record_row,
+            fetch=self._fetch_records,
+            count=self._count_records,
+            empty_text="Aucun record trouvé",
             fg_color=self.main_app.colors['card_bg'],
             corner_radius=15
         )
-        self.scroll.pack(fill='both', expand=True, padx=10, pady=10)
+        self.records.pack(fill='both', expand=True, padx=10, pady=10)
 
         ctk.CTkButton(
             self,
@@ -847,64 +1149,55 @@ class GestionRecords(ctk.CTkFrame):
 
         self.refresh_records()
     def refresh_records(self):
-        for w in self.scroll.winfo_children():
-            w.destroy()
-
-        from models import Record
-        records = db.query(Record).order_by(Record.created_at.desc()).all()
-
-        if not records:
-            ctk.CTkLabel(
-                self.scroll,
-                text="Aucun record trouvé",
-                font=('Arial', 14)
-            ).pack(pady=20)
-            return
-
-        for r in records:
-            self._render_record(r)
-    def _render_record(self, record):
+        self.records.refresh()
+    def _count_records(self):
+        return table_counts(db).get('records', 0)
+    def _fetch_records(self, offset, limit, after):
+        from models import Record as R, records_page
+        columns = (R.id, R.sensor_id, R.encryption_type, R.policy_text,
+                   R.attributes_json, R.storage_path, R.created_at)
+        if after is not None:
+            return records_page(db, (after.created_at, after.id), limit, columns)
+        return records_page(db, None, limit, columns, offset=offset)
+    def _make_record_row(self, parent, height):
         card = ctk.CTkFrame(
-            self.scroll,
+            parent,
+            height=height,
             fg_color=self.main_app.colors['dark_bg'],
             corner_radius=10
         )
-        card.pack(fill='x', padx=10, pady=8)
 
         info = ctk.CTkFrame(card, fg_color='transparent')
         info.pack(fill='x', padx=15, pady=10)
 
-        ctk.CTkLabel(
-            info,
-            text=f"🆔 Record #{record.id} | 📡 {record.sensor_id}",
-            font=('Arial', 16, 'bold')
-        ).pack(anchor='w')
+        card.title = ctk.CTkLabel(info, text="", font=('Arial', 16, 'bold'))
+        card.title.pack(anchor='w')
 
-        ctk.CTkLabel(
-            info,
-            text=f"🔐 Type: {record.encryption_type} | 🕒 {record.created_at}",
-            font=('Arial', 12)
-        ).pack(anchor='w')
+        card.meta = ctk.CTkLabel(info, text="", font=('Arial', 12))
+        card.meta.pack(anchor='w')
 
-        ctk.CTkLabel(
-            info,
-            text=f"📋 Policy / Attributs : {record.policy_text or record.attributes_json}",
-            font=('Arial', 12),
-            wraplength=700
-        ).pack(anchor='w', pady=(5, 0))
+        card.policy = ctk.CTkLabel(info, text="", font=('Arial', 12))
+        card.policy.pack(anchor='w', pady=(5, 0))
         btns = ctk.CTkFrame(card, fg_color='transparent')
         btns.pack(fill='x', padx=15, pady=(5, 10))
 
         ctk.CTkButton(
             btns, text="👁️ Détails",
-            command=lambda r=record: self.show_details(r)
+            command=lambda: self.show_details(card.row)
         ).pack(side='left', padx=5)
 
         ctk.CTkButton(
             btns, text="🗑️ Supprimer",
-            command=lambda r=record: self.delete_record(r),
+            command=lambda: self.delete_record(card.row),
             fg_color=self.main_app.colors['error']
         ).pack(side='left', padx=5)
+        return card
+    def _fill_record_row(self, card, record):
+        policy_text = record.policy_text or record.attributes_json or ""
+        preview = policy_text[:90] + "..." if len(policy_text) > 90 else policy_text
+        card.title.configure(text=f"🆔 Record #{record.id} | 📡 {record.sensor_id}")
+        card.meta.configure(text=f"🔐 Type: {record.encryption_type} | 🕒 {record.created_at}")
+        card.policy.configure(text=f"📋 Policy / Attributs : {preview}")
     def show_details(self, record):
         details = (
             f"Record ID: {record.id}\n"
@@ -924,10 +1217,12 @@ class GestionRecords(ctk.CTkFrame):
             if os.path.exists(record.storage_path):
                 os.remove(record.storage_path)
 
-            db.delete(record)
+            from models import Record
+            db.query(Record).filter(Record.id == record.id).delete()
             db.commit()
             self.refresh_records()
             self.main_app.refresh_status_counts()
 if __name__ == '__main__':
     app = App()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+    app.tasks.shutdown()
\ No newline at end of file
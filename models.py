@@ -1,7 +1,8 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, Text, create_engine
-from sqlalchemy.orm import sessionmaker
-import datetime, os, sys
+from sqlalchemy import (Column, Integer, String, DateTime, Text, ForeignKey, Index, create_engine, event, func,
+                        tuple_, select, intersect, union)
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, selectinload
+import contextlib, datetime, functools, json, os, sys, threading
 
 Base = declarative_base()
 
@@ -14,14 +15,14 @@ class User(Base):
 class Attribute(Base):
     __tablename__ = "attributes"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
     name = Column(String)
     value = Column(String)
 
 class ABEKey(Base):
     __tablename__ = "abe_keys"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
     key_type = Column(String)
     private_key_blob = Column(Text)
     policy_blob = Column(Text)
@@ -36,7 +37,426 @@ class Record(Base):
     attributes_json = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-def get_session(db_path=None):
+    __table_args__ = (
+        # Listes triées par date (IoMTPage, GestionRecords)
+        Index('ix_records_created_at_id', 'created_at', 'id'),
+        # Historique d'un capteur
+        Index('ix_records_sensor_id_created_at', 'sensor_id', 'created_at'),
+        # Filtrage par type de chiffrement (déchiffrement en masse)
+        Index('ix_records_encryption_type_id', 'encryption_type', 'id'),
+    )
+
+# Relations User -> attributs / clés ; la suppression d'un utilisateur
+# supprime ses attributs et clés (ON DELETE CASCADE côté SQLite)
+User.attributes = relationship(
+    Attribute, order_by=Attribute.id, cascade='all, delete-orphan', passive_deletes=True)
+User.keys = relationship(
+    ABEKey, order_by=ABEKey.id, cascade='all, delete-orphan', passive_deletes=True)
+
+class MasterKey(Base):
+    """Générations de clés maîtresses ABE (la plus récente chiffre)."""
+    __tablename__ = "master_keys"
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class ChangeLog(Base):
+    """
+    Journal des modifications, alimenté par des triggers SQLite : les vues
+    ne relisent que les lignes changées depuis leur dernière marque (seq).
+    """
+    __tablename__ = "change_log"
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String)     # 'records' ou 'users'
+    row_id = Column(Integer)
+
+# (table, entité de vue, colonne) : un attribut ou une clé modifié(e)
+# change l'affichage de son utilisateur
+_CHANGE_SOURCES = (
+    ('records', 'records', 'id'),
+    ('users', 'users', 'id'),
+    ('attributes', 'users', 'user_id'),
+    ('abe_keys', 'users', 'user_id'),
+)
+
+# Entrées conservées dans le journal (purge à l'ouverture de la base)
+CHANGE_LOG_KEEP = 10000
+
+class TableCount(Base):
+    """
+    Nombre de lignes par table, tenu à jour par triggers : les compteurs
+    de la barre latérale sont lus sans COUNT(*).
+    """
+    __tablename__ = "table_counts"
+    name = Column(String, primary_key=True)
+    row_count = Column(Integer, default=0)
+
+COUNTED_TABLES = ('users', 'records')
+
+class AccessIndex(Base):
+    """
+    Index inversé attribut -> lignes qui le mentionnent. Les triggers
+    (SQL pur) mettent les lignes modifiées en file dans
+    access_index_pending ; l'application recalcule leurs entrées avant
+    chaque question d'accès (update_access_index). entity vaut :
+    - 'cp_record' : feuilles de Record.policy_text (records CP)
+    - 'kp_record' : attributs de Record.attributes_json (records KP)
+    - 'cp_key'    : attributs d'une clé CP
+    - 'kp_key'    : feuilles de la politique d'une clé KP
+    - 'user'      : attributs d'un utilisateur (table attributes, row_id = user_id)
+    """
+    __tablename__ = "access_index"
+    entity = Column(String, primary_key=True)
+    attribute = Column(String, primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    __table_args__ = (
+        # Suppression des entrées d'une ligne (recalcul)
+        Index('ix_access_index_entity_row_id', 'entity', 'row_id'),
+        {'sqlite_with_rowid': False},
+    )
+
+class AccessIndexPending(Base):
+    """File des lignes dont les entrées de access_index restent à recalculer (triggers)."""
+    __tablename__ = "access_index_pending"
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String)     # 'record', 'key' ou 'user' (row_id = user_id)
+    row_id = Column(Integer)
+
+# (table, entité de access_index_pending, colonnes surveillées, colonne row_id)
+_INDEX_SOURCES = (
+    ('records', 'record', 'encryption_type, policy_text, attributes_json', 'id'),
+    ('abe_keys', 'key', 'key_type, private_key_blob', 'id'),
+    ('attributes', 'user', 'user_id, name, value', 'user_id'),
+)
+
+# Entités de access_index couvertes par une entrée de la file
+_INDEX_ENTITIES = {
+    'record': ('cp_record', 'kp_record'),
+    'key': ('cp_key', 'kp_key'),
+    'user': ('user',),
+}
+
+# Entrées de file traitées par transaction
+INDEX_CHUNK = 20000
+
+class AccessGrant(Base):
+    """
+    Matrice d'accès matérialisée : un couple (clé, record) par record
+    que la clé peut déchiffrer. Les suppressions suivent les clés
+    étrangères ; les ajouts / modifications passent par access_pending
+    et sont appliqués par access.update_access_grants.
+    """
+    __tablename__ = "access_grants"
+    key_id = Column(Integer, ForeignKey('abe_keys.id', ondelete='CASCADE'), primary_key=True)
+    record_id = Column(Integer, ForeignKey('records.id', ondelete='CASCADE'), primary_key=True, index=True)
+    __table_args__ = {'sqlite_with_rowid': False}
+
+class AccessPending(Base):
+    """File des records / clés dont les droits restent à calculer (triggers)."""
+    __tablename__ = "access_pending"
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String)     # 'record' ou 'key'
+    row_id = Column(Integer)
+
+# (table, entité de access_pending, colonne de access_grants, colonnes qui
+# changent les droits)
+_GRANT_SOURCES = (
+    ('records', 'record', 'record_id', 'encryption_type, policy_text, attributes_json'),
+    ('abe_keys', 'key', 'key_id', 'key_type, private_key_blob'),
+)
+
+# Terme des politiques contenant NOT : elles peuvent être satisfaites sans
+# aucun de leurs attributs, elles sont donc candidates pour tout ensemble
+INDEX_ANY = '*'
+
+# ==========================================================
+# Migrations de schéma (PRAGMA user_version)
+# ==========================================================
+
+SCHEMA_VERSION = 8
+
+
+def _rebuild_with_foreign_keys(conn, table):
+    """
+    Recrée une table créée sans clé étrangère (anciens data.db) : les
+    lignes orphelines (utilisateur supprimé) ne sont pas recopiées.
+    """
+    name = table.name
+    if conn.exec_driver_sql(f'PRAGMA foreign_key_list({name})').fetchall():
+        return
+    old = f'{name}_old'
+    # Sans legacy_alter_table, SQLite réécrirait vers {old} les clés
+    # étrangères des autres tables qui pointent sur {name} (access_grants)
+    conn.exec_driver_sql('PRAGMA legacy_alter_table=ON')
+    conn.exec_driver_sql(f'ALTER TABLE {name} RENAME TO {old}')
+    conn.exec_driver_sql('PRAGMA legacy_alter_table=OFF')
+    for (index_name,) in conn.exec_driver_sql(
+            f"SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='{old}' AND sql IS NOT NULL"):
+        conn.exec_driver_sql(f'DROP INDEX {index_name}')
+    table.create(conn)
+    cols = ', '.join(c.name for c in table.columns)
+    conn.exec_driver_sql(
+        f'INSERT INTO {name} ({cols}) SELECT {cols} FROM {old} '
+        f'WHERE user_id IS NULL OR user_id IN (SELECT id FROM users)')
+    conn.exec_driver_sql(f'DROP TABLE {old}')
+
+
+def _create_change_triggers(conn):
+    for table, entity, column in _CHANGE_SOURCES:
+        for op, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.exec_driver_sql(
+                f'CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_log '
+                f'AFTER {op} ON {table} WHEN {row}.{column} IS NOT NULL BEGIN '
+                f"INSERT INTO change_log (entity, row_id) VALUES ('{entity}', {row}.{column}); END")
+
+
+def _create_count_triggers(conn):
+    for table in COUNTED_TABLES:
+        for op, delta in (('INSERT', '+ 1'), ('DELETE', '- 1')):
+            conn.exec_driver_sql(
+                f'CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_count '
+                f'AFTER {op} ON {table} BEGIN '
+                f"UPDATE table_counts SET row_count = row_count {delta} WHERE name = '{table}'; END")
+    _recount(conn)
+
+
+def _recount(conn):
+    for table in COUNTED_TABLES:
+        conn.exec_driver_sql(
+            f"INSERT OR REPLACE INTO table_counts (name, row_count) "
+            f"VALUES ('{table}', (SELECT COUNT(*) FROM {table}))")
+
+
+# Termes d'index d'une ligne, calculés en Python au moment du recalcul :
+# une donnée illisible ne donne aucun terme.
+
+def _normalize_attribute(attr):
+    # keygen_cp retire les espaces, l'évaluation des politiques ignore la casse
+    return attr.replace(' ', '').lower()
+
+
+def _has_not(node):
+    if node[0] == 'attr':
+        return False
+    if node[0] == 'not':
+        return True
+    return any(_has_not(child) for child in node[-1])
+
+
+# Peu de politiques distinctes : les termes sont mémorisés par texte
+@functools.lru_cache(maxsize=4096)
+def _policy_terms(policy_text):
+    from abe.sim_abe import get_compiled_policy
+    try:
+        policy = get_compiled_policy(policy_text or '')
+    except Exception:
+        return ()
+    terms = sorted(policy.attributes)
+    if _has_not(policy.ast):
+        terms.append(INDEX_ANY)
+    return tuple(terms)
+
+
+def _attribute_terms(attrs):
+    try:
+        return sorted({_normalize_attribute(a) for a in attrs if isinstance(a, str)})
+    except TypeError:
+        return []
+
+
+def _json_attribute_terms(attributes_json):
+    try:
+        return _attribute_terms(json.loads(attributes_json or '[]'))
+    except ValueError:
+        return []
+
+
+def _key_terms(key_type, blob_hex):
+    try:
+        keyobj = json.loads(bytes.fromhex(blob_hex).decode())
+        if key_type == 'CP':
+            return _attribute_terms(keyobj.get('attributes', []))
+        return _policy_terms(keyobj.get('policy', ''))
+    except Exception:
+        return []
+
+
+def _index_entries(conn, entity, ids):
+    """Entrées (entity, attribut, row_id) de access_index des lignes `ids` de la file."""
+    marks = ', '.join('?' * len(ids))
+    if entity == 'record':
+        for row_id, enc, policy_text, attributes_json in conn.exec_driver_sql(
+                f'SELECT id, encryption_type, policy_text, attributes_json FROM records WHERE id IN ({marks})',
+                tuple(ids)).fetchall():
+            if enc == 'CP':
+                yield from (('cp_record', term, row_id) for term in _policy_terms(policy_text))
+            elif enc == 'KP':
+                yield from (('kp_record', term, row_id) for term in _json_attribute_terms(attributes_json))
+    elif entity == 'key':
+        for row_id, key_type, blob in conn.exec_driver_sql(
+                f'SELECT id, key_type, private_key_blob FROM abe_keys WHERE id IN ({marks})', tuple(ids)).fetchall():
+            if key_type in ('CP', 'KP'):
+                yield from ((f'{key_type.lower()}_key', term, row_id) for term in _key_terms(key_type, blob))
+    elif entity == 'user':
+        for user_id, name, value in conn.exec_driver_sql(
+                f'SELECT user_id, name, value FROM attributes WHERE user_id IN ({marks})', tuple(ids)).fetchall():
+            if name is not None and value is not None:
+                yield from (('user', term, user_id) for term in _attribute_terms((f'{name}:{value}',)))
+
+
+def _create_index_triggers(conn):
+    # SQL pur : la base reste modifiable sans les fonctions de l'application
+    # (sqlite3, navigateur de base, anciennes versions de l'exécutable)
+    for table, entity, watched, column in _INDEX_SOURCES:
+        def enqueue(row, extra=''):
+            return (f"INSERT INTO access_index_pending (entity, row_id) SELECT '{entity}', {row}.{column} "
+                    f'WHERE {row}.{column} IS NOT NULL{extra};')
+        for op, body in (('INSERT', enqueue('NEW')), ('DELETE', enqueue('OLD')),
+                         # Un attribut qui change d'utilisateur concerne les deux
+                         (f'UPDATE OF {watched}',
+                          enqueue('NEW') + ' ' + enqueue('OLD', f' AND OLD.{column} IS NOT NEW.{column}'))):
+            name = f'trg_{table}_{op.split()[0].lower()}_index'
+            conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {name}')
+            conn.exec_driver_sql(f'CREATE TRIGGER {name} AFTER {op} ON {table} BEGIN {body} END')
+    _reindex(conn)
+
+
+def _apply_index_pending(conn, limit):
+    """Recalcule les entrées des `limit` premières lignes en file ; retourne leur nombre."""
+    claimed = conn.exec_driver_sql(
+        'DELETE FROM access_index_pending WHERE seq IN '
+        '(SELECT seq FROM access_index_pending ORDER BY seq LIMIT ?) RETURNING entity, row_id',
+        (limit,)).fetchall()
+    by_entity = {}
+    for entity, row_id in claimed:
+        by_entity.setdefault(entity, set()).add(row_id)
+    for entity, ids in by_entity.items():
+        kinds = _INDEX_ENTITIES.get(entity)
+        if not kinds:
+            continue
+        ids = sorted(ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            conn.exec_driver_sql(
+                f"DELETE FROM access_index WHERE entity IN ({', '.join('?' * len(kinds))}) "
+                f"AND row_id IN ({', '.join('?' * len(chunk))})", (*kinds, *chunk))
+            entries = list(_index_entries(conn, entity, chunk))
+            if entries:
+                conn.exec_driver_sql(
+                    'INSERT OR IGNORE INTO access_index (entity, attribute, row_id) VALUES (?, ?, ?)', entries)
+    return len(claimed)
+
+
+def _create_grant_triggers(conn):
+    # Pas de trigger de suppression : access_grants suit les clés
+    # étrangères et une entrée en file sans ligne est ignorée
+    for table, entity, column, watched in _GRANT_SOURCES:
+        enqueue = f"INSERT INTO access_pending (entity, row_id) VALUES ('{entity}', NEW.id);"
+        conn.exec_driver_sql(
+            f'CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_grant '
+            f'AFTER INSERT ON {table} BEGIN {enqueue} END')
+        conn.exec_driver_sql(
+            f'CREATE TRIGGER IF NOT EXISTS trg_{table}_update_grant '
+            f'AFTER UPDATE OF {watched} ON {table} BEGIN '
+            f'DELETE FROM access_grants WHERE {column} = OLD.id; {enqueue} END')
+    _reset_grants(conn)
+
+
+def _reset_grants(conn):
+    # Recalculer les droits de toutes les clés couvre tous les records
+    conn.exec_driver_sql('DELETE FROM access_grants')
+    conn.exec_driver_sql('DELETE FROM access_pending')
+    conn.exec_driver_sql("INSERT INTO access_pending (entity, row_id) SELECT 'key', id FROM abe_keys ORDER BY id")
+
+
+def _reindex(conn):
+    # Toutes les lignes en file : l'index est recalculé au premier accès
+    conn.exec_driver_sql('DELETE FROM access_index')
+    conn.exec_driver_sql('DELETE FROM access_index_pending')
+    for table, entity, _, column in _INDEX_SOURCES:
+        conn.exec_driver_sql(
+            f"INSERT INTO access_index_pending (entity, row_id) SELECT DISTINCT '{entity}', {column} "
+            f'FROM {table} WHERE {column} IS NOT NULL ORDER BY {column}')
+
+
+def migrate(engine):
+    """
+    Met à niveau un data.db existant vers SCHEMA_VERSION :
+    v1 : clés étrangères ON DELETE CASCADE sur attributes / abe_keys et
+         index secondaires (user_id, created_at, sensor_id, encryption_type).
+    v2 : triggers du journal des modifications (change_log).
+    v3 : compteurs de lignes (table_counts) et leurs triggers.
+    v4 : index inversé des attributs (access_index).
+    v5 : dictionnaire des attributs internés (retiré en v8).
+    v6 : matrice d'accès (access_grants), file access_pending et triggers ;
+         les droits existants sont calculés au premier accès.
+    v7 : triggers de access_index en SQL pur (file access_index_pending,
+         remplace les triggers v4 qui appelaient des fonctions Python) ;
+         l'index est recalculé au premier accès.
+    v8 : suppression de attribute_dictionary et de son trigger : les
+         masques d'attributs ne quittent pas le processus, la numérotation
+         persistée ne pouvait pas suivre celle de chaque processus.
+    """
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+        if version >= SCHEMA_VERSION:
+            return
+        # Les reconstructions de tables se font sans contrôle des clés
+        # étrangères (pragma sans effet dans une transaction : commit avant)
+        conn.commit()
+        conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+        conn.commit()
+        try:
+            if version < 1:
+                _rebuild_with_foreign_keys(conn, Attribute.__table__)
+                _rebuild_with_foreign_keys(conn, ABEKey.__table__)
+                for table in Base.metadata.sorted_tables:
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+            if version < 2:
+                _create_change_triggers(conn)
+            if version < 3:
+                _create_count_triggers(conn)
+            if version < 6:
+                _create_grant_triggers(conn)
+            if version < 7:
+                for index in AccessIndex.__table__.indexes:
+                    index.create(conn, checkfirst=True)
+                _create_index_triggers(conn)
+            if version < 8:
+                conn.exec_driver_sql('DROP TRIGGER IF EXISTS trg_access_index_insert_dictionary')
+                conn.exec_driver_sql('DROP TABLE IF EXISTS attribute_dictionary')
+            conn.exec_driver_sql(f'PRAGMA user_version={SCHEMA_VERSION}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+            conn.commit()
+
+
+# ==========================================================
+# Moteur / sessions (un moteur par fichier, créé une seule fois)
+# ==========================================================
+
+# Pragmas appliqués à chaque connexion SQLite
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',       # lecteurs non bloqués pendant les écritures
+    'synchronous': 'NORMAL',     # sûr en WAL, évite un fsync par commit
+    'cache_size': -16000,        # 16 Mo de cache de pages
+    'mmap_size': 268435456,      # 256 Mo de lecture via mmap
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+_engines = {}
+_sessionmakers = {}
+_scoped_sessions = {}
+_engines_lock = threading.Lock()
+
+
+def _default_db_path():
     # Déterminer si le script est exécuté en mode exécutable (.exe) ou en mode normal
     if getattr(sys, 'frozen', False):
         # Mode .exe → placer la base dans le même dossier que l’exécutable
@@ -46,12 +466,337 @@ def get_session(db_path=None):
         base_dir = os.path.dirname(os.path.abspath(__file__))
 
     # Chemin par défaut de la base de données
-    if db_path is None:
-        db_path = os.path.join(base_dir, 'data.db')
+    return os.path.join(base_dir, 'data.db')
+
+
+def _configure_connection(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+def get_engine(db_path=None):
+    """
+    Moteur SQLAlchemy mis en cache par chemin de base : le schéma et les
+    migrations ne sont vérifiés qu'à la première création.
+    """
+    db_path = os.path.abspath(db_path or _default_db_path())
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            # 🔌 Connexion SQLite
+            engine = create_engine('sqlite:///' + db_path, connect_args={'check_same_thread': False})
+            event.listen(engine, 'connect', _configure_connection)
+            Base.metadata.create_all(engine)
+            migrate(engine)
+            _prune_change_log(engine)
+            _engines[db_path] = engine
+            _sessionmakers[db_path] = sessionmaker(bind=engine)
+            _scoped_sessions[db_path] = scoped_session(_sessionmakers[db_path])
+        return engine
+
+
+def _prune_change_log(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?',
+            (CHANGE_LOG_KEEP,))
+
+
+def get_session(db_path=None):
+    """
+    Nouvelle session sur le moteur partagé (une session n'est pas
+    thread-safe : une par thread).
+    """
+    get_engine(db_path)
+    return _sessionmakers[os.path.abspath(db_path or _default_db_path())]()
+
+
+def get_scoped_session(db_path=None):
+    """
+    Registre de sessions par thread (scoped_session) pour les threads de
+    travail : appeler .remove() en fin de tâche.
+    """
+    get_engine(db_path)
+    return _scoped_sessions[os.path.abspath(db_path or _default_db_path())]
+
+
+@contextlib.contextmanager
+def worker_session(db_path=None):
+    """
+    with worker_session() as session: ...  — session du thread courant,
+    libérée à la sortie du bloc.
+    """
+    registry = get_scoped_session(db_path)
+    try:
+        yield registry()
+    finally:
+        registry.remove()
+
+
+# ==========================================================
+# Pagination par clé (keyset)
+# ==========================================================
+# Chaque page reprend après la dernière ligne de la précédente : records
+# sur (created_at, id) décroissants, utilisateurs sur id. Une page coûte
+# une recherche dans l'index quelle que soit sa position, contrairement à
+# OFFSET qui relit toutes les lignes sautées.
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def records_page(session, after=None, limit=DEFAULT_PAGE_SIZE, columns=None, offset=0):
+    """
+    Records les plus récents d'abord, strictement après la clé
+    (created_at, id) `after`. `columns` (qui doit contenir created_at et
+    id) limite la requête à ces colonnes ; `offset` ne sert qu'à un saut
+    direct sans clé connue.
+    """
+    query = session.query(*columns) if columns else session.query(Record)
+    if after is not None:
+        query = query.filter(tuple_(Record.created_at, Record.id) < tuple_(*after))
+    query = query.order_by(Record.created_at.desc(), Record.id.desc())
+    if offset:
+        query = query.offset(offset)
+    return query.limit(limit).all()
+
+
+def iter_record_pages(session, page_size=DEFAULT_PAGE_SIZE, columns=None):
+    after = None
+    while True:
+        page = records_page(session, after, page_size, columns)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = (page[-1].created_at, page[-1].id)
+
+
+def iter_records(session, page_size=DEFAULT_PAGE_SIZE, columns=None):
+    """for r in iter_records(session): ...  — une page en mémoire à la fois."""
+    for page in iter_record_pages(session, page_size, columns):
+        yield from page
+
+
+def users_page(session, after=None, limit=DEFAULT_PAGE_SIZE, columns=None, offset=0, options=()):
+    """Utilisateurs par id croissant, strictement après l'id `after`."""
+    query = session.query(*columns) if columns else session.query(User).options(*options)
+    if after is not None:
+        query = query.filter(User.id > after)
+    query = query.order_by(User.id)
+    if offset:
+        query = query.offset(offset)
+    return query.limit(limit).all()
+
+
+def iter_user_pages(session, page_size=DEFAULT_PAGE_SIZE, columns=None, options=()):
+    after = None
+    while True:
+        page = users_page(session, after, page_size, columns, options=options)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = page[-1].id
+
+
+def iter_users(session, page_size=DEFAULT_PAGE_SIZE, columns=None):
+    for page in iter_user_pages(session, page_size, columns):
+        yield from page
+
+
+def users_with_keys(session, page_size=DEFAULT_PAGE_SIZE, ids=None):
+    """
+    Utilisateurs avec attributs et clés, page par page : 3 requêtes par
+    page (selectin) au lieu de 1 + 2 requêtes par utilisateur. `ids`
+    restreint la lecture à ces utilisateurs (rafraîchissement incrémental).
+    """
+    options = (selectinload(User.attributes), selectinload(User.keys))
+    if ids is not None:
+        yield from session.query(User).options(*options).filter(User.id.in_(ids)).order_by(User.id)
+        return
+    for page in iter_user_pages(session, page_size, options=options):
+        yield from page
+
+
+# ==========================================================
+# Rafraîchissement incrémental (journal des modifications)
+# ==========================================================
+
+def change_watermark(session):
+    """Marque courante du journal, à lire avant un chargement complet."""
+    return session.query(func.max(ChangeLog.seq)).scalar() or 0
+
+
+def changes_since(session, entity, after, limit=CHANGE_LOG_KEEP):
+    """
+    (nouvelle marque, ids de `entity` modifiés depuis la marque `after`).
+    ids vaut None si le journal ne couvre plus `after` (purge) ou si plus
+    de `limit` lignes ont changé : un rechargement complet est alors
+    préférable.
+    """
+    # Deux requêtes : SQLite n'optimise MIN/MAX (lecture d'une extrémité
+    # de l'index) que si l'agrégat est seul dans la requête
+    last = change_watermark(session)
+    if last <= after:
+        return after, []
+    first = session.query(func.min(ChangeLog.seq)).scalar()
+    if after < first - 1:
+        return last, None
+    ids = {row_id for (row_id,) in session.query(ChangeLog.row_id)
+           .filter(ChangeLog.seq > after, ChangeLog.seq <= last, ChangeLog.entity == entity)}
+    if len(ids) > limit:
+        return last, None
+    return last, sorted(ids)
+
+
+# ==========================================================
+# Compteurs de lignes (table_counts)
+# ==========================================================
+
+def table_counts(session):
+    """{'users': n, 'records': n} lus dans table_counts : O(1)."""
+    return dict(session.query(TableCount.name, TableCount.row_count))
+
+
+def reconcile_counts(session):
+    """
+    Recalcule les compteurs par COUNT(*) (écritures hors triggers,
+    restauration d'une sauvegarde…) et renvoie les valeurs corrigées.
+    """
+    _recount(session.connection())
+    session.commit()
+    return table_counts(session)
+
+
+# ==========================================================
+# Index inversé des attributs (access_index)
+# ==========================================================
+
+def _postings(entity, attribute):
+    return select(AccessIndex.row_id).where(AccessIndex.entity == entity, AccessIndex.attribute == attribute)
+
+
+def _policy_candidates(entity, node):
+    """
+    Sélection des row_id de `entity` (ensembles d'attributs) qui peuvent
+    satisfaire le nœud d'AST : feuille -> liste de l'attribut, ET ->
+    intersection, OU et seuil -> union. None si le nœud n'élague rien (NOT).
+    """
+    kind = node[0]
+    if kind == 'attr':
+        return _postings(entity, node[1])
+    if kind == 'not':
+        return None
+    subs = [_policy_candidates(entity, child) for child in node[-1]]
+    if kind == 'and':
+        subs = [sub for sub in subs if sub is not None]
+        if not subs:
+            return None
+        compound = intersect
+    elif any(sub is None for sub in subs):
+        return None
+    else:
+        compound = union
+    if len(subs) == 1:
+        return subs[0]
+    return select(compound(*subs).subquery().c.row_id)
+
+
+def policy_candidates(entity, policy):
+    """
+    Sous-requête des row_id de `entity` ('kp_record', 'cp_key', 'user')
+    dont les attributs peuvent satisfaire `policy` ; None si l'index ne
+    permet pas d'élaguer (politique avec NOT). Le résultat est un
+    sur-ensemble : la politique reste à évaluer sur chaque candidat.
+    Lève PolicyError si la politique est invalide.
+    """
+    from abe.sim_abe import get_compiled_policy
+    return _policy_candidates(entity, get_compiled_policy(policy).ast)
+
+
+def attribute_candidates(entity, attributes):
+    """
+    Sous-requête des row_id de `entity` ('cp_record', 'kp_key') dont la
+    politique mentionne au moins un des attributs (ou contient NOT) :
+    une politique sans NOT n'est satisfaite que si l'une de ses feuilles
+    l'est.
+    """
+    terms = sorted({_normalize_attribute(a) for a in attributes} | {INDEX_ANY})
+    return (select(AccessIndex.row_id)
+            .where(AccessIndex.entity == entity, AccessIndex.attribute.in_(terms))
+            .distinct())
+
+
+def update_access_index(session, chunk=INDEX_CHUNK):
+    """
+    Applique la file access_index_pending par lots de `chunk` entrées,
+    une transaction par lot. Retourne le nombre d'entrées traitées.
+    """
+    done = 0
+    while True:
+        claimed = _apply_index_pending(session.connection(), chunk)
+        session.commit()
+        if not claimed:
+            return done
+        done += claimed
+
+
+def rebuild_access_index(session):
+    """Reconstruit access_index (écritures faites hors triggers)."""
+    _reindex(session.connection())
+    session.commit()
+    update_access_index(session)
+
+
+def reset_access_grants(session):
+    """Vide access_grants et met toutes les clés en file (recalcul complet)."""
+    _reset_grants(session.connection())
+    session.commit()
+
+
+def distinct_policies(session):
+    """
+    Politiques distinctes déjà présentes en base (records CP et clés KP),
+    utilisées pour pré-remplir le cache de politiques au démarrage.
+    """
+    policies = set()
+    for (text,) in session.query(Record.policy_text).distinct():
+        if text:
+            policies.add(text)
+    for (text,) in session.query(ABEKey.policy_blob).distinct():
+        if text:
+            policies.add(text)
+    return sorted(policies)
+
+
+def load_abe_state(session):
+    """
+    Charge les clés maîtresses persistées et initialise l’état ABE.
+    Au premier lancement, une première génération est créée et
+    enregistrée, pour que les records restent lisibles d’une session
+    à l’autre.
+    """
+    from abe.sim_abe import setup_abe, new_master_key
+
+    rows = session.query(MasterKey).order_by(MasterKey.id).all()
+    if not rows:
+        rows = [MasterKey(key=new_master_key().decode())]
+        session.add(rows[0])
+        session.commit()
+    return setup_abe({r.id: r.key.encode() for r in rows})
+
 
-    # 🔌 Connexion SQLite
-    engine = create_engine('sqlite:///' + db_path, connect_args={'check_same_thread': False})
-    Base.metadata.create_all(engine)
-    SessionLocal = sessionmaker(bind=engine)
+def rotate_master_key(session, state):
+    """
+    Crée une nouvelle génération de clé maîtresse et la rend courante.
+    Les anciennes générations restent utilisables pour déchiffrer.
+    """
+    from abe.sim_abe import add_master_key, new_master_key
 
-    return SessionLocal()
+    row = MasterKey(key=new_master_key().decode())
+    session.add(row)
+    session.commit()
+    add_master_key(state, row.id, row.key.encode())
+    return row.id
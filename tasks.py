@@ -0,0 +1,136 @@
+"""
+Exécution des opérations longues hors du thread Tk.
+
+Les fonctions soumises tournent dans un pool de threads ; leurs résultats,
+erreurs et progressions sont déposés dans une file puis livrés sur le
+thread Tk par une boucle after() (Tk n’est pas thread-safe). La boucle
+mesure aussi l’écart entre deux passages, ce qui borne la latence
+d’affichage observée pendant un traitement.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    """Levée dans la tâche quand l’utilisateur a demandé l’annulation."""
+
+
+class Task:
+    """
+    Poignée d’une tâche soumise : annulation et rapport de progression.
+    La fonction de travail reçoit la tâche en premier argument.
+    """
+
+    def __init__(self, runner, on_done=None, on_error=None, on_progress=None, on_item=None):
+        self._runner = runner
+        self._cancel = threading.Event()
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_item = on_item
+        self.done = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, done, total=None):
+        """
+        Appelé depuis le thread de travail. Lève TaskCancelled si la
+        tâche a été annulée, ce qui interrompt le traitement en cours.
+        """
+        if self._cancel.is_set():
+            raise TaskCancelled()
+        if self.on_progress is not None:
+            self._runner._events.put((self.on_progress, (done, total)))
+
+    def publish(self, item):
+        """
+        Livre un résultat partiel (une page de liste…) à on_item sur le
+        thread Tk, sans attendre la fin de la tâche.
+        """
+        if self._cancel.is_set():
+            raise TaskCancelled()
+        if self.on_item is not None:
+            self._runner._events.put((self.on_item, (item,)))
+
+
+class TaskRunner:
+    """
+    runner = TaskRunner(root)
+    runner.submit(fn, arg, on_done=callback)   # fn(task, arg) en arrière-plan
+    """
+
+    def __init__(self, root, workers: int = 2, poll_ms: int = 20, max_events_per_tick: int = 50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.max_events_per_tick = max_events_per_tick
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='iomt-task')
+        self._events = queue.Queue()
+        self._last_tick = None
+        self.max_tick_gap_ms = 0.0
+        self._closed = False
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, on_item=None) -> Task:
+        task = Task(self, on_done, on_error, on_progress, on_item)
+        self._pool.submit(self._run, task, fn, args)
+        return task
+
+    def _run(self, task, fn, args):
+        try:
+            result = fn(task, *args)
+        except BaseException as e:  # noqa: B902 — livrée au thread Tk
+            self._events.put((self._finish_error, (task, e)))
+        else:
+            self._events.put((self._finish_ok, (task, result)))
+
+    def _finish_ok(self, task, result):
+        task.done = True
+        if task.on_done is not None:
+            task.on_done(result)
+
+    def _finish_error(self, task, error):
+        task.done = True
+        if task.on_error is not None:
+            task.on_error(error)
+        elif not isinstance(error, TaskCancelled):
+            raise error
+
+    def _poll(self):
+        if self._closed:
+            return
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            gap = (now - self._last_tick) * 1000 - self.poll_ms
+            self.max_tick_gap_ms = max(self.max_tick_gap_ms, gap)
+        self._last_tick = now
+
+        # Nombre d’événements traités par passage borné : l’interface reste fluide
+        for _ in range(self.max_events_per_tick):
+            try:
+                callback, args = self._events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                # Un rappel défaillant ne doit pas arrêter la boucle
+                log.exception('Erreur dans un rappel de tâche')
+        self.root.after(self.poll_ms, self._poll)
+
+    def reset_latency(self):
+        self._last_tick = None
+        self.max_tick_gap_ms = 0.0
+
+    def shutdown(self):
+        self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
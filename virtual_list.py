@@ -0,0 +1,146 @@
+"""
+Liste fenêtrée (virtualisée) pour les pages de gestion.
+
+Seules les lignes visibles ont des widgets : un petit nombre de cartes est
+créé une fois puis réaffecté aux lignes au défilement. Les données sont
+lues à la demande, page par page, et gardées dans un cache LRU borné ;
+au défilement continu, chaque page reprend après la dernière ligne de la
+précédente (pagination par clé).
+"""
+import tkinter
+from collections import OrderedDict
+
+import customtkinter as ctk
+
+
+class VirtualList(ctk.CTkFrame):
+    """
+    fetch(offset, limit, after) -> liste de lignes (ordre d’affichage) ;
+                           after est la dernière ligne de la page
+                           précédente si elle est connue, sinon None
+                           (saut direct : utiliser offset)
+    count()              -> nombre total de lignes
+    make_row(parent, height) -> widget de ligne réutilisable (hauteur fixe)
+    fill_row(widget, ligne) met à jour le widget ; la ligne affichée est
+    aussi disponible dans widget.row (pour les boutons de la carte).
+    """
+
+    def __init__(self, master, row_height, make_row, fill_row, fetch, count,
+                 page_size=100, max_pages=8, empty_text='Aucun élément', **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_height = row_height
+        self.make_row = make_row
+        self.fill_row = fill_row
+        self.fetch = fetch
+        self.count = count
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+        self.first = 0
+        self.total = 0
+        self.slots = []
+        self._pages = OrderedDict()
+        self._last_rows = {}
+
+        self.viewport = ctk.CTkFrame(self, fg_color='transparent')
+        self.viewport.pack(side='left', fill='both', expand=True, padx=(10, 5), pady=10)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y', padx=5, pady=10)
+        self.empty_label = ctk.CTkLabel(self.viewport, text=empty_text, font=('Arial', 14))
+
+        tkinter.Misc.bind(self.viewport, '<Configure>', lambda e: self._render(), '+')
+        self._bind_wheel(self.viewport)
+
+    # ----- données -----
+    def refresh(self):
+        """Relit le nombre de lignes et vide le cache (après ajout/suppression)."""
+        self._pages.clear()
+        self._last_rows.clear()
+        self.total = self.count()
+        self._render()
+
+    def _row(self, index):
+        page, pos = divmod(index, self.page_size)
+        rows = self._pages.get(page)
+        if rows is None:
+            after = self._last_rows.get(page - 1)
+            rows = self.fetch(page * self.page_size, self.page_size, after)
+            if rows:
+                self._last_rows[page] = rows[-1]
+            self._pages[page] = rows
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page)
+        return rows[pos] if pos < len(rows) else None
+
+    # ----- affichage -----
+    def _visible(self):
+        return max(1, self.viewport.winfo_height() // self.row_height)
+
+    def _render(self):
+        visible = self._visible()
+        self.first = max(0, min(self.first, self.total - visible))
+
+        if self.total == 0:
+            self.empty_label.place(relx=0.5, y=20, anchor='n')
+        else:
+            self.empty_label.place_forget()
+
+        # Une carte de plus que la hauteur visible, jamais plus que de lignes
+        while len(self.slots) < min(visible + 1, self.total):
+            slot = self.make_row(self.viewport, self.row_height - 8)
+            slot.pack_propagate(False)
+            slot.row = None
+            slot.shown = False
+            self._bind_wheel(slot)
+            self.slots.append(slot)
+
+        for i, slot in enumerate(self.slots):
+            index = self.first + i
+            row = self._row(index) if i <= visible and index < self.total else None
+            if row is None:
+                if slot.shown:
+                    slot.place_forget()
+                    slot.shown = False
+                slot.row = None
+                continue
+            if slot.row != row:
+                slot.row = row
+                self.fill_row(slot, row)
+            if not slot.shown:
+                slot.place(x=0, y=i * self.row_height, relwidth=1)
+                slot.shown = True
+
+        if self.total:
+            self.scrollbar.set(self.first / self.total,
+                               min(1.0, (self.first + visible) / self.total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_to(self, index):
+        self.first = max(0, index)
+        self._render()
+
+    # ----- défilement -----
+    def _on_scrollbar(self, *args):
+        # CTkScrollbar appelle command('moveto', fraction) ou ('scroll', n, unité)
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * self.total))
+        elif args[0] == 'scroll':
+            step = self._visible() if len(args) > 2 and args[2] == 'pages' else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.first - 3)
+        elif event.num == 5 or event.delta < 0:
+            self.scroll_to(self.first + 3)
+        return 'break'
+
+    def _bind_wheel(self, widget):
+        # Liaison sur chaque widget Tk de la carte (pas de bind_all global)
+        for seq in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            tkinter.Misc.bind(widget, seq, self._on_wheel, '+')
+        for child in widget.winfo_children():
+            self._bind_wheel(child)